@@ -1,23 +1,30 @@
-import json
-import requests
-import time
 import os
 import logging
 
+from crawl_engine import crawl_arg_parser, run_crawl
+from output_sink import JsonlSink
+from partition import DEFAULT_SPLITS, partition_payload, select_shards
+
 # --- Configuration ---
 API_URL = 'https://keyzarjewelry.com/collections/center-stones?_data=routes/($locale).collections.center-stones'
 OUTPUT_DIR = "downloads"
-PRODUCTS_PER_REQUEST = 14
-MAX_CURSOR = 1818  # Based on your observation (25441 / 14 = ~1817.2)
-PRODUCTS_PER_FILE = 1120  # Save a new JSON file after every 1400 products
-TOTAL_PRODUCTS_EXPECTED = 25441  # Total products to aim for
-
-REQUEST_DELAY_SECONDS = 0.5  # Delay between requests to be polite to the server (0.5 seconds)
-MAX_RETRIES = 3  # Number of retries for failed requests
-RETRY_DELAY_SECONDS = 5  # Delay before retrying a failed request
+CHECKPOINT_PATH = os.path.join(OUTPUT_DIR, "api_checkpoint.sqlite")  # Journal of finished/failed cursors
+DEDUP_INDEX_PATH = os.path.join(OUTPUT_DIR, "api_seen_products.sqlite")  # Keys already written; one per scraper
+DELTA_STATE_PATH = os.path.join(OUTPUT_DIR, "api_delta_state.sqlite")  # Last known version of every product
+CHANGES_DIR = os.path.join(OUTPUT_DIR, "changes")  # Incremental runs write their change logs here
+CATALOGUE_PATH = os.path.join(OUTPUT_DIR, "catalogue.sqlite")  # Indexed store of every product; None to skip
+PARTITION_SPLITS = DEFAULT_SPLITS  # Slices per filter range when crawling with --partitioned
+OUTPUT_COMPRESSION = None  # None, "gzip" or "zstd" (needs zstandard installed)
+JOB_NAME = "api"  # Output file prefix and key for this scraper's cursors in the checkpoint journal
+MAX_CURSOR = 1818  # Upper bound only; the real last cursor is discovered at run time
+PRODUCTS_PER_FILE = 5000  # Start a new JSONL output file after this many products
+
+PARALLEL_REQUESTS = 1  # Keep this scraper sequential; see apiv2.py for the parallel version
+REQUESTS_PER_SECOND = 2  # Be polite to the server; the rate controller only slows down from here
+USE_HTTP2 = False  # Multiplex requests over HTTP/2 (needs httpx[http2] installed)
 
 # Setup logging
-logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 error_logger = logging.getLogger('scraper_errors')
 error_handler = logging.FileHandler('scraper_errors.log')
 error_handler.setLevel(logging.ERROR)
@@ -26,38 +33,12 @@ error_handler.setFormatter(error_formatter)
 error_logger.addHandler(error_handler)
 
 
-def save_batch_to_json(data_batch, batch_number):
-    """Saves a list of product dictionaries to a JSON file."""
-    if not data_batch:
-        print(f"Batch {batch_number}: No data to save.")
-        return
-
-    os.makedirs(OUTPUT_DIR, exist_ok=True)  # Ensure output directory exists
-    file_path = os.path.join(OUTPUT_DIR, f"batch_{batch_number:03d}.json")
-
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data_batch, f, indent=4, ensure_ascii=False)
-        print(f"Batch {batch_number}: Saved {len(data_batch)} products to {file_path}")
-    except IOError as e:
-        error_logger.error(f"Batch {batch_number}: Error saving to {file_path}: {e}")
-    except Exception as e:
-        error_logger.error(f"Batch {batch_number}: Unexpected error saving JSON: {e}")
-
-
-def scrape_keyzar_api():
+def scrape_keyzar_api(resume=False, retry_failed=False, incremental=False, partitioned=False, shard=None,
+                      record=None, metrics=None, cache=None, cache_ttl=None, archive=None):
     """
     Scrapes product data from Keyzar Jewelry API by iterating through cursor values,
-    saves data in batches to JSON files, and logs progress and errors.
+    streams it to JSON Lines files, and logs progress and errors.
     """
-    print("Starting Keyzar Jewelry API scraping process...")
-    overall_start_time = time.perf_counter()
-
-    all_products_in_current_batch = []
-    current_file_batch_number = 1
-    products_count_overall = 0
-    products_count_in_current_file = 0
-
     # Define the base JSON payload
     base_json_payload = {
         "filtersState": {
@@ -82,125 +63,26 @@ def scrape_keyzar_api():
 
     # Iterate through cursor values
     # The cursor likely represents page number or offset for batches of 14 products.
-    # We iterate up to MAX_CURSOR to cover the TOTAL_PRODUCTS_EXPECTED.
-    for cursor_value in range(1, MAX_CURSOR + 1):
-        request_start_time = time.perf_counter()
-
-        # Update cursor for the current request
-        current_json_payload = base_json_payload.copy()
-        current_json_payload["cursor"] = cursor_value
-
-        retries = 0
-        while retries < MAX_RETRIES:
-            try:
-                form_data = {"body": json.dumps(current_json_payload)}
-                response = requests.post(API_URL, data=form_data, timeout=20)  # Add a timeout for requests
-                response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-
-                res_data = response.json()
-
-                products_data = res_data.get('products', [])
-                item_to_save = {}
-                products_from_response = []
-                for item in products_data:
-
-                    item_to_save["title"] = item["title"]
-                    item_to_save["price_min"] = item["price_min"]
-
-                    item_to_save["price"] = item['variants'][0]['price']
-                    item_to_save["weight"] = item['variants'][0]['weight']
-
-                    item_to_save["originalSrc"] = item['media'][0]['image']['originalSrc']
-                    item_to_save["alt"] = item['media'][0]["alt"]
-
-                    item_to_save["image"] = item["images_info"][0]["src"]
-
-                    meta_fields = [
-                        "carat", "color", "shape", "clarity", "polish",
-                        "lab",  "fluorescence", "length", "width",
-                        "symmetry", "length_width_ratio"
-                    ]
-                    for key_val in item["metafields"]:
-                        key_name = key_val["key"]
-                        if key_name in meta_fields:
-                            item_to_save[key_name] = key_val["value"]
-
-                    products_from_response.append(item_to_save)
-
-                if not products_from_response:
-                    logging.warning(
-                        f"Cursor {cursor_value}: No products found in response. This might indicate end of data or an issue.")
-                    if products_count_overall > 0:
-                        break
-
-                all_products_in_current_batch.extend(products_from_response)
-                products_count_overall += len(products_from_response)
-                products_count_in_current_file += len(products_from_response)
-
-                print(
-                    f"Cursor {cursor_value}: Fetched {len(products_from_response)} products. Total fetched: {products_count_overall}")
-
-                # Check if it's time to save a batch
-                if products_count_in_current_file >= PRODUCTS_PER_FILE:
-                    save_batch_to_json(all_products_in_current_batch, current_file_batch_number)
-                    all_products_in_current_batch = []  # Clear the batch
-                    products_count_in_current_file = 0  # Reset counter
-                    current_file_batch_number += 1  # Increment batch number
-
-                break  # Break retry loop on success
-
-            except requests.exceptions.RequestException as e:
-                retries += 1
-                error_logger.error(f"Cursor {cursor_value}: Request failed (Attempt {retries}/{MAX_RETRIES}): {e}")
-                if hasattr(e, 'response') and e.response is not None:
-                    error_logger.error(f"Response Content (if available): {e.response.text}")
-                if retries < MAX_RETRIES:
-                    print(f"Retrying in {RETRY_DELAY_SECONDS} seconds...")
-                    time.sleep(RETRY_DELAY_SECONDS)
-                else:
-                    error_logger.critical(f"Cursor {cursor_value}: Max retries reached. Skipping this cursor value.")
-            except json.JSONDecodeError as e:
-                retries += 1
-                error_logger.error(f"Cursor {cursor_value}: JSON decode error (Attempt {retries}/{MAX_RETRIES}): {e}")
-                if retries < MAX_RETRIES:
-                    print(f"Retrying in {RETRY_DELAY_SECONDS} seconds...")
-                    time.sleep(RETRY_DELAY_SECONDS)
-                else:
-                    error_logger.critical(
-                        f"Cursor {cursor_value}: Max retries reached for JSON decode error. Skipping.")
-            except Exception as e:
-                error_logger.critical(f"Cursor {cursor_value}: An unexpected error occurred: {e}")
-                break  # Stop processing this cursor on unexpected error
-
-        request_end_time = time.perf_counter()
-
-        # Calculate elapsed time for progress update
-        elapsed_time = request_end_time - overall_start_time
-        minutes = int(elapsed_time // 60)
-        seconds = int(elapsed_time % 60)
-
-        print(
-            f"Progress: Request {cursor_value}/{MAX_CURSOR} completed. "
-            f"Time elapsed: {minutes:02d}m {seconds:02d}s."
-        )
-
-        # Delay between requests to avoid burdening the server
-        if cursor_value < MAX_CURSOR:
-            time.sleep(REQUEST_DELAY_SECONDS)
-
-    # --- Final Save ---
-    if all_products_in_current_batch:
-        save_batch_to_json(all_products_in_current_batch, current_file_batch_number)
-
-    overall_end_time = time.perf_counter()
-    total_duration = overall_end_time - overall_start_time
-    minutes = int(total_duration // 60)
-    seconds = int(total_duration % 60)
-
-    print(f"Scraping process finished.")
-    print(f"Total products collected: {products_count_overall}")
-    print(f"Total execution time: {minutes:02d}m {seconds:02d}s ({total_duration:.2f} seconds)")
+    # The engine discovers the last cursor with products and never goes past MAX_CURSOR.
+    sink = JsonlSink(OUTPUT_DIR, JOB_NAME, compression=OUTPUT_COMPRESSION, records_per_file=PRODUCTS_PER_FILE)
+    # Partitioned runs walk one shallow cursor sequence per price/carat/color shard, all at once
+    shards = select_shards(partition_payload(base_json_payload, PARTITION_SPLITS), shard) if partitioned else None
+    # Incremental runs also write <job>_changes_run<NNNN>_NNN.jsonl with the added/changed/removed stones
+    changes_sink = None
+    if incremental:
+        changes_sink = JsonlSink(CHANGES_DIR, f"{JOB_NAME}_changes", compression=OUTPUT_COMPRESSION)
+    run_crawl(base_json_payload, MAX_CURSOR, sink, api_url=API_URL,
+              parallel_requests=PARALLEL_REQUESTS, max_parallel_requests=PARALLEL_REQUESTS,
+              requests_per_second=REQUESTS_PER_SECOND, max_requests_per_second=REQUESTS_PER_SECOND,
+              http2=USE_HTTP2,
+              checkpoint_path=CHECKPOINT_PATH, job_name=JOB_NAME, resume=resume, retry_failed=retry_failed,
+              dedup_path=DEDUP_INDEX_PATH, delta_path=DELTA_STATE_PATH if incremental else None,
+              changes_sink=changes_sink, shards=shards, cassette_path=record, metrics_dir=metrics,
+              catalogue_path=CATALOGUE_PATH, cache_path=cache, cache_ttl=cache_ttl, archive_dir=archive)
 
 
 if __name__ == "__main__":
-    scrape_keyzar_api()
+    args = crawl_arg_parser(f"Scrape Keyzar center stones into {OUTPUT_DIR}/{JOB_NAME}_NNN.jsonl files.").parse_args()
+    scrape_keyzar_api(resume=args.resume, retry_failed=args.retry_failed, incremental=args.incremental,
+                      partitioned=args.partitioned, shard=args.shard, record=args.record,
+                      metrics=args.metrics, cache=args.cache, cache_ttl=args.cache_ttl, archive=args.archive)
@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import socket
+import statistics
+import sys
+import time
+
+from crawl_engine import API_URL, crawl_cursors_async, discover_last_cursor
+from http_session import PooledSession
+from job_runner import build_payload, load_config
+from rate_control import AdaptiveRateController
+from replay_server import HOST, PORT, replay_url, run_replay_server, synthetic_center_stones_cassette
+
+# --- Configuration ---
+CASSETTE = os.path.join("benchmarks", "center_stones.jsonl.gz")  # Built from SYNTHETIC_PRODUCTS if missing
+SYNTHETIC_PRODUCTS = 5000
+REPLAY_LATENCY_MS = 40  # Server think time per request, so concurrency settings matter as they do live
+REPLAY_JITTER_MS = 20
+REPLAY_ERROR_RATE = 0.01  # Share of 503s, exercising the retry path
+REPLAY_THROTTLE_RATE = 0.0
+REGRESSION_TOLERANCE = 0.2  # --baseline fails when products/sec drops by more than this fraction
+SERVER_START_TIMEOUT_SECONDS = 30  # Loading a large cassette takes a while before the port is bound
+RUN_TIMEOUT_SECONDS = 900  # A configuration that has not reported by then is stopped and marked failed
+
+# Engine settings to compare: name -> crawl_engine / PooledSession parameters.
+# Rate ceilings are high on purpose so the runs measure the engine, not the politeness limits.
+# No HTTP/2 entry: the replay server speaks plain-text HTTP/1.1, which httpx silently falls back to.
+ENGINE_CONFIGS = {
+    "sequential": {"parallel_requests": 1, "max_parallel_requests": 1, "pool_size": 1},
+    "c10": {"parallel_requests": 10, "max_parallel_requests": 10, "pool_size": 10},
+    "c10-pool4": {"parallel_requests": 10, "max_parallel_requests": 10, "pool_size": 4},
+    "adaptive-10-40": {"parallel_requests": 10, "max_parallel_requests": 40, "pool_size": 40},
+}
+REQUESTS_PER_SECOND = 500
+MAX_REQUESTS_PER_SECOND = 2000
+
+
+class TimedSession(PooledSession):
+    """PooledSession that keeps the wall time of every request."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    async def _request(self, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super()._request(method, url, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def _crawl(settings, api_url, payload):
+    controller = AdaptiveRateController(settings["parallel_requests"], settings["max_parallel_requests"],
+                                        REQUESTS_PER_SECOND, MAX_REQUESTS_PER_SECOND)
+    totals = {"products": 0, "failed": 0}
+
+    def on_result(cursor_value, products, error_class):
+        if products is None:
+            totals["failed"] += 1
+        else:
+            totals["products"] += len(products)
+
+    async with TimedSession(settings.get("pool_size") or controller.max_concurrency) as session:
+        # Pages probed to find the end count as crawled, as they do in crawl_engine, and are not requested again
+        fetched = {}
+        last_cursor = await discover_last_cursor(session, controller, payload, 5000, api_url=api_url,
+                                                 fetched=fetched)
+        for cursor_value in range(1, last_cursor + 1):
+            if cursor_value in fetched:
+                on_result(cursor_value, fetched[cursor_value], None)
+        await crawl_cursors_async(session, controller,
+                                  [cursor_value for cursor_value in range(1, last_cursor + 1)
+                                   if cursor_value not in fetched],
+                                  payload, on_result, api_url=api_url)
+    return totals, session.latencies
+
+
+def run_config(name, settings, api_url, payload, results):
+    """Runs one engine configuration (in its own process, so peak RSS is its own) and reports its numbers."""
+    try:
+        start = time.perf_counter()
+        totals, latencies = asyncio.run(_crawl(settings, api_url, payload))
+        seconds = time.perf_counter() - start
+    except Exception as e:
+        results.put({"name": name, "error": repr(e)})
+        return
+    latencies.sort()
+    results.put({
+        "name": name,
+        "products": totals["products"],
+        "failed_cursors": totals["failed"],
+        "requests": len(latencies),
+        "seconds": round(seconds, 3),
+        "products_per_sec": round(totals["products"] / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+
+
+def wait_for_port(port, process, timeout=SERVER_START_TIMEOUT_SECONDS):
+    """Waits until the replay server accepts connections; raises if it exits or never binds."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.exitcode is not None:
+            raise RuntimeError(f"Replay server exited with code {process.exitcode}")
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Replay server did not listen on port {port} within {timeout} seconds")
+
+
+def collect_result(name, process, results, timeout=RUN_TIMEOUT_SECONDS):
+    """The row a configuration's process reports, or an error row if it dies or runs out of time."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if process.exitcode is not None:
+                try:
+                    return results.get(timeout=1)  # Reported just before exiting
+                except queue.Empty:
+                    return {"name": name, "error": f"exited with code {process.exitcode} without a result"}
+    process.terminate()
+    return {"name": name, "error": f"no result within {timeout} seconds"}
+
+
+def print_table(rows):
+    columns = ["name", "products", "seconds", "products_per_sec", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb",
+               "requests", "failed_cursors"]
+    widths = {column: max(len(column), *(len(str(row.get(column, ""))) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        if "error" in row:
+            print(f"{row['name'].ljust(widths['name'])}  failed: {row['error']}")
+            continue
+        print("  ".join(str(row[column]).ljust(widths[column]) for column in columns))
+
+
+def compare_to_baseline(rows, baseline_path, tolerance=REGRESSION_TOLERANCE):
+    """Returns the configurations whose products/sec fell more than `tolerance` below the baseline file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {row["name"]: row for row in json.load(f)}
+    regressions = []
+    for row in rows:
+        before = baseline.get(row["name"])
+        if before and "error" not in row and row["products_per_sec"] < before["products_per_sec"] * (1 - tolerance):
+            regressions.append(f"{row['name']}: {row['products_per_sec']} products/sec "
+                               f"(baseline {before['products_per_sec']})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crawl engine settings against the local replay server.")
+    parser.add_argument("--cassette", default=CASSETTE, help="Cassette to replay (synthetic one built if missing).")
+    parser.add_argument("--config", action="append", dest="configs", choices=sorted(ENGINE_CONFIGS),
+                        help="Only run this engine configuration; may be given more than once.")
+    parser.add_argument("--latency-ms", type=float, default=REPLAY_LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=REPLAY_JITTER_MS)
+    parser.add_argument("--error-rate", type=float, default=REPLAY_ERROR_RATE)
+    parser.add_argument("--throttle-rate", type=float, default=REPLAY_THROTTLE_RATE)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run; exit 1 on a products/sec regression.")
+    args = parser.parse_args()
+
+    # The lab job's payload, so a cassette recorded with `lab_natural_products.py --record` replays as well
+    config = load_config()
+    payload = build_payload(config, next(job for job in config["jobs"] if job["name"] == "lab"))
+    if not os.path.exists(args.cassette):
+        count = synthetic_center_stones_cassette(args.cassette, payload, SYNTHETIC_PRODUCTS)
+        print(f"[*] Built a synthetic cassette of {SYNTHETIC_PRODUCTS} products ({count} pages) at {args.cassette}")
+
+    server = multiprocessing.Process(target=run_replay_server, args=(args.cassette,),
+                                     kwargs={"port": args.port, "latency_ms": args.latency_ms,
+                                             "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+                                             "throttle_rate": args.throttle_rate, "seed": 1},
+                                     daemon=True)
+    server.start()
+
+    api_url = replay_url(API_URL, port=args.port)
+    rows = []
+    try:
+        wait_for_port(args.port, server)
+        for name in args.configs or ENGINE_CONFIGS:
+            settings = ENGINE_CONFIGS[name]
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(target=run_config, args=(name, settings, api_url, payload, results))
+            process.start()
+            rows.append(collect_result(name, process, results))
+            process.join()
+    finally:
+        server.terminate()
+
+    print_table(rows)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    if args.baseline:
+        regressions = compare_to_baseline(rows, args.baseline)
+        for regression in regressions:
+            print(f"[!] Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import gzip
+import json
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+import json_codec
+
+# Response headers worth replaying; everything else (cookies, CDN ids, dates) is dropped
+KEPT_HEADERS = ("Content-Type", "Retry-After")
+
+
+def _canonical_value(value):
+    """Form values that hold JSON (the center-stones "body" field) are compared by content, not spelling."""
+    try:
+        return json.dumps(json.loads(value), sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return value
+
+
+def request_key(method, url, form_data=None):
+    """
+    Identifies a request independently of the host it was sent to and of URL-encoding and JSON
+    key order, so a cassette recorded against keyzarjewelry.com replays from 127.0.0.1.
+    """
+    parts = urlsplit(url)
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    form = sorted((key, _canonical_value(value)) for key, value in (form_data or {}).items())
+    return json.dumps([method.upper(), unquote(parts.path), query, form], separators=(",", ":"))
+
+
+class Cassette:
+    """
+    Request/response pairs saved as gzipped JSON Lines: one line per exchange with the request
+    key, status, a few headers and the response body. Recording appends; loading keeps the
+    first response recorded for each key.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self.recorded = 0
+
+    def record(self, method, url, form_data, status, headers, body, params=None):
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+        if self._file is None:
+            self._file = gzip.open(self.path, "ab")
+        self._file.write(json_codec.dumps_line({
+            "key": request_key(method, url, form_data),
+            "method": method.upper(),
+            "url": url,
+            "status": status,
+            "headers": {name: headers[name] for name in KEPT_HEADERS if name in headers},
+            "body": body.decode("utf-8", errors="replace"),
+        }))
+        self.recorded += 1
+
+    def load(self):
+        """Returns {request key: entry} for every exchange in the cassette."""
+        entries = {}
+        with gzip.open(self.path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    entry = json_codec.loads(line)
+                    entries.setdefault(entry["key"], entry)
+        return entries
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
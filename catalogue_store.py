@@ -0,0 +1,350 @@
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sqlite3
+import time
+
+import json_codec
+from dedup_index import product_key
+from export_parquet import (DIAMOND_CATEGORICAL_COLUMNS, DIAMOND_NUMERIC_COLUMNS, RING_CATEGORICAL_COLUMNS,
+                            export_rows, to_float)
+from output_sink import iter_jsonl
+from product_extractor import DIAMOND_FIELD_SPEC, DIAMOND_METAFIELDS
+
+# --- Configuration ---
+CATALOGUE_PATH = os.path.join("downloads", "catalogue.sqlite")
+BATCH_SIZE = 1000  # Buffered rows are written in one transaction once there are this many
+BUSY_TIMEOUT_MS = 30000  # Jobs sharing a catalogue take turns writing; wait this long for the lock
+
+# Stone columns are the extractor's output columns, so exports match the CSV from make_csv.py
+STONE_COLUMNS = list(DIAMOND_FIELD_SPEC) + sorted(DIAMOND_METAFIELDS - set(DIAMOND_FIELD_SPEC))
+RING_PRODUCT_COLUMNS = [
+    "id", "handle", "title", "vendor", "productType", "description",
+    "shankWidth", "sideStonesOrigin", "sideStonesShape", "sideStonesAverageColor",
+    "sideStonesAverageClarity", "sideStonesAverageCaratWeig", "style", "styleComment",
+]
+RING_VARIANT_COLUMNS = ["product_id", "position", "variant_id", "sku", "title", "center_stone_shape", "material",
+                        "price", "compare_at_price", "image_url"]
+RING_MEDIA_COLUMNS = ["product_id", "position", "alt", "url"]
+
+# Best grade first, so "VS1 or better" is every grade up to and including VS1
+CLARITY_ORDER = ["FL", "IF", "VVS1", "VVS2", "VS1", "VS2", "SI1", "SI2", "SI3", "I1", "I2", "I3"]
+
+TABLES = ("stones", "ring_products", "ring_variants", "ring_media")
+
+
+def _column_type(column, numeric_columns):
+    if column in numeric_columns:
+        return "REAL"
+    # Grades compare case-insensitively ("oval" finds "Oval"), and so do their indexes
+    return "TEXT COLLATE NOCASE" if column in DIAMOND_CATEGORICAL_COLUMNS else "TEXT"
+
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS stones (
+    job TEXT NOT NULL,
+    key TEXT NOT NULL,
+    {", ".join(f'"{column}" {_column_type(column, DIAMOND_NUMERIC_COLUMNS)}' for column in STONE_COLUMNS)},
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (job, key)  -- Jobs may crawl the same stone in another currency; each keeps its row
+);
+CREATE INDEX IF NOT EXISTS stones_carat ON stones (carat);
+CREATE INDEX IF NOT EXISTS stones_price ON stones (price);
+CREATE INDEX IF NOT EXISTS stones_shape_carat ON stones (shape, carat);
+CREATE INDEX IF NOT EXISTS stones_color ON stones (color);
+CREATE INDEX IF NOT EXISTS stones_clarity ON stones (clarity);
+CREATE INDEX IF NOT EXISTS stones_lab ON stones (lab);
+CREATE INDEX IF NOT EXISTS stones_job_last_seen ON stones (job, last_seen);
+
+-- When each job's current crawl started; a resumed crawl keeps the time of the run it continues
+CREATE TABLE IF NOT EXISTS crawls (
+    job TEXT PRIMARY KEY,
+    started_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ring_products (
+    {", ".join(f'"{column}" TEXT' + (" PRIMARY KEY" if column == "id" else "") for column in RING_PRODUCT_COLUMNS)},
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ring_products_style ON ring_products (style);
+
+CREATE TABLE IF NOT EXISTS ring_variants (
+    product_id TEXT NOT NULL REFERENCES ring_products (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    variant_id TEXT, sku TEXT, title TEXT, center_stone_shape TEXT, material TEXT,
+    price REAL, compare_at_price REAL, image_url TEXT,
+    PRIMARY KEY (product_id, position)
+);
+CREATE INDEX IF NOT EXISTS ring_variants_price ON ring_variants (price);
+CREATE INDEX IF NOT EXISTS ring_variants_shape_material ON ring_variants (center_stone_shape, material);
+
+CREATE TABLE IF NOT EXISTS ring_media (
+    product_id TEXT NOT NULL REFERENCES ring_products (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    alt TEXT, url TEXT,
+    PRIMARY KEY (product_id, position)
+);
+"""
+
+
+def _upsert_sql(table, key_columns, columns):
+    names = ", ".join(f'"{column}"' for column in columns)
+    updates = ", ".join(f'"{column}" = excluded."{column}"' for column in columns
+                        if column not in key_columns and column != "first_seen")
+    return (f'INSERT INTO {table} ({names}) VALUES ({", ".join("?" for _ in columns)}) '
+            f'ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET {updates}')
+
+
+def _value(product, field):
+    """Metafield-style {"value": ...} wrappers collapse to their value."""
+    value = product.get(field)
+    if isinstance(value, dict):
+        value = value.get("value")
+    return None if value in (None, "") else str(value)
+
+
+def _option(variant, name):
+    return next((option.get("value") for option in variant.get("selectedOptions") or ()
+                 if option.get("name") == name), None)
+
+
+def _amount(money):
+    return to_float(money.get("amount")) if isinstance(money, dict) else None
+
+
+class CatalogueStore:
+    """
+    SQLite catalogue of everything scraped: center stones, ring products and their variants and
+    media, with indexes on the columns buyers filter by (carat, price, shape, color, clarity,
+    lab). Rows are buffered and upserted BATCH_SIZE at a time in one transaction; flush() writes
+    what is buffered. A product seen again keeps its first_seen and gets its other columns and
+    last_seen updated; stones a complete crawl no longer saw are removed by prune_unseen_stones().
+    """
+
+    def __init__(self, path=CATALOGUE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._stones = []
+        self._rings = []
+        self.rows_written = 0
+
+    def add_stones(self, products, job="default"):
+        """Buffers parsed center-stones products (product_extractor rows) for upserting."""
+        now = time.time()
+        for product in products:
+            row = [job, product_key(product)]
+            for column in STONE_COLUMNS:
+                value = product.get(column)
+                if column in DIAMOND_NUMERIC_COLUMNS:
+                    row.append(to_float(value))
+                else:
+                    row.append(None if value in (None, "") else str(value))
+            self._stones.append(row + [now, now])
+        if len(self._stones) >= BATCH_SIZE:
+            self.flush()
+
+    def begin_crawl(self, job, resume=False):
+        """Records when this job's crawl started; with `resume`, an interrupted crawl keeps its start time."""
+        with self.conn:
+            self.conn.execute(f"INSERT {'OR IGNORE' if resume else 'OR REPLACE'} INTO crawls (job, started_at) "
+                              f"VALUES (?, ?)", (job, time.time()))
+
+    def prune_unseen_stones(self, job):
+        """
+        Deletes the job's stones not seen since its crawl began (see begin_crawl()); returns how many.
+        Only call this after a complete crawl: stones on pages that failed would be deleted too.
+        """
+        self.flush()
+        row = self.conn.execute("SELECT started_at FROM crawls WHERE job = ?", (job,)).fetchone()
+        if row is None:
+            return 0
+        with self.conn:
+            return self.conn.execute("DELETE FROM stones WHERE job = ? AND last_seen < ?", (job, row[0])).rowcount
+
+    def add_ring_products(self, products):
+        """Buffers raw engagement-ring-settings product nodes (with their variants and media)."""
+        self._rings.extend(product for product in products if isinstance(product, dict) and product.get("id"))
+        if len(self._rings) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Writes every buffered row in one transaction."""
+        if not self._stones and not self._rings:
+            return
+        now = time.time()
+        with self.conn:
+            if self._stones:
+                self.conn.executemany(
+                    _upsert_sql("stones", ["job", "key"], ["job", "key"] + STONE_COLUMNS + ["first_seen", "last_seen"]),
+                    self._stones)
+            if self._rings:
+                product_ids = [(product["id"],) for product in self._rings]
+                self.conn.executemany(
+                    _upsert_sql("ring_products", ["id"], RING_PRODUCT_COLUMNS + ["first_seen", "last_seen"]),
+                    [[_value(product, column) for column in RING_PRODUCT_COLUMNS] + [now, now]
+                     for product in self._rings])
+                # Variants and media are replaced wholesale: the latest payload is the truth
+                self.conn.executemany("DELETE FROM ring_variants WHERE product_id = ?", product_ids)
+                self.conn.executemany("DELETE FROM ring_media WHERE product_id = ?", product_ids)
+                variants, media = [], []
+                for product in self._rings:
+                    for position, variant in enumerate((product.get("variants") or {}).get("nodes") or ()):
+                        variants.append((product["id"], position, variant.get("id"), variant.get("sku"),
+                                         variant.get("title"), _option(variant, "Center Stone Shape"),
+                                         _option(variant, "Material"), _amount(variant.get("price")),
+                                         _amount(variant.get("compareAtPrice")),
+                                         (variant.get("image") or {}).get("url")))
+                    for position, item in enumerate((product.get("media") or {}).get("nodes") or ()):
+                        media.append((product["id"], position, item.get("alt"), (item.get("image") or {}).get("url")))
+                self.conn.executemany(f"INSERT OR REPLACE INTO ring_variants VALUES "
+                                      f"({', '.join('?' for _ in RING_VARIANT_COLUMNS)})", variants)
+                self.conn.executemany(f"INSERT OR REPLACE INTO ring_media VALUES "
+                                      f"({', '.join('?' for _ in RING_MEDIA_COLUMNS)})", media)
+        self.rows_written += len(self._stones) + len(self._rings)
+        self._stones = []
+        self._rings = []
+
+    def find_stones(self, shape=None, carat_min=None, carat_max=None, price_max=None, min_clarity=None,
+                    colors=None, lab=None, job=None, limit=None):
+        """
+        Stones matching every given filter, cheapest first, as dicts. `min_clarity` is the worst
+        acceptable grade ("VS1" means VS1 or better); `colors` is a list of accepted grades.
+        """
+        clauses, params = [], []
+        for clause, value in (("shape = ?", shape), ("carat >= ?", carat_min), ("carat <= ?", carat_max),
+                              ("price <= ?", price_max), ("lab = ?", lab), ("job = ?", job)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if min_clarity is not None:
+            grades = CLARITY_ORDER[:CLARITY_ORDER.index(min_clarity.upper()) + 1]
+            clauses.append(f"clarity IN ({', '.join('?' for _ in grades)})")
+            params.extend(grades)
+        if colors:
+            clauses.append(f"color IN ({', '.join('?' for _ in colors)})")
+            params.extend(colors)
+        sql = "SELECT * FROM stones" + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY price"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        cursor = self.conn.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def iter_rows(self, table):
+        """Returns (column names, row cursor) for streaming a whole table out."""
+        if table not in TABLES:
+            raise ValueError(f"Unknown table {table!r}; expected one of {', '.join(TABLES)}")
+        cursor = self.conn.execute(f"SELECT * FROM {table}")
+        return [column[0] for column in cursor.description], cursor
+
+    def export(self, table, path):
+        """Exports one table to .csv, .parquet or .feather; returns the number of rows written."""
+        fieldnames, rows = self.iter_rows(table)
+        if path.endswith(".csv"):
+            count = 0
+            with open(path + ".part", "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(fieldnames)
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+            os.replace(path + ".part", path)
+            return count
+        numeric_columns = [name for name, column_type in
+                           ((info[1], info[2]) for info in self.conn.execute(f"PRAGMA table_info({table})"))
+                           if column_type in ("REAL", "INTEGER")]
+        categorical_columns = DIAMOND_CATEGORICAL_COLUMNS + RING_CATEGORICAL_COLUMNS + ["center_stone_shape",
+                                                                                      "material", "job"]
+        return export_rows((dict(zip(fieldnames, row)) for row in rows), path, fieldnames, numeric_columns,
+                           categorical_columns, file_format="feather" if path.endswith(".feather") else "parquet")
+
+    def counts(self):
+        return {table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def import_stone_files(store, directory, job):
+    """Loads the center-stones JSONL outputs (and legacy batch_NNN.json files) in `directory`."""
+    paths = sorted(path for pattern in ("*.json", "*.jsonl", "*.jsonl.gz", "*.jsonl.zst")
+                   for path in glob.glob(os.path.join(directory, pattern)))
+    for path in paths:
+        if ".jsonl" in path:
+            store.add_stones(iter_jsonl(path), job)
+        else:
+            with open(path, "rb") as f:
+                data = json_codec.loads(f.read())
+            if isinstance(data, list):
+                store.add_stones(data, job)
+    store.flush()
+    return len(paths)
+
+
+def import_ring_files(store, directory):
+    """Loads ring payloads saved by url.py / ring_client.py (any of the three payload shapes)."""
+    paths = sorted(glob.glob(os.path.join(directory, "*.json")))
+    for path in paths:
+        with open(path, "rb") as f:
+            store.add_ring_products(json_codec.iter_ring_products(f))
+    store.flush()
+    return len(paths)
+
+
+if __name__ == "__main__":
+    # Only when run as a script: the crawlers import this module and set up logging themselves
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Load, query and export the SQLite product catalogue.")
+    parser.add_argument("--catalogue", default=CATALOGUE_PATH, help=f"Catalogue file (default: {CATALOGUE_PATH}).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_stones = commands.add_parser("import-stones", help="Load center-stones output files from a directory.")
+    import_stones.add_argument("directory")
+    import_stones.add_argument("--job", default="default", help="Job name to file the stones under.")
+    import_rings = commands.add_parser("import-rings", help="Load saved ring payloads from a directory.")
+    import_rings.add_argument("directory")
+    export = commands.add_parser("export", help="Export a table to .csv, .parquet or .feather.")
+    export.add_argument("table", choices=TABLES)
+    export.add_argument("path")
+    query = commands.add_parser("query", help="List stones matching the filters, cheapest first.")
+    query.add_argument("--shape")
+    query.add_argument("--carat-min", type=float)
+    query.add_argument("--carat-max", type=float)
+    query.add_argument("--price-max", type=float)
+    query.add_argument("--min-clarity", type=str.upper, choices=CLARITY_ORDER, help="Worst acceptable clarity grade.")
+    query.add_argument("--color", action="append", dest="colors", help="Accepted color grade; repeatable.")
+    query.add_argument("--lab")
+    query.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    store = CatalogueStore(args.catalogue)
+    try:
+        if args.command == "import-stones":
+            files = import_stone_files(store, args.directory, args.job)
+            logging.info(f"Imported {files} files; catalogue now holds {store.counts()}.")
+        elif args.command == "import-rings":
+            files = import_ring_files(store, args.directory)
+            logging.info(f"Imported {files} files; catalogue now holds {store.counts()}.")
+        elif args.command == "export":
+            rows = store.export(args.table, args.path)
+            logging.info(f"Exported {rows} rows of '{args.table}' to {args.path}.")
+        else:
+            start_time = time.perf_counter()
+            stones = store.find_stones(args.shape, args.carat_min, args.carat_max, args.price_max,
+                                       args.min_clarity, args.colors, args.lab, limit=args.limit)
+            for stone in stones:
+                print(json.dumps(stone, ensure_ascii=False))
+            logging.info(f"{len(stones)} stones in {(time.perf_counter() - start_time) * 1000:.1f} ms.")
+    finally:
+        store.close()
@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import time
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class CrawlCheckpoint:
+    """
+    SQLite journal of which cursors a job has finished or given up on, so an interrupted crawl
+    can pick up where it stopped. Cursors are only marked done once the output file holding their
+    products has been fsynced, so a crash never records products that are not on disk.
+    """
+
+    def __init__(self, path, job_name):
+        self.job_name = job_name
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cursors (
+                job TEXT NOT NULL,
+                cursor INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                error_class TEXT,
+                products INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job, cursor)
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                job TEXT PRIMARY KEY,
+                payload TEXT,
+                last_file_number INTEGER NOT NULL DEFAULT 0,
+                durable_bytes INTEGER
+            );
+        """)
+        if "durable_bytes" not in [row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")]:
+            # Journals written before durable_bytes was recorded: their last file is kept whole
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN durable_bytes INTEGER")
+        self.conn.commit()
+
+    def reset(self, base_json_payload):
+        """Forgets every cursor of this job; used when a crawl starts from scratch."""
+        with self.conn:
+            self.conn.execute("DELETE FROM cursors WHERE job = ?", (self.job_name,))
+            self.conn.execute("INSERT OR REPLACE INTO jobs (job, payload, last_file_number, durable_bytes) "
+                              "VALUES (?, ?, 0, 0)",
+                              (self.job_name, json.dumps(base_json_payload, sort_keys=True)))
+
+    def payload_matches(self, base_json_payload):
+        row = self.conn.execute("SELECT payload FROM jobs WHERE job = ?", (self.job_name,)).fetchone()
+        return row is None or row[0] == json.dumps(base_json_payload, sort_keys=True)
+
+    def mark_done(self, cursor_products, file_number=None, durable_bytes=None):
+        """
+        Records `{cursor: product_count}` as done in one transaction, together with the output file
+        number and how many bytes of it are durable with them.
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO cursors (job, cursor, status, error_class, products, updated_at) "
+                "VALUES (?, ?, ?, NULL, ?, ?) "
+                "ON CONFLICT (job, cursor) DO UPDATE SET status = excluded.status, error_class = NULL, "
+                "products = excluded.products, attempts = attempts + 1, updated_at = excluded.updated_at",
+                [(self.job_name, cursor, STATUS_DONE, products, now) for cursor, products in cursor_products.items()])
+            if file_number is not None:
+                self.conn.execute(
+                    "UPDATE jobs SET durable_bytes = CASE WHEN last_file_number = ? "
+                    "THEN MAX(COALESCE(durable_bytes, 0), ?) ELSE ? END, last_file_number = ? "
+                    "WHERE job = ? AND last_file_number <= ?",
+                    (file_number, durable_bytes, durable_bytes, file_number, self.job_name, file_number))
+
+    def mark_failed(self, cursor, error_class):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO cursors (job, cursor, status, error_class, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (job, cursor) DO UPDATE SET status = excluded.status, "
+                "error_class = excluded.error_class, attempts = attempts + 1, updated_at = excluded.updated_at",
+                (self.job_name, cursor, STATUS_FAILED, error_class, time.time()))
+
+    def _cursors_with_status(self, status):
+        rows = self.conn.execute("SELECT cursor FROM cursors WHERE job = ? AND status = ? ORDER BY cursor",
+                                 (self.job_name, status))
+        return [row[0] for row in rows]
+
+    def failed_cursors(self):
+        return self._cursors_with_status(STATUS_FAILED)
+
+    def cursors_to_fetch(self, max_cursor, include_missing=True, include_failed=False):
+        """Cursors in 1..max_cursor with no record (`include_missing`) and/or a failed record (`include_failed`)."""
+        recorded = set(self._cursors_with_status(STATUS_DONE))
+        failed = set(self.failed_cursors())
+        recorded |= failed
+        cursors = set()
+        if include_missing:
+            cursors |= set(range(1, max_cursor + 1)) - recorded
+        if include_failed:
+            cursors |= failed
+        return sorted(cursors)
+
+    def durable_output(self):
+        """
+        (last output file number, bytes of it journaled as durable), or None for a job never started.
+        The byte count is None in journals written before it was recorded.
+        """
+        row = self.conn.execute("SELECT last_file_number, durable_bytes FROM jobs WHERE job = ?",
+                                (self.job_name,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def next_file_number(self):
+        return (self.durable_output() or (0, None))[0] + 1
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,642 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from cassette import Cassette
+from catalogue_store import CatalogueStore
+from crawl_metrics import CrawlMetrics, current_walk
+from crawl_checkpoint import CrawlCheckpoint
+from dedup_index import DedupIndex
+from delta import DeltaState
+import json_codec
+from http_session import HttpStatusError, HttpTransportError, PooledSession
+from product_extractor import parse_diamond_products
+from rate_control import AdaptiveRateController, backoff_delay, parse_retry_after
+from response_archive import ResponseArchive
+from response_cache import ResponseCache
+
+# --- Configuration ---
+API_URL = 'https://keyzarjewelry.com/collections/center-stones?_data=routes/($locale).collections.center-stones'
+PARALLEL_REQUESTS = 10  # Requests in flight at the start of a crawl
+MAX_PARALLEL_REQUESTS = 20  # Ceiling the rate controller may ramp concurrency up to
+REQUESTS_PER_SECOND = 5  # Starting request rate
+MAX_REQUESTS_PER_SECOND = 15  # Ceiling the rate controller may ramp the request rate up to
+REQUEST_TIMEOUT_SECONDS = 20  # Timeout for individual requests
+MAX_RETRIES = 3  # Number of retries for failed requests
+
+# Top-level response keys that may carry the catalogue size, checked in this order
+CATALOGUE_TOTAL_KEYS = ("totalCount", "total_count", "total", "productsCount", "products_count")
+
+error_logger = logging.getLogger('scraper_errors')
+
+
+class CursorFetchError(Exception):
+    """Raised when a cursor is given up on; `error_class` names the last error seen."""
+
+    def __init__(self, cursor_value, error_class):
+        super().__init__(f"Cursor {cursor_value} failed with {error_class}")
+        self.cursor_value = cursor_value
+        self.error_class = error_class
+
+
+async def fetch_and_parse_single_cursor(session, controller, cursor_value, base_json_payload,
+                                        parse_products=parse_diamond_products, api_url=API_URL,
+                                        decode_body=json_codec.decode_diamond_response):
+    """
+    Fetches data for a single cursor value and extracts relevant product info.
+    Every attempt goes through the rate controller, which learns from its status and latency.
+    A response still within the session cache's TTL is parsed again without any request; a
+    fetched one that decodes is also kept in the session's raw response archive, if it has one.
+    Returns a list of parsed product dictionaries; raises CursorFetchError once the cursor is given up on.
+    """
+    current_json_payload = base_json_payload.copy()
+    current_json_payload["cursor"] = cursor_value
+    form_data = {"body": json.dumps(current_json_payload)}
+
+    cached = session.cached("POST", api_url, data=form_data)
+    if cached is not None:
+        try:
+            return parse_products(decode_body(cached[2]))
+        except json_codec.DecodeError:
+            # Fetch it again; without the entry, or every retry would be served the same broken body
+            session.invalidate_cached("POST", api_url, data=form_data)
+
+    metrics = session.metrics
+    retries = 0
+    while retries < MAX_RETRIES:
+        retry_after = None
+        timing = {} if metrics else None
+        wait_start_time = time.perf_counter()
+        wait_seconds = 0.0
+        try:
+            await controller.acquire()
+            request_start_time = time.perf_counter()
+            wait_seconds = request_start_time - wait_start_time
+            status = None
+            try:
+                status, headers, body = await session.post_form(api_url, form_data, timing=timing)
+            except HttpStatusError as e:
+                status = e.status
+                retry_after = parse_retry_after(e.headers.get("Retry-After"))
+                raise
+            finally:
+                # The slot goes back whatever happened; no status (transport error, cancellation,
+                # a failing cache or recorder) counts as a failed request
+                await controller.release(status, time.perf_counter() - request_start_time, retry_after)
+
+            parse_start_time = time.perf_counter()
+            res_data = decode_body(body)
+            if session.archive is not None:
+                session.archive.add(current_walk.get(), cursor_value, body)
+            products = parse_products(res_data)
+            if metrics:
+                metrics.record_request(cursor_value, retries + 1, status, timing, wait_s=wait_seconds,
+                                       parse_s=time.perf_counter() - parse_start_time,
+                                       products=len(products) if isinstance(products, list) else None)
+            return products
+
+        except (HttpStatusError, HttpTransportError) as e:
+            retries += 1
+            error_logger.error(f"Cursor {cursor_value}: Request failed (Attempt {retries}/{MAX_RETRIES}): {e}")
+            if isinstance(e, HttpStatusError):
+                error_logger.error(f"Response Content (if available): {e.body[:500]!r}")
+            if metrics:
+                metrics.record_request(cursor_value, retries, getattr(e, "status", None), timing,
+                                       wait_s=wait_seconds, error=type(e).__name__)
+            if retries < MAX_RETRIES:
+                delay = retry_after if retry_after is not None else backoff_delay(retries)
+                logging.info(f"Retrying cursor {cursor_value} in {delay:.1f} seconds...")
+                if metrics:
+                    metrics.record_backoff(delay)
+                await asyncio.sleep(delay)
+            else:
+                error_logger.critical(f"Cursor {cursor_value}: Max retries reached. Skipping this cursor value.")
+                raise CursorFetchError(cursor_value, type(e).__name__)
+        except json_codec.DecodeError as e:
+            retries += 1
+            error_logger.error(f"Cursor {cursor_value}: JSON decode error (Attempt {retries}/{MAX_RETRIES}): {e}")
+            session.invalidate_cached("POST", api_url, data=form_data)  # The cache stored it before it was decoded
+            if metrics:
+                metrics.record_request(cursor_value, retries, timing.get("status"), timing, wait_s=wait_seconds,
+                                       parse_s=time.perf_counter() - parse_start_time, error=type(e).__name__)
+            if retries < MAX_RETRIES:
+                delay = backoff_delay(retries)
+                logging.info(f"Retrying cursor {cursor_value} in {delay:.1f} seconds...")
+                if metrics:
+                    metrics.record_backoff(delay)
+                await asyncio.sleep(delay)
+            else:
+                error_logger.critical(f"Cursor {cursor_value}: Max retries reached for JSON decode error. Skipping.")
+                raise CursorFetchError(cursor_value, type(e).__name__)
+        except Exception as e:
+            error_logger.critical(f"Cursor {cursor_value}: An unexpected error occurred during parsing: {e}")
+            raise CursorFetchError(cursor_value, type(e).__name__)
+    raise CursorFetchError(cursor_value, "MaxRetries")  # Should only be reached if all retries fail
+
+
+def _catalogue_total(res_data):
+    """Returns the catalogue size if the response advertises one under a known key."""
+    for key in CATALOGUE_TOTAL_KEYS:
+        value = res_data.get(key) if isinstance(res_data, dict) else None
+        if isinstance(value, int) and value > 0:
+            return value
+    return None
+
+
+async def _page_is_empty(session, controller, cursor_value, base_json_payload, parse_products, api_url,
+                         fetched=None):
+    try:
+        products = await fetch_and_parse_single_cursor(session, controller, cursor_value, base_json_payload,
+                                                       parse_products, api_url=api_url)
+    except CursorFetchError:
+        return False  # Could not tell; treat as non-empty so we never cut the catalogue short
+    if fetched is not None:
+        fetched[cursor_value] = products
+    return not products
+
+
+async def discover_last_cursor(session, controller, base_json_payload, max_cursor, parse_products=parse_diamond_products,
+                               api_url=API_URL, fetched=None):
+    """
+    Finds the last cursor that still returns products, never looking past `max_cursor`.
+    Uses the catalogue size from the first response when the API advertises one, otherwise
+    gallops (1, 2, 4, 8, ...) to the first empty page and binary-searches back to the boundary.
+    With a `fetched` dict, the parsed products of every page probed are left in it by cursor,
+    so the crawl can use them instead of requesting those pages again.
+    """
+    try:
+        first_page = await fetch_and_parse_single_cursor(session, controller, 1, base_json_payload,
+                                                         lambda res_data: res_data, api_url=api_url)
+    except CursorFetchError:
+        logging.warning(f"Could not fetch cursor 1 to discover the catalogue size; using {max_cursor}.")
+        return max_cursor
+
+    first_products = parse_products(first_page)
+    if fetched is not None:
+        fetched[1] = first_products
+    page_size = len(first_products)
+    if page_size == 0:
+        return 0
+    total = _catalogue_total(first_page)
+    if total:
+        last_cursor = min(max_cursor, -(-total // page_size))
+        logging.info(f"API reports {total} products ({page_size} per page): last cursor is {last_cursor}.")
+        return last_cursor
+
+    # Gallop until we overshoot, then binary-search between the last full and first empty page
+    known_full, probe = 1, 2
+    while probe <= max_cursor and not await _page_is_empty(session, controller, probe, base_json_payload,
+                                                           parse_products, api_url, fetched):
+        known_full, probe = probe, probe * 2
+    known_empty = min(probe, max_cursor + 1)
+    while known_empty - known_full > 1:
+        middle = (known_full + known_empty) // 2
+        if await _page_is_empty(session, controller, middle, base_json_payload, parse_products, api_url, fetched):
+            known_empty = middle
+        else:
+            known_full = middle
+    logging.info(f"Probed the cursor space: last cursor with products is {known_full}.")
+    return known_full
+
+
+async def _cursor_worker(queue, session, controller, base_json_payload, parse_products, on_result, api_url, frontier):
+    """Pulls cursors off the queue until it is drained, so a slow request never holds up the others."""
+    while True:
+        cursor_value = await queue.get()
+        try:
+            if frontier["end_cursor"] is not None and cursor_value > frontier["end_cursor"]:
+                continue  # Past the end of the catalogue; don't spend a request on it
+            try:
+                products = await fetch_and_parse_single_cursor(session, controller, cursor_value, base_json_payload,
+                                                              parse_products, api_url=api_url)
+            except CursorFetchError as exc:
+                on_result(cursor_value, None, exc.error_class)
+            else:
+                if not products and frontier["stop_at_empty_page"]:
+                    if frontier["end_cursor"] is None or cursor_value < frontier["end_cursor"]:
+                        logging.info(f"Cursor {cursor_value} is empty; not scheduling any cursor after it.")
+                        frontier["end_cursor"] = cursor_value
+                on_result(cursor_value, products, None)
+        except Exception as exc:
+            error_logger.critical(f"Error processing result for cursor {cursor_value}: {exc}")
+        finally:
+            queue.task_done()
+
+
+async def crawl_cursors_async(session, controller, cursor_values, base_json_payload, on_result,
+                              parse_products=parse_diamond_products, api_url=API_URL, stop_at_empty_page=True):
+    """
+    Fetches every cursor in `cursor_values` over `session`, with as many requests in flight as
+    `controller` currently allows (one worker per slot up to its ceiling).
+    `on_result(cursor_value, products, error_class)` is called as each cursor finishes; on failure
+    `products` is None and `error_class` names the error that made us give up.
+    With `stop_at_empty_page`, the first empty page marks the end and later cursors are skipped.
+    """
+    queue = asyncio.Queue()
+    for cursor_value in cursor_values:
+        queue.put_nowait(cursor_value)
+    frontier = {"end_cursor": None, "stop_at_empty_page": stop_at_empty_page}
+
+    workers = [
+        asyncio.create_task(
+            _cursor_worker(queue, session, controller, base_json_payload, parse_products, on_result, api_url,
+                           frontier))
+        for _ in range(controller.max_concurrency)
+    ]
+    await queue.join()
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def _crawl_shard(session, controller, job, shard):
+    shard_name, shard_payload = shard
+    # Each walk runs in its own task, so this labels its request events without touching the others
+    current_walk.set(f"{job.job_name}:{shard_name}" if shard_name else job.job_name)
+    max_cursor = job.max_cursor
+    fetched = {}
+    if job.discover_end:
+        max_cursor = await discover_last_cursor(session, controller, shard_payload, max_cursor,
+                                                job.parse_products, api_url=job.api_url, fetched=fetched)
+    cursor_values = job.select_cursors(shard_name, max_cursor)
+    # Pages fetched while probing for the end are used as they are instead of being requested again
+    for cursor_value in cursor_values:
+        if cursor_value in fetched:
+            job.on_result(shard_name, cursor_value, fetched[cursor_value], None)
+    cursor_values = [cursor_value for cursor_value in cursor_values if cursor_value not in fetched]
+    await crawl_cursors_async(session, controller, cursor_values, shard_payload,
+                              lambda cursor_value, products, error_class:
+                              job.on_result(shard_name, cursor_value, products, error_class),
+                              parse_products=job.parse_products, api_url=job.api_url)
+
+
+async def _crawl_with_pool(jobs, parallel_requests, max_parallel_requests, requests_per_second,
+                           max_requests_per_second, pool_size, http2, cassette_path=None, metrics_dir=None,
+                           cache_path=None, cache_ttl=None, archive_dir=None):
+    controller = AdaptiveRateController(parallel_requests, max_parallel_requests, requests_per_second,
+                                        max_requests_per_second)
+    recorder = Cassette(cassette_path) if cassette_path else None
+    metrics = CrawlMetrics(metrics_dir) if metrics_dir else None
+    cache = ResponseCache(cache_path, cache_ttl) if cache_path else None
+    archive = ResponseArchive(archive_dir) if archive_dir else None
+    reporter = asyncio.create_task(metrics.report_periodically(jobs)) if metrics else None
+    try:
+        async with PooledSession(pool_size or controller.max_concurrency, http2=http2,
+                                 timeout_seconds=REQUEST_TIMEOUT_SECONDS, recorder=recorder,
+                                 metrics=metrics, cache=cache, archive=archive) as session:
+            # Every job and shard shares the pool and the rate controller, so together they stay within its limits
+            await asyncio.gather(*(_crawl_shard(session, controller, job, shard)
+                                   for job in jobs for shard in job.shards))
+    finally:
+        if recorder:
+            recorder.close()
+            logging.info(f"Recorded {recorder.recorded} exchanges to {cassette_path}.")
+        if cache:
+            cache.close()
+            logging.info(f"Response cache: {cache.stats['hits']} served within TTL, {cache.stats['revalidated']} "
+                         f"unchanged (304), {cache.stats['misses']} fetched, {cache.stats['stored']} stored.")
+        if archive:
+            archive.close()
+            logging.info(f"Archived {archive.archived} responses to {archive_dir} "
+                         f"({archive.unchanged} unchanged since they were last archived).")
+        if metrics:
+            reporter.cancel()
+            metrics.close(jobs)
+    logging.info(f"Rate controller settled at {int(controller.limit)} requests in flight, "
+                 f"{controller.rate:.1f} requests/second.")
+
+
+class _CrawlArgumentParser(argparse.ArgumentParser):
+    def __init__(self, *args, shard_needs_partitioned=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard_needs_partitioned = shard_needs_partitioned
+
+    def parse_known_args(self, args=None, namespace=None):
+        parsed, extras = super().parse_known_args(args, namespace)
+        # Without shards to pick from, --shard would be ignored and this machine would crawl everything
+        if self.shard_needs_partitioned and parsed.shard and not parsed.partitioned:
+            self.error("--shard only applies with --partitioned")
+        return parsed, extras
+
+
+def crawl_arg_parser(description, shard_needs_partitioned=True):
+    """
+    Command-line options shared by every scraper entry point. --shard without --partitioned is
+    an error, unless `shard_needs_partitioned` is False for a caller that checks it itself.
+    """
+    parser = _CrawlArgumentParser(description=description, shard_needs_partitioned=shard_needs_partitioned)
+    parser.add_argument("--resume", action="store_true",
+                        help="Only fetch cursors the checkpoint journal has no record of.")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Re-fetch cursors that were given up on in an earlier run.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Also write a change log of products added, changed or removed since the last run.")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="Split the filter ranges into shards and crawl their shallow cursor walks concurrently.")
+    parser.add_argument("--shard", default=None, metavar="I/N",
+                        help="With --partitioned, only crawl every N-th shard starting at I (e.g. 0/4 on the "
+                             "first of four machines).")
+    parser.add_argument("--record", default=None, metavar="CASSETTE",
+                        help="Also save every request/response to this .jsonl.gz cassette for offline replay.")
+    parser.add_argument("--metrics", default=None, metavar="DIR",
+                        help="Write per-request timing events (JSONL) and a Prometheus .prom file to DIR, "
+                             "and log throughput/ETA periodically.")
+    parser.add_argument("--cache", default=None, metavar="PATH",
+                        help="Keep responses in this SQLite cache and revalidate them with ETag/Last-Modified.")
+    parser.add_argument("--cache-ttl", type=float, default=None, metavar="SECONDS",
+                        help="With --cache, reuse responses younger than this without any request "
+                             "(e.g. to re-run parsing and export offline).")
+    parser.add_argument("--archive", default=None, metavar="DIR",
+                        help="Keep every raw response in a compressed archive in DIR, indexed by cursor.")
+    return parser
+
+
+class CrawlJob:
+    """
+    Bookkeeping for one catalogue crawl: its payload (or shards), output sink, checkpoint
+    journal, dedup index, delta state and progress counters. run_jobs() crawls any number of
+    these at once over one connection pool; each keeps its own output and progress.
+    See run_crawl() for what the arguments do.
+    """
+
+    def __init__(self, base_json_payload, max_cursor, sink, parse_products=parse_diamond_products, api_url=API_URL,
+                 checkpoint_path=None, job_name="default", resume=False, retry_failed=False, discover_end=True,
+                 dedup_path=None, delta_path=None, changes_sink=None, shards=None, catalogue_path=None):
+        self.job_name = job_name
+        self.max_cursor = max_cursor
+        self.sink = sink
+        self.parse_products = parse_products
+        self.api_url = api_url
+        self.resume = resume
+        self.retry_failed = retry_failed
+        self.discover_end = discover_end
+        self.changes_sink = changes_sink
+        self.shards = shards or [(None, base_json_payload)]
+
+        self.delta = DeltaState(delta_path, job_name) if delta_path else None
+        if self.delta:
+            run_number = self.delta.begin_run(resume=resume or retry_failed)
+            if (resume or retry_failed) and not self.delta.resumed:
+                # The journal belongs to a finished run: skipping its cursors would report every
+                # product on them as removed, so this run crawls everything
+                logging.warning(f"[{job_name}] No interrupted incremental run to resume; crawling everything.")
+                self.resume = self.retry_failed = resume = retry_failed = False
+            logging.info(f"[{job_name}] Incremental run {run_number}.")
+            # One change log per run, so a resumed run carries on with the interrupted run's files
+            self.changes_sink.prefix = f"{self.changes_sink.prefix}_run{run_number:04d}"
+
+        self.checkpoints = {}
+        if checkpoint_path:
+            for shard_name, shard_payload in self.shards:
+                shard_job = f"{job_name}:{shard_name}" if shard_name else job_name
+                self.checkpoints[shard_name] = CrawlCheckpoint(checkpoint_path, shard_job)
+        if self.checkpoints and (resume or retry_failed):
+            for shard_name, shard_payload in self.shards:
+                if not self.checkpoints[shard_name].payload_matches(shard_payload):
+                    logging.warning(f"Checkpoint for job '{self.checkpoints[shard_name].job_name}' was recorded "
+                                    f"with a different payload.")
+        else:
+            for shard_name, shard_payload in self.shards:
+                if shard_name in self.checkpoints:
+                    self.checkpoints[shard_name].reset(shard_payload)
+
+        self.dedup = DedupIndex(dedup_path, namespace=job_name) if dedup_path else None
+        if self.dedup and not (resume or retry_failed):
+            self.dedup.reset()
+
+        # A resumed crawl keeps its output up to the last point made durable, and continues in the
+        # next file; anything written after it belongs to cursors that will be fetched again
+        self.durable_output = None
+        self.first_file_number = 1
+        if self.checkpoints and (resume or retry_failed):
+            self.durable_output = self._last_durable_output()
+            if self.durable_output is not None:
+                self.first_file_number = self.durable_output[0] + 1
+
+        self.catalogue = CatalogueStore(catalogue_path) if catalogue_path else None
+        if self.catalogue:
+            self.catalogue.begin_crawl(job_name, resume=bool(self.checkpoints) and (resume or retry_failed))
+
+        self.products_overall = 0
+        self.cursors_done = 0
+        self.cursors_total = 0
+        self.cursors_failed = 0
+        self.start_time = None
+
+    def _last_durable_output(self):
+        # The dedup index commits its position before the journals do (see _on_durable), so it is the
+        # furthest one unless it was lost; an unknown byte count means that whole file is kept
+        points = [checkpoint.durable_output() for checkpoint in self.checkpoints.values()]
+        if self.dedup:
+            points.append(self.dedup.durable_output())
+        points = [point for point in points if point is not None]
+        return max(points, key=lambda point: (point[0], float("inf") if point[1] is None else point[1]),
+                   default=None)
+
+    def start(self):
+        """Opens the outputs; cursors are journaled as done only once the sink reports their products fsynced."""
+        self.start_time = time.perf_counter()
+        if self.delta:
+            self.changes_sink.start(self.changes_sink.next_file_number())
+        self.sink.start(self.first_file_number, on_durable=self._on_durable, durable=self.durable_output)
+
+    def select_cursors(self, shard_name, last_cursor):
+        checkpoint = self.checkpoints.get(shard_name)
+        if checkpoint and (self.resume or self.retry_failed):
+            cursor_values = checkpoint.cursors_to_fetch(last_cursor, include_missing=self.resume,
+                                                        include_failed=self.retry_failed)
+            logging.info(f"Resuming job '{checkpoint.job_name}': {len(cursor_values)} cursors left to fetch.")
+        else:
+            cursor_values = range(1, last_cursor + 1)
+        self.cursors_total += len(cursor_values)
+        return cursor_values
+
+    def _on_durable(self, shard_cursor_products, file_number, durable_bytes):
+        # Seen keys are committed before the journal write: if we crash in between, the cursor is
+        # re-fetched and its (already saved) products are dropped as duplicates, not lost. So
+        # everything else derived from those products must be on disk before the seen keys are.
+        # The change log is fsynced before the state it was diffed against moves on. The seen keys are
+        # committed with the output position they reach, which is where a resumed crawl cuts the output.
+        if self.delta:
+            self.changes_sink.sync()
+            self.delta.commit()
+        if self.catalogue:
+            self.catalogue.flush()
+        if self.dedup:
+            self.dedup.commit(file_number, durable_bytes)
+        if self.checkpoints:
+            by_shard = {}
+            for (shard_name, cursor_value), products in shard_cursor_products.items():
+                by_shard.setdefault(shard_name, {})[cursor_value] = products
+            for shard_name, cursor_products in by_shard.items():
+                self.checkpoints[shard_name].mark_done(cursor_products, file_number, durable_bytes)
+
+    def on_result(self, shard_name, cursor_value, products_from_response, error_class):
+        self.cursors_done += 1
+        label = f"[{self.job_name}] " + (f"{shard_name} cursor {cursor_value}" if shard_name
+                                         else f"Cursor {cursor_value}")
+        if products_from_response is not None:
+            if not products_from_response:
+                logging.warning(
+                    f"{label}: Fetched 0 products. This might indicate end of data or an issue.")
+
+            new_products = (self.dedup.filter_new(products_from_response) if self.dedup
+                            else products_from_response)
+            # Everything derived from the page is buffered before the sink write, which may fsync
+            # and journal the cursor done (see _on_durable) before returning
+            if self.catalogue:
+                self.catalogue.add_stones(new_products, self.job_name)
+            if self.delta:
+                self.changes_sink.write(self.delta.observe_all(new_products))
+            self.sink.write(new_products, token=(shard_name, cursor_value), token_value=len(products_from_response))
+            self.products_overall += len(new_products)
+
+            logging.info(
+                f"{label}: Processed {len(products_from_response)} products. "
+                f"Total fetched so far: {self.products_overall}")
+        else:
+            self.cursors_failed += 1
+            if shard_name in self.checkpoints:
+                self.checkpoints[shard_name].mark_failed(cursor_value, error_class)
+
+        overall_elapsed_time = time.perf_counter() - self.start_time
+        minutes = int(overall_elapsed_time // 60)
+        seconds = int(overall_elapsed_time % 60)
+        # ETA from the average pace so far, against the cursors discovered so far
+        remaining_seconds = ((self.cursors_total - self.cursors_done) * overall_elapsed_time / self.cursors_done
+                             if self.cursors_done < self.cursors_total else 0)
+        logging.info(
+            f"[{self.job_name}] Progress: {self.cursors_done}/{self.cursors_total} cursors completed. "
+            f"Overall elapsed: {minutes:02d}m {seconds:02d}s, "
+            f"ETA {int(remaining_seconds // 60):02d}m {int(remaining_seconds % 60):02d}s."
+        )
+
+    def finish(self, completed):
+        """Finishes the outputs and journals, even after an interruption, and logs the job summary."""
+        # --- Final Save ---
+        # Finish the current output file, even when interrupted
+        self.sink.close()
+        failed = [cursor_value for checkpoint in self.checkpoints.values()
+                  for cursor_value in checkpoint.failed_cursors()]
+        if self.delta:
+            if completed and not failed and not self.cursors_failed:
+                self.changes_sink.write(self.delta.finish_run())
+                self.changes_sink.close()
+                self.delta.commit_run()
+            else:
+                self.changes_sink.close()
+                logging.warning(f"[{self.job_name}] Crawl incomplete: removed products are reported once the run "
+                                f"is finished with --resume/--retry-failed.")
+            logging.info(f"[{self.job_name}] Changes since the last run: {self.delta.counts}")
+            self.delta.close()
+        if self.dedup:
+            logging.info(f"[{self.job_name}] Dropped {self.dedup.duplicates_dropped} duplicate products.")
+            self.dedup.close()
+        if self.catalogue:
+            if completed and not failed and not self.cursors_failed:
+                # Like the delta's removed products: only a complete crawl shows which stones are gone
+                pruned = self.catalogue.prune_unseen_stones(self.job_name)
+                if pruned:
+                    logging.info(f"[{self.job_name}] Removed {pruned} stones no longer listed from "
+                                 f"{self.catalogue.path}.")
+            self.catalogue.close()
+            logging.info(f"[{self.job_name}] Upserted {self.catalogue.rows_written} products into "
+                         f"{self.catalogue.path}.")
+        if self.checkpoints:
+            if failed:
+                logging.warning(f"[{self.job_name}] {len(failed)} cursors failed; re-run with --retry-failed "
+                                f"to fetch them.")
+            for checkpoint in self.checkpoints.values():
+                checkpoint.close()
+
+        total_duration = time.perf_counter() - self.start_time
+        minutes = int(total_duration // 60)
+        seconds = int(total_duration % 60)
+
+        logging.info(f"[{self.job_name}] Scraping process finished.")
+        logging.info(f"[{self.job_name}] Total products collected: {self.products_overall}")
+        logging.info(f"[{self.job_name}] Total execution time: {minutes:02d}m {seconds:02d}s "
+                     f"({total_duration:.2f} seconds)")
+        return self.products_overall
+
+
+def run_jobs(jobs, parallel_requests=PARALLEL_REQUESTS, max_parallel_requests=MAX_PARALLEL_REQUESTS,
+             requests_per_second=REQUESTS_PER_SECOND, max_requests_per_second=MAX_REQUESTS_PER_SECOND,
+             pool_size=None, http2=False, cassette_path=None, metrics_dir=None, cache_path=None, cache_ttl=None,
+             archive_dir=None):
+    """
+    Crawls every CrawlJob in `jobs` at the same time over one connection pool and one rate
+    budget (concurrency and request rate are shared, not per job). With `cassette_path`, every
+    exchange is recorded for replay_server.py; with `metrics_dir`, request timings and progress
+    are written there (see crawl_metrics.py); with `cache_path`, responses are cached there and
+    reused for `cache_ttl` seconds (see response_cache.py); with `archive_dir`, every raw response
+    is archived there by walk and cursor (see response_archive.py). Returns {job name: products}.
+    """
+    logging.info(f"Starting Keyzar Jewelry API scraping process with {parallel_requests} requests in flight "
+                 f"for {', '.join(job.job_name for job in jobs)} "
+                 f"({sum(len(job.shards) for job in jobs)} cursor walks)...")
+    started = []
+    completed = False
+    try:
+        for job in jobs:
+            job.start()
+            started.append(job)
+        asyncio.run(_crawl_with_pool(jobs, parallel_requests, max_parallel_requests, requests_per_second,
+                                     max_requests_per_second, pool_size, http2, cassette_path, metrics_dir,
+                                     cache_path, cache_ttl, archive_dir))
+        completed = True
+    finally:
+        results = {}
+        for job in started:
+            try:
+                results[job.job_name] = job.finish(completed)
+            except Exception as e:
+                error_logger.critical(f"Could not finish job '{job.job_name}': {e}")
+    return results
+
+
+def run_crawl(base_json_payload, max_cursor, sink, parse_products=parse_diamond_products, api_url=API_URL,
+              parallel_requests=PARALLEL_REQUESTS, max_parallel_requests=MAX_PARALLEL_REQUESTS,
+              requests_per_second=REQUESTS_PER_SECOND, max_requests_per_second=MAX_REQUESTS_PER_SECOND,
+              pool_size=None, http2=False, checkpoint_path=None, job_name="default", resume=False,
+              retry_failed=False, discover_end=True, dedup_path=None, delta_path=None, changes_sink=None,
+              shards=None, cassette_path=None, metrics_dir=None, catalogue_path=None, cache_path=None,
+              cache_ttl=None, archive_dir=None):
+    """
+    Scrapes cursors 1..max_cursor through the async engine, streams each cursor's products into
+    `sink` (an output_sink.JsonlSink) as they arrive, and logs progress and errors.
+    With `discover_end`, `max_cursor` is only an upper bound: the real last cursor is learned
+    from the API before crawling, and the first empty page stops any further scheduling.
+    Concurrency starts at `parallel_requests` and request rate at `requests_per_second`; the
+    adaptive controller moves both between their floor and the given maximums.
+    With `checkpoint_path`, finished and failed cursors are journaled under `job_name`; `resume`
+    then skips everything already recorded and `retry_failed` re-fetches the failed cursors.
+    With `dedup_path`, products already emitted under `job_name` (same id/handle, or same
+    content) are dropped before they reach the sink, e.g. when price-sorted pages shift.
+    With `delta_path`, every product is compared against its state from the last run and the
+    differences are streamed into `changes_sink` (a second JsonlSink): added and changed
+    records with per-field diffs as they arrive, and removed ones once a crawl completes with
+    no failed cursors. `sink` still receives the full snapshot.
+    `shards` (a list of (name, payload) pairs, see partition.py) replaces the single payload
+    walk with one cursor walk per shard, all crawled at once; each shard is journaled as
+    `<job_name>:<name>` and their products meet in the same sink and dedup index.
+    With `cassette_path`, every request/response is also recorded (see cassette.py), and with
+    `metrics_dir` every attempt's timings go to a JSONL event log and a Prometheus file there.
+    With `catalogue_path`, every product sent to the sink is also upserted into that
+    catalogue_store.CatalogueStore, in batches flushed along with the sink.
+    With `cache_path`, responses go through a response_cache.ResponseCache: conditional
+    requests when the server sent validators, and no request at all within `cache_ttl` seconds.
+    With `archive_dir`, every raw response is kept in a response_archive.ResponseArchive there.
+    Returns the total number of products collected.
+    """
+    job = CrawlJob(base_json_payload, max_cursor, sink, parse_products=parse_products, api_url=api_url,
+                   checkpoint_path=checkpoint_path, job_name=job_name, resume=resume, retry_failed=retry_failed,
+                   discover_end=discover_end, dedup_path=dedup_path, delta_path=delta_path,
+                   changes_sink=changes_sink, shards=shards, catalogue_path=catalogue_path)
+    results = run_jobs([job], parallel_requests=parallel_requests, max_parallel_requests=max_parallel_requests,
+                       requests_per_second=requests_per_second, max_requests_per_second=max_requests_per_second,
+                       pool_size=pool_size, http2=http2, cassette_path=cassette_path, metrics_dir=metrics_dir,
+                       cache_path=cache_path, cache_ttl=cache_ttl, archive_dir=archive_dir)
+    return results.get(job_name, job.products_overall)
@@ -0,0 +1,214 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+
+import aiohttp
+
+import json_codec
+
+# --- Configuration ---
+PROGRESS_INTERVAL_SECONDS = 10  # How often the progress/ETA line is logged and the .prom file rewritten
+PROMETHEUS_FILE = "crawl.prom"  # Written in the metrics directory, for node_exporter's textfile collector
+METRIC_PREFIX = "keyzar_crawl"
+# Upper bounds (seconds) of the request duration histogram
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20)
+# Per-request phases summed into <prefix>_phase_seconds_total, in the order they happen
+PHASES = ("wait", "pool_wait", "dns", "connect", "ttfb", "body", "parse", "backoff")
+
+# The cursor walk ("job" or "job:shard") the current task is crawling; set once per walk by
+# crawl_engine so events can be attributed without threading the name through every call
+current_walk = contextvars.ContextVar("current_walk", default="default")
+
+
+def timing_trace_config():
+    """
+    aiohttp TraceConfig that fills the dict passed as `trace_request_ctx` with the DNS, connect
+    (TCP and TLS together; aiohttp does not report them separately) and connection-pool wait
+    times of a request, and whether it reused a pooled connection.
+    """
+    async def on_queued_start(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx["_pool_wait_start"] = time.perf_counter()
+
+    async def on_queued_end(session, ctx, params):
+        timing = ctx.trace_request_ctx
+        if timing is not None and "_pool_wait_start" in timing:
+            timing["pool_wait_s"] = time.perf_counter() - timing.pop("_pool_wait_start")
+
+    async def on_dns_start(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx["_dns_start"] = time.perf_counter()
+
+    async def on_dns_end(session, ctx, params):
+        timing = ctx.trace_request_ctx
+        if timing is not None and "_dns_start" in timing:
+            timing["dns_s"] = time.perf_counter() - timing.pop("_dns_start")
+
+    async def on_connect_start(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx["_connect_start"] = time.perf_counter()
+
+    async def on_connect_end(session, ctx, params):
+        timing = ctx.trace_request_ctx
+        if timing is not None and "_connect_start" in timing:
+            timing["connect_s"] = time.perf_counter() - timing.pop("_connect_start")
+            timing["reused"] = False
+
+    async def on_reuse(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx["reused"] = True
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_queued_start.append(on_queued_start)
+    trace_config.on_connection_queued_end.append(on_queued_end)
+    trace_config.on_dns_resolvehost_start.append(on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_end)
+    trace_config.on_connection_create_start.append(on_connect_start)
+    trace_config.on_connection_create_end.append(on_connect_end)
+    trace_config.on_connection_reuseconn.append(on_reuse)
+    return trace_config
+
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}h {seconds % 3600 // 60:02d}m {seconds % 60:02d}s"
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+class CrawlMetrics:
+    """
+    Structured instrumentation for a crawl: one JSONL event per HTTP attempt in
+    `<metrics_dir>/events_<timestamp>.jsonl` (timings per phase, bytes, status, attempt number,
+    products), running totals per job, and a Prometheus text file rewritten every
+    PROGRESS_INTERVAL_SECONDS together with a throughput/ETA line per job.
+    """
+
+    def __init__(self, metrics_dir):
+        os.makedirs(metrics_dir, exist_ok=True)
+        self.metrics_dir = metrics_dir
+        self.events_path = os.path.join(metrics_dir, f"events_{time.strftime('%Y%m%dT%H%M%S')}.jsonl")
+        self._events = open(self.events_path, "ab")
+        self.started_at = time.perf_counter()
+        self.totals = {}  # job -> counters
+        self.statuses = {}  # (job, status) -> requests
+        self.phase_seconds = {phase: 0.0 for phase in PHASES}
+        self.duration_buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_count = 0
+        self.duration_sum = 0.0
+
+    def _job_totals(self, job):
+        if job not in self.totals:
+            self.totals[job] = {"requests": 0, "retries": 0, "errors": 0, "bytes": 0, "products": 0}
+        return self.totals[job]
+
+    def record_request(self, cursor_value, attempt, status, timing, wait_s=0.0, parse_s=0.0, products=None,
+                       error=None):
+        """Records one HTTP attempt for a cursor; `timing` is the dict PooledSession filled in."""
+        walk = current_walk.get()
+        job = walk.split(":", 1)[0]
+        timing = timing or {}
+        event = {
+            "ts": round(time.time(), 3), "job": job, "walk": walk, "cursor": cursor_value, "attempt": attempt,
+            "status": status, "bytes": timing.get("bytes", 0), "reused": timing.get("reused"),
+            "products": products, "error": error,
+            "wait_ms": round(wait_s * 1000, 2), "parse_ms": round(parse_s * 1000, 2),
+        }
+        for phase in ("pool_wait", "dns", "connect", "ttfb", "body", "total"):
+            if f"{phase}_s" in timing:
+                event[f"{phase}_ms"] = round(timing[f"{phase}_s"] * 1000, 2)
+        self._events.write(json_codec.dumps_line(event))
+
+        totals = self._job_totals(job)
+        totals["requests"] += 1
+        totals["bytes"] += timing.get("bytes", 0)
+        totals["products"] += products or 0
+        if attempt > 1:
+            totals["retries"] += 1
+        if error:
+            totals["errors"] += 1
+        status_key = (job, status or "none")
+        self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+
+        self.phase_seconds["wait"] += wait_s
+        self.phase_seconds["parse"] += parse_s
+        for phase in ("pool_wait", "dns", "connect", "ttfb", "body"):
+            self.phase_seconds[phase] += timing.get(f"{phase}_s", 0.0)
+        if "total_s" in timing:
+            self.duration_count += 1
+            self.duration_sum += timing["total_s"]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if timing["total_s"] <= bound:
+                    self.duration_buckets[index] += 1
+
+    def record_backoff(self, seconds):
+        """Time spent sleeping before a retry (our own sleeps, not the server's)."""
+        self.phase_seconds["backoff"] += seconds
+
+    def progress_lines(self, jobs):
+        """One throughput/ETA line per CrawlJob, from the cursors discovered so far."""
+        lines = []
+        for job in jobs:
+            if job.start_time is None:
+                continue
+            elapsed = time.perf_counter() - job.start_time
+            rate = job.cursors_done / elapsed if elapsed else 0.0
+            remaining = max(job.cursors_total - job.cursors_done, 0)
+            eta = _format_duration(remaining / rate) if rate and job.cursors_total else "unknown"
+            lines.append(f"[{job.job_name}] {job.cursors_done}/{job.cursors_total} cursors, "
+                         f"{job.products_overall} products, {job.products_overall / elapsed if elapsed else 0:.1f} "
+                         f"products/s, {rate:.2f} cursors/s, ETA {eta}.")
+        return lines
+
+    def write_prometheus(self, jobs=()):
+        """Rewrites the .prom file atomically so a scraper never reads half of it."""
+        prefix = METRIC_PREFIX
+        lines = [f"# TYPE {prefix}_requests_total counter"]
+        for (job, status), count in sorted(self.statuses.items(), key=lambda item: str(item[0])):
+            lines.append(f"{prefix}_requests_total{_labels(job=job, status=status)} {count}")
+        for counter in ("retries", "errors", "bytes", "products"):
+            lines.append(f"# TYPE {prefix}_{counter}_total counter")
+            for job, totals in sorted(self.totals.items()):
+                lines.append(f"{prefix}_{counter}_total{_labels(job=job)} {totals[counter]}")
+        lines.append(f"# TYPE {prefix}_phase_seconds_total counter")
+        for phase in PHASES:
+            lines.append(f"{prefix}_phase_seconds_total{_labels(phase=phase)} {self.phase_seconds[phase]:.6f}")
+        lines.append(f"# TYPE {prefix}_request_duration_seconds histogram")
+        for bound, count in zip(DURATION_BUCKETS, self.duration_buckets):
+            lines.append(f"{prefix}_request_duration_seconds_bucket{_labels(le=bound)} {count}")
+        lines.append(f'{prefix}_request_duration_seconds_bucket{{le="+Inf"}} {self.duration_count}')
+        lines.append(f"{prefix}_request_duration_seconds_sum {self.duration_sum:.6f}")
+        lines.append(f"{prefix}_request_duration_seconds_count {self.duration_count}")
+        for gauge in ("cursors_done", "cursors_total", "cursors_failed", "products_overall"):
+            lines.append(f"# TYPE {prefix}_{gauge} gauge")
+            for job in jobs:
+                lines.append(f"{prefix}_{gauge}{_labels(job=job.job_name)} {getattr(job, gauge)}")
+        lines.append(f"# TYPE {prefix}_elapsed_seconds gauge")
+        lines.append(f"{prefix}_elapsed_seconds {time.perf_counter() - self.started_at:.3f}")
+
+        path = os.path.join(self.metrics_dir, PROMETHEUS_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+
+    def report(self, jobs):
+        for line in self.progress_lines(jobs):
+            logging.info(line)
+        self._events.flush()
+        self.write_prometheus(jobs)
+
+    async def report_periodically(self, jobs, interval=PROGRESS_INTERVAL_SECONDS):
+        """Runs alongside a crawl (cancel it when the crawl ends)."""
+        while True:
+            await asyncio.sleep(interval)
+            self.report(jobs)
+
+    def close(self, jobs=()):
+        self.write_prometheus(jobs)
+        self._events.close()
+        logging.info(f"Request events written to {self.events_path}; metrics to "
+                     f"{os.path.join(self.metrics_dir, PROMETHEUS_FILE)}.")
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+KEY_FIELDS = ("id", "handle")  # First non-empty one identifies a product; otherwise its content hash does
+
+
+def product_key(product, key_fields=KEY_FIELDS):
+    """Stable identity for a product: 'id:<id>', 'handle:<handle>' or a hash of its content."""
+    for field in key_fields:
+        value = product.get(field)
+        if value not in (None, ""):
+            return f"{field}:{value}"
+    canonical = json.dumps(product, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return "sha1:" + hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def _digest(key):
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class DedupIndex:
+    """
+    On-disk set of product keys already emitted, stored as 16-byte hashes in SQLite so it stays
+    small for hundreds of thousands of products. Keys added since the last commit() are visible
+    to this index straight away but only become permanent on commit(); the crawl engine commits
+    when the sink reports the matching products fsynced, so a crash never marks unsaved products
+    as seen. The output position those products end at is committed with them (see durable_output()).
+    """
+
+    def __init__(self, path, namespace="default"):
+        self.namespace = namespace
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS seen (
+                namespace TEXT NOT NULL,
+                key_hash BLOB NOT NULL,
+                PRIMARY KEY (namespace, key_hash)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS durable_output (
+                namespace TEXT PRIMARY KEY,
+                file_number INTEGER NOT NULL,
+                durable_bytes INTEGER NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.duplicates_dropped = 0
+
+    def reset(self):
+        """Forgets every key in this namespace; used when a crawl starts from scratch."""
+        self.conn.execute("DELETE FROM seen WHERE namespace = ?", (self.namespace,))
+        self.conn.execute("DELETE FROM durable_output WHERE namespace = ?", (self.namespace,))
+        self.conn.commit()
+
+    def add(self, key):
+        """Records `key`; returns True if it had not been seen before."""
+        cursor = self.conn.execute("INSERT OR IGNORE INTO seen (namespace, key_hash) VALUES (?, ?)",
+                                   (self.namespace, _digest(key)))
+        if cursor.rowcount:
+            return True
+        self.duplicates_dropped += 1
+        return False
+
+    def filter_new(self, products, key_func=product_key):
+        """Returns only the products whose key has not been seen, recording theirs."""
+        return [product for product in products if self.add(key_func(product))]
+
+    def commit(self, file_number=None, durable_bytes=None):
+        """Makes the keys added so far permanent, recording the output file and byte they end at if given."""
+        if file_number is not None:
+            self.conn.execute("INSERT OR REPLACE INTO durable_output (namespace, file_number, durable_bytes) "
+                              "VALUES (?, ?, ?)", (self.namespace, file_number, durable_bytes))
+        self.conn.commit()
+
+    def durable_output(self):
+        """(file number, bytes) of the output the committed keys end at: (0, 0) if none, None if never recorded."""
+        row = self.conn.execute("SELECT file_number, durable_bytes FROM durable_output WHERE namespace = ?",
+                                (self.namespace,)).fetchone()
+        if row is None and self.conn.execute("SELECT 1 FROM seen WHERE namespace = ? LIMIT 1",
+                                             (self.namespace,)).fetchone() is None:
+            return 0, 0
+        return row
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
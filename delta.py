@@ -0,0 +1,135 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import json_codec
+
+# Identify a stone by its id; without one, by its title plus the certificate metafields
+CERTIFICATE_FIELDS = ("lab", "carat", "shape", "color", "clarity")
+
+OP_ADDED = "added"
+OP_CHANGED = "changed"
+OP_REMOVED = "removed"
+
+
+def snapshot_key(product, certificate_fields=CERTIFICATE_FIELDS):
+    """Stable identity of a stone across runs: 'id:<id>' or 'cert:<title>|<lab>|<carat>|...'."""
+    if product.get("id") not in (None, ""):
+        return f"id:{product['id']}"
+    return "cert:" + "|".join(str(product.get(field, "")) for field in ("title",) + tuple(certificate_fields))
+
+
+def field_changes(old, new):
+    """Per-field diff of two flat records: {field: [old value, new value]} for every field that differs."""
+    return {field: [old.get(field), new.get(field)]
+            for field in sorted(set(old) | set(new))
+            if old.get(field) != new.get(field)}
+
+
+def _fingerprint(record_bytes):
+    return hashlib.blake2b(record_bytes, digest_size=16).digest()
+
+
+class DeltaState:
+    """
+    Last known version of every product of a job, kept in SQLite between runs. Each run observes
+    the products it fetched and gets back change records (added / changed with per-field diffs);
+    finish_run() then reports the products no longer listed as removed. Observations become
+    permanent on commit(), which the crawl engine calls once the change log is fsynced.
+    """
+
+    def __init__(self, path, job_name):
+        self.job_name = job_name
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS products (
+                job TEXT NOT NULL,
+                key TEXT NOT NULL,
+                fingerprint BLOB NOT NULL,
+                record BLOB NOT NULL,
+                last_run INTEGER NOT NULL,
+                PRIMARY KEY (job, key)
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                job TEXT NOT NULL,
+                run INTEGER NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL,
+                PRIMARY KEY (job, run)
+            );
+        """)
+        self.conn.commit()
+        self.run = None
+        self.resumed = False
+        self.counts = {OP_ADDED: 0, OP_CHANGED: 0, OP_REMOVED: 0}
+
+    def begin_run(self, resume=False):
+        """Starts a new run, or with `resume` continues the latest unfinished one (setting `resumed`)."""
+        row = self.conn.execute("SELECT run, finished_at FROM runs WHERE job = ? ORDER BY run DESC LIMIT 1",
+                                (self.job_name,)).fetchone()
+        self.resumed = bool(resume and row and row[1] is None)
+        if self.resumed:
+            self.run = row[0]
+        else:
+            self.run = (row[0] if row else 0) + 1
+            with self.conn:
+                self.conn.execute("INSERT INTO runs (job, run, started_at) VALUES (?, ?, ?)",
+                                  (self.job_name, self.run, time.time()))
+        return self.run
+
+    def observe(self, product, key_func=snapshot_key):
+        """Records `product` as seen in this run; returns its change record, or None if it is unchanged."""
+        key = key_func(product)
+        record_bytes = json_codec.dumps_line(dict(sorted(product.items())))
+        fingerprint = _fingerprint(record_bytes)
+        row = self.conn.execute("SELECT fingerprint, record FROM products WHERE job = ? AND key = ?",
+                                (self.job_name, key)).fetchone()
+        self.conn.execute(
+            "INSERT INTO products (job, key, fingerprint, record, last_run) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (job, key) DO UPDATE SET fingerprint = excluded.fingerprint, "
+            "record = excluded.record, last_run = excluded.last_run",
+            (self.job_name, key, fingerprint, record_bytes, self.run))
+        if row is None:
+            self.counts[OP_ADDED] += 1
+            return {"op": OP_ADDED, "key": key, "record": product}
+        if row[0] != fingerprint:
+            self.counts[OP_CHANGED] += 1
+            return {"op": OP_CHANGED, "key": key, "changes": field_changes(json_codec.loads(row[1]), product)}
+        return None
+
+    def observe_all(self, products, key_func=snapshot_key):
+        """Change records for a page of products."""
+        changes = []
+        for product in products:
+            change = self.observe(product, key_func)
+            if change is not None:
+                changes.append(change)
+        return changes
+
+    def finish_run(self):
+        """
+        Closes the run and returns a removal record for every product it did not see, forgetting them.
+        Only call this after a complete crawl: products on pages that failed would be reported as removed.
+        """
+        rows = self.conn.execute("SELECT key, record FROM products WHERE job = ? AND last_run < ?",
+                                 (self.job_name, self.run)).fetchall()
+        removed = [{"op": OP_REMOVED, "key": key, "record": json_codec.loads(record)} for key, record in rows]
+        self.counts[OP_REMOVED] += len(removed)
+        return removed
+
+    def commit_run(self):
+        """Deletes the products reported removed and marks the run finished."""
+        with self.conn:
+            self.conn.execute("DELETE FROM products WHERE job = ? AND last_run < ?", (self.job_name, self.run))
+            self.conn.execute("UPDATE runs SET finished_at = ? WHERE job = ? AND run = ?",
+                              (time.time(), self.job_name, self.run))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import glob
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import time
+
+from crawl_engine import REQUEST_TIMEOUT_SECONDS, crawl_cursors_async, discover_last_cursor
+from dedup_index import DedupIndex
+from http_session import PooledSession
+from job_runner import JOBS_CONFIG, DEFAULT_MAX_CURSOR, build_payload, load_config
+from output_sink import PART_SUFFIX, JsonlSink, iter_jsonl
+from partition import DEFAULT_SPLITS, partition_payload
+from rate_control import AdaptiveRateController
+from work_queue import STATUS_LEASED, STATUS_PENDING, open_work_queue
+
+# --- Configuration ---
+QUEUE_LOCATION = os.path.join("downloads", "work_queue.sqlite")  # SQLite path, or a redis://host:6379/0 URL
+QUEUE_NAME = "center-stones"
+CURSORS_PER_TASK = 50  # Cursors leased to a worker at a time; a crashed worker loses at most this many
+WORKER_DIR = "workers"  # Per-worker JSONL files go in <output_dir>/<WORKER_DIR>/<job>, merged by the merge step
+IDLE_POLL_SECONDS = 5  # How long an idle worker waits before asking again while other leases are out
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+error_logger = logging.getLogger('scraper_errors')
+error_handler = logging.FileHandler('scraper_errors.log')
+error_handler.setLevel(logging.ERROR)
+error_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+error_handler.setFormatter(error_formatter)
+error_logger.addHandler(error_handler)
+
+
+def _selected_jobs(config, only):
+    return [job for job in config["jobs"] if not only or job["name"] in only]
+
+
+def _controller(config):
+    # Rates in the config apply per worker process: every worker is meant to have its own egress
+    return AdaptiveRateController(config.get("parallel_requests", 10), config.get("max_parallel_requests", 20),
+                                  config.get("requests_per_second", 5), config.get("max_requests_per_second", 15))
+
+
+def _worker_dir(job):
+    return os.path.join(job.get("output_dir", "downloads"), WORKER_DIR, job["name"])
+
+
+async def _plan_tasks(config, jobs, partitioned):
+    controller = _controller(config)
+    tasks = []
+    async with PooledSession(controller.max_concurrency, http2=config.get("http2", False),
+                             timeout_seconds=REQUEST_TIMEOUT_SECONDS) as session:
+        for job in jobs:
+            payload = build_payload(config, job)
+            shards = [(None, payload)]
+            if partitioned or job.get("partitioned"):
+                shards = partition_payload(payload, job.get("partition_splits", DEFAULT_SPLITS))
+            api_url = job.get("api_url", config["api_url"])
+            last_cursors = await asyncio.gather(*(
+                discover_last_cursor(session, controller, shard_payload, job.get("max_cursor", DEFAULT_MAX_CURSOR),
+                                     api_url=api_url)
+                for _, shard_payload in shards))
+            for (shard_name, shard_payload), last_cursor in zip(shards, last_cursors):
+                for first_cursor in range(1, last_cursor + 1, CURSORS_PER_TASK):
+                    last_in_task = min(last_cursor, first_cursor + CURSORS_PER_TASK - 1)
+                    task_id = f"{job['name']}|{shard_name or '-'}|{first_cursor}-{last_in_task}"
+                    tasks.append((task_id, {
+                        "job": job["name"], "shard": shard_name, "payload": shard_payload, "api_url": api_url,
+                        "first_cursor": first_cursor, "last_cursor": last_in_task,
+                        "worker_dir": _worker_dir(job), "compression": job.get("compression"),
+                    }))
+    return tasks
+
+
+def plan(config_path=JOBS_CONFIG, queue_location=QUEUE_LOCATION, only=None, partitioned=False):
+    """
+    Discovers each job's (or shard's) last cursor and puts its cursor ranges on a fresh queue.
+    The jobs' worker files from the previous plan are deleted, so merge() only sees this one's.
+    """
+    config = load_config(config_path)
+    jobs = _selected_jobs(config, only)
+    tasks = asyncio.run(_plan_tasks(config, jobs, partitioned))
+    for job in jobs:
+        shutil.rmtree(_worker_dir(job), ignore_errors=True)
+    queue = open_work_queue(queue_location, QUEUE_NAME)
+    queue.reset()
+    queue.put_many(tasks)
+    logging.info(f"Queued {len(tasks)} tasks of up to {CURSORS_PER_TASK} cursors on {queue_location}.")
+    queue.close()
+
+
+async def _work(config, queue, worker_id):
+    controller = _controller(config)
+    sinks = {}
+    tasks_done = 0
+    try:
+        async with PooledSession(controller.max_concurrency, http2=config.get("http2", False),
+                                 timeout_seconds=REQUEST_TIMEOUT_SECONDS) as session:
+            while True:
+                leased = queue.lease(worker_id)
+                if leased is None:
+                    counts = queue.counts()
+                    if counts[STATUS_PENDING] == 0 and counts[STATUS_LEASED] == 0:
+                        break
+                    # Other workers still hold leases; one may expire and come back to us
+                    await asyncio.sleep(IDLE_POLL_SECONDS)
+                    continue
+                task_id, task = leased
+                if task["worker_dir"] not in sinks:
+                    sinks[task["worker_dir"]] = JsonlSink(task["worker_dir"], worker_id,
+                                                          compression=task.get("compression")).start()
+                sink = sinks[task["worker_dir"]]
+
+                progress = {"failed": 0, "products": 0, "renewed_at": time.monotonic()}
+
+                def on_result(cursor_value, products, error_class):
+                    if products is None:
+                        progress["failed"] += 1
+                    else:
+                        sink.write(products)
+                        progress["products"] += len(products)
+                    if time.monotonic() - progress["renewed_at"] > queue.lease_seconds / 3:
+                        if not queue.renew(task_id, worker_id):
+                            logging.warning(f"[{worker_id}] Lost the lease on {task_id}; finishing it anyway.")
+                        progress["renewed_at"] = time.monotonic()
+
+                await crawl_cursors_async(session, controller, range(task["first_cursor"], task["last_cursor"] + 1),
+                                          task["payload"], on_result, api_url=task["api_url"])
+                # Only hand the task back once its products are on disk
+                sink.sync()
+                if progress["failed"]:
+                    queue.fail(task_id, worker_id, f"{progress['failed']} cursors failed")
+                    logging.warning(f"[{worker_id}] {task_id}: {progress['failed']} cursors failed; re-queued.")
+                else:
+                    queue.complete(task_id, worker_id)
+                    tasks_done += 1
+                    logging.info(f"[{worker_id}] {task_id}: {progress['products']} products.")
+    finally:
+        for sink in sinks.values():
+            sink.close()
+    logging.info(f"[{worker_id}] No tasks left after {tasks_done} tasks.")
+
+
+def work(config_path=JOBS_CONFIG, queue_location=QUEUE_LOCATION, worker_id=None):
+    """Leases cursor ranges until the queue is drained, writing <output_dir>/workers/<job>/<worker>_NNN.jsonl."""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    config = load_config(config_path)
+    queue = open_work_queue(queue_location, QUEUE_NAME)
+    try:
+        asyncio.run(_work(config, queue, worker_id))
+    finally:
+        queue.close()
+
+
+def merge(config_path=JOBS_CONFIG, only=None):
+    """
+    Merges the worker files of each job's last plan into <output_dir>/<job>_NNN.jsonl, keeping the
+    first copy of each product (re-leased ranges are fetched twice). Files a crashed worker left as .part
+    are included: everything in them was synced before its tasks were reported done.
+    """
+    config = load_config(config_path)
+    for job in _selected_jobs(config, only):
+        name = job["name"]
+        output_dir = job.get("output_dir", "downloads")
+        worker_dir = _worker_dir(job)
+        for part_path in glob.glob(os.path.join(worker_dir, f"*{PART_SUFFIX}")):
+            os.replace(part_path, part_path[:-len(PART_SUFFIX)])
+            logging.info(f"Recovered partial worker file {part_path[:-len(PART_SUFFIX)]}")
+        worker_files = sorted(glob.glob(os.path.join(worker_dir, "*.jsonl*")))
+
+        seen = DedupIndex(os.path.join(output_dir, f"{name}_merge_seen.sqlite"), namespace=name)
+        seen.reset()
+        sink = JsonlSink(output_dir, name, compression=job.get("compression"),
+                         records_per_file=job.get("products_per_file", 5000)).start()
+        try:
+            for file_path in worker_files:
+                sink.write(seen.filter_new(iter_jsonl(file_path)))
+        finally:
+            sink.close()
+            seen.close()
+        logging.info(f"Merged {len(worker_files)} worker files of job '{name}' into {sink.records_written} "
+                     f"products ({seen.duplicates_dropped} duplicates dropped).")
+
+
+def status(queue_location=QUEUE_LOCATION):
+    queue = open_work_queue(queue_location, QUEUE_NAME)
+    logging.info(f"Queue {queue_location}: {queue.counts()}")
+    queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl the configured jobs with workers sharing a work queue.")
+    parser.add_argument("command", choices=["plan", "work", "merge", "status"],
+                        help="plan: queue the cursor ranges; work: crawl leased ranges; "
+                             "merge: combine worker files; status: show queue counts.")
+    parser.add_argument("--config", default=JOBS_CONFIG, help=f"Jobs config file (default: {JOBS_CONFIG}).")
+    parser.add_argument("--queue", default=QUEUE_LOCATION, help="SQLite queue path or redis:// URL.")
+    parser.add_argument("--job", action="append", dest="only", metavar="NAME",
+                        help="Only plan/merge this job; may be given more than once.")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="Plan one cursor walk per filter shard instead of one per job.")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start on this host.")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        plan(args.config, args.queue, only=args.only, partitioned=args.partitioned)
+    elif args.command == "work":
+        if args.processes > 1:
+            workers = [multiprocessing.Process(target=work, args=(args.config, args.queue))
+                       for _ in range(args.processes)]
+            for process in workers:
+                process.start()
+            for process in workers:
+                process.join()
+        else:
+            work(args.config, args.queue)
+    elif args.command == "merge":
+        merge(args.config, only=args.only)
+    else:
+        status(args.queue)
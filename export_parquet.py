@@ -0,0 +1,107 @@
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# --- Configuration ---
+ROW_GROUP_SIZE = 10000  # Rows buffered per Parquet row group; bounds memory during the export
+
+# Column types for the center-stones products. Everything not listed is a plain string.
+DIAMOND_NUMERIC_COLUMNS = ["carat", "price", "price_min", "weight", "length", "width", "length_width_ratio"]
+DIAMOND_CATEGORICAL_COLUMNS = ["shape", "color", "clarity", "lab", "polish", "symmetry", "fluorescence"]
+
+# Column types for the engagement-ring settings rows built by combine_to_csv.py
+RING_NUMERIC_COLUMNS = ["variant_price", "variant_compare_at_price"]
+RING_CATEGORICAL_COLUMNS = [
+    "vendor", "productType", "variant_center_stone_shape", "variant_material", "sideStonesOrigin",
+    "sideStonesShape", "sideStonesAverageColor", "sideStonesAverageClarity", "style",
+]
+
+
+def to_float(value):
+    """Parses '1,234.50' / '1.2' / 3 into a float; blanks and junk become None (null)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def build_schema(fieldnames, numeric_columns, categorical_columns):
+    """float64 for numeric columns, dictionary-encoded strings for categorical ones, strings otherwise."""
+    fields = []
+    for name in fieldnames:
+        if name in numeric_columns:
+            fields.append(pa.field(name, pa.float64()))
+        elif name in categorical_columns:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def _rows_to_table(rows, schema):
+    columns = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_floating(field.type):
+            columns.append(pa.array([to_float(value) for value in values], type=pa.float64()))
+        else:
+            strings = pa.array([None if value in (None, "") else str(value) for value in values], type=pa.string())
+            if pa.types.is_dictionary(field.type):
+                strings = strings.dictionary_encode()
+            columns.append(strings)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def export_rows(rows, output_path, fieldnames, numeric_columns, categorical_columns, file_format="parquet"):
+    """
+    Writes an iterable of row dicts to a typed Parquet (or Feather) file, ROW_GROUP_SIZE rows at
+    a time. Returns the number of rows written, or None if pyarrow is not installed.
+    """
+    if pa is None:
+        logging.warning(f"pyarrow is not installed; skipping the {file_format} export to '{output_path}'.")
+        return None
+
+    schema = build_schema(fieldnames, numeric_columns, categorical_columns)
+    tmp_path = output_path + ".part"
+    rows_written = 0
+    tables = []  # Feather is written in one go, so its row groups are kept until the end
+    writer = pq.ParquetWriter(tmp_path, schema, compression="zstd") if file_format == "parquet" else None
+
+    def write_chunk(chunk):
+        table = _rows_to_table(chunk, schema)
+        if writer:
+            writer.write_table(table)
+        else:
+            tables.append(table)
+
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= ROW_GROUP_SIZE:
+                write_chunk(chunk)
+                rows_written += len(chunk)
+                chunk = []
+        if chunk or rows_written == 0:
+            write_chunk(chunk)
+            rows_written += len(chunk)
+    finally:
+        if writer:
+            writer.close()
+    if not writer:
+        # Feather needs one dictionary per column, so the row groups are unified first
+        table = pa.concat_tables(tables).unify_dictionaries().combine_chunks()
+        feather.write_feather(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, output_path)
+    logging.info(f"Exported {rows_written} rows to '{output_path}'.")
+    return rows_written
@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+import aiohttp
+
+from crawl_metrics import timing_trace_config
+from response_cache import cache_key
+
+try:
+    import httpx  # Optional: only needed for HTTP/2
+except ImportError:
+    httpx = None
+
+# --- Configuration ---
+KEEPALIVE_TIMEOUT_SECONDS = 30  # How long an idle pooled connection is kept open
+DNS_CACHE_SECONDS = 300  # Resolve keyzarjewelry.com once per 5 minutes instead of per request
+
+
+class HttpStatusError(Exception):
+    """Raised when the server answers with a 4xx/5xx status."""
+
+    def __init__(self, status, headers, body):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class HttpTransportError(Exception):
+    """Raised when the request never produced a response (connection reset, timeout, DNS...)."""
+
+
+class PooledSession:
+    """
+    One keep-alive connection pool shared by every in-flight request, so a crawl pays the
+    TCP+TLS handshake once per pooled connection instead of once per cursor.
+    Uses aiohttp by default, or httpx when `http2=True`. With a `recorder` (a cassette.Cassette),
+    every exchange, errors included, is also saved for offline replay. With `metrics` (a
+    crawl_metrics.CrawlMetrics), requests given a `timing` dict have it filled with their phase
+    timings, byte count and status for the caller to report. With `cache` (a
+    response_cache.ResponseCache), successful responses are cached and reused as it allows.
+    `archive` (a response_archive.ResponseArchive) is carried for callers that know which
+    cursor a body belongs to and archive it themselves.
+    """
+
+    def __init__(self, pool_size, http2=False, timeout_seconds=20, recorder=None, metrics=None, cache=None,
+                 archive=None):
+        if http2 and httpx is None:
+            raise RuntimeError("HTTP/2 requires httpx with the h2 extra: pip install 'httpx[http2]'")
+        self.pool_size = pool_size
+        self.http2 = http2
+        self.timeout_seconds = timeout_seconds
+        self.recorder = recorder
+        self.metrics = metrics
+        self.cache = cache
+        self.archive = archive
+        self._client = None
+
+    async def __aenter__(self):
+        if self.http2:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size,
+                                  keepalive_expiry=KEEPALIVE_TIMEOUT_SECONDS)
+            self._client = httpx.AsyncClient(http2=True, limits=limits, timeout=self.timeout_seconds)
+        else:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size,
+                                             keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS,
+                                             ttl_dns_cache=DNS_CACHE_SECONDS)
+            self._client = aiohttp.ClientSession(connector=connector,
+                                                 timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+                                                 trace_configs=[timing_trace_config()] if self.metrics else None)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.http2:
+            await self._client.aclose()
+        else:
+            await self._client.close()
+        self._client = None
+
+    async def post_form(self, url, form_data, headers=None, timing=None):
+        """POSTs url-encoded `form_data` and returns (status, headers, body bytes); raises on 4xx/5xx."""
+        return await self._request("POST", url, data=form_data, headers=headers, timing=timing)
+
+    async def get(self, url, params=None, headers=None, timing=None):
+        """GETs `url` and returns (status, headers, body bytes); raises on 4xx/5xx."""
+        return await self._request("GET", url, params=params, headers=headers, timing=timing)
+
+    def cached(self, method, url, data=None, params=None):
+        """(status, headers, body) of a cached response still within the cache TTL, or None."""
+        if self.cache is None:
+            return None
+        entry = self.cache.lookup(cache_key(method, url, data, params))
+        if entry is None or not self.cache.is_fresh(entry):
+            return None
+        self.cache.stats["hits"] += 1
+        return self.cache.serve(entry)
+
+    def invalidate_cached(self, method, url, data=None, params=None):
+        """Drops the cached response for a request whose body the caller could not use."""
+        if self.cache is not None:
+            self.cache.invalidate(cache_key(method, url, data, params))
+
+    async def _request(self, method, url, timing=None, **kwargs):
+        key = entry = None
+        if self.cache is not None:
+            key = cache_key(method, url, kwargs.get("data"), kwargs.get("params"))
+            entry = self.cache.lookup(key)
+            if entry is not None:
+                if self.cache.is_fresh(entry):
+                    self.cache.stats["hits"] += 1
+                    return self.cache.serve(entry)
+                kwargs["headers"] = dict(kwargs.get("headers") or {}, **self.cache.conditional_headers(entry))
+
+        start = time.perf_counter()
+        if self.http2:
+            try:
+                response = await self._client.request(method, url, **kwargs)
+            except httpx.HTTPError as e:
+                raise HttpTransportError(repr(e)) from e
+            status, response_headers, body = response.status_code, response.headers, response.content
+        else:
+            try:
+                async with self._client.request(method, url, trace_request_ctx=timing, **kwargs) as response:
+                    if timing is not None:
+                        timing["ttfb_s"] = time.perf_counter() - start  # Headers are in
+                    body = await response.read()
+                    status, response_headers = response.status, response.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise HttpTransportError(repr(e)) from e
+
+        if timing is not None:
+            timing["total_s"] = time.perf_counter() - start
+            if "ttfb_s" in timing:
+                timing["body_s"] = timing["total_s"] - timing["ttfb_s"]
+            timing["bytes"] = len(body)
+            timing["status"] = status
+
+        if self.recorder is not None:
+            self.recorder.record(method, url, kwargs.get("data"), status, response_headers, body,
+                                 params=kwargs.get("params"))
+        if self.cache is not None:
+            if status == 304 and entry is not None:
+                self.cache.touch(key)
+                self.cache.stats["revalidated"] += 1
+                return self.cache.serve(entry)
+            self.cache.stats["misses"] += 1
+            if 200 <= status < 300:
+                self.cache.store(key, url, status, response_headers, body)
+        if status >= 400:
+            raise HttpStatusError(status, response_headers, body)
+        return status, response_headers, body
@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import sqlite3
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from catalogue_store import CATALOGUE_PATH
+from http_session import HttpStatusError, HttpTransportError, PooledSession
+from rate_control import backoff_delay, parse_retry_after
+
+# --- Configuration ---
+IMAGE_DIR = "images"  # Files are stored as <IMAGE_DIR>/<first 2 hex digits>/<sha256>.<ext>
+IMAGE_INDEX_PATH = os.path.join(IMAGE_DIR, "index.sqlite")  # URL -> file, ETag and Last-Modified
+IMAGE_WIDTH = 800  # Width requested from the Shopify CDN; None fetches the originals
+CONCURRENCY = 8  # Downloads in flight
+MAX_RETRIES = 3  # Retries per image on 429/5xx and connection errors
+REQUEST_TIMEOUT_SECONDS = 30
+COMMIT_EVERY = 200  # Index rows written per transaction
+# Hosts (and path prefixes) served by Shopify's image CDN, which resizes on ?width=
+SHOPIFY_CDN_HOSTS = ("cdn.shopify.com",)
+SHOPIFY_CDN_PATH_PREFIX = "/cdn/shop/"
+
+# Catalogue columns holding image URLs: (table, column)
+IMAGE_SOURCES = [
+    ("stones", "originalSrc"),
+    ("stones", "image"),
+    ("ring_media", "url"),
+    ("ring_variants", "image_url"),
+]
+
+error_logger = logging.getLogger('scraper_errors')
+
+
+def sized_url(url, width=IMAGE_WIDTH):
+    """
+    Normalises an image URL (protocol-relative URLs get https) and, for Shopify CDN images,
+    asks for `width` pixels instead of the original; other hosts are left as they are.
+    """
+    if url.startswith("//"):
+        url = "https:" + url
+    parts = urlsplit(url)
+    if not width or not (parts.hostname in SHOPIFY_CDN_HOSTS or parts.path.startswith(SHOPIFY_CDN_PATH_PREFIX)):
+        return url
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key not in ("width", "height", "crop")]
+    query.append(("width", str(width)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def catalogue_image_urls(catalogue_path=CATALOGUE_PATH, width=IMAGE_WIDTH):
+    """Every distinct (sized) image URL in the catalogue; variants sharing an image count once."""
+    conn = sqlite3.connect(f"file:{catalogue_path}?mode=ro", uri=True)
+    urls = {}
+    try:
+        for table, column in IMAGE_SOURCES:
+            try:
+                for (url,) in conn.execute(f"SELECT DISTINCT \"{column}\" FROM {table} "
+                                           f"WHERE \"{column}\" LIKE '%//%'"):
+                    urls.setdefault(sized_url(url, width), None)
+            except sqlite3.OperationalError:
+                continue  # Table not created yet (e.g. no ring crawl so far)
+    finally:
+        conn.close()
+    return list(urls)
+
+
+def _extension(url, content_type):
+    extension = mimetypes.guess_extension((content_type or "").split(";")[0].strip())
+    if extension in (None, ".jpe"):
+        extension = os.path.splitext(urlsplit(url).path)[1].lower() or ".bin"
+    return extension
+
+
+class ImageIndex:
+    """
+    SQLite record of every image URL fetched: the content-addressed file it maps to and the
+    validators (ETag, Last-Modified) to ask the CDN for it again conditionally. A failed fetch
+    only records its status and error, so an image stored earlier keeps its file.
+    """
+
+    def __init__(self, path=IMAGE_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT,
+                path TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                bytes INTEGER,
+                status INTEGER,
+                fetched_at REAL NOT NULL,
+                error TEXT
+            )
+        """)
+        if "error" not in [row[1] for row in self.conn.execute("PRAGMA table_info(images)")]:
+            self.conn.execute("ALTER TABLE images ADD COLUMN error TEXT")  # Indexes from before errors were kept
+        self.conn.execute("CREATE INDEX IF NOT EXISTS images_sha256 ON images (sha256)")
+        self.conn.commit()
+        self._pending = 0
+
+    def get(self, url):
+        row = self.conn.execute("SELECT path, etag, last_modified FROM images WHERE url = ?", (url,)).fetchone()
+        return None if row is None else {"path": row[0], "etag": row[1], "last_modified": row[2]}
+
+    def put(self, url, sha256=None, path=None, etag=None, last_modified=None, content_type=None, size=None,
+            status=200):
+        self.conn.execute("INSERT OR REPLACE INTO images (url, sha256, path, etag, last_modified, content_type, "
+                          "bytes, status, fetched_at, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+                          (url, sha256, path, etag, last_modified, content_type, size, status, time.time()))
+        self._pending_write()
+
+    def fail(self, url, status, error):
+        """Records a failed fetch; a file, validators and fetched_at from an earlier success are kept."""
+        self.conn.execute("INSERT INTO images (url, status, error, fetched_at) VALUES (?, ?, ?, ?) "
+                          "ON CONFLICT (url) DO UPDATE SET status = excluded.status, error = excluded.error",
+                          (url, status, error, time.time()))
+        self._pending_write()
+
+    def _pending_write(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def touch(self, url):
+        """The CDN confirmed the stored file is current (304)."""
+        self.conn.execute("UPDATE images SET fetched_at = ?, status = 200, error = NULL WHERE url = ?",
+                          (time.time(), url))
+
+    def path_for(self, url, width=IMAGE_WIDTH):
+        """Local file for an image URL as it appears in the catalogue, or None if never fetched."""
+        row = self.conn.execute("SELECT path FROM images WHERE url = ? AND path IS NOT NULL",
+                                (sized_url(url, width),)).fetchone()
+        return row[0] if row else None
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+async def fetch_image(session, url, headers):
+    """GETs one image, retrying 429/5xx and transport errors with backoff; returns (status, headers, body)."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return await session.get(url, headers=headers)
+        except HttpStatusError as e:
+            if attempt == MAX_RETRIES or (e.status != 429 and e.status < 500):
+                raise
+            delay = parse_retry_after(e.headers.get("Retry-After")) or backoff_delay(attempt + 1)
+        except HttpTransportError:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt + 1)
+        await asyncio.sleep(delay)
+
+
+async def _image_worker(queue, session, index, image_dir, stats):
+    while True:
+        url = await queue.get()
+        try:
+            known = index.get(url)
+            headers = {}
+            # Only revalidate when the file is still on disk; otherwise fetch it whole
+            if known and known["path"] and os.path.exists(known["path"]):
+                if known["etag"]:
+                    headers["If-None-Match"] = known["etag"]
+                if known["last_modified"]:
+                    headers["If-Modified-Since"] = known["last_modified"]
+            try:
+                status, response_headers, body = await fetch_image(session, url, headers or None)
+            except (HttpStatusError, HttpTransportError) as e:
+                stats["failed"] += 1
+                error_logger.error(f"Image {url}: {e}")
+                index.fail(url, getattr(e, "status", None), str(e))
+                continue
+            if status == 304:
+                stats["not_modified"] += 1
+                index.touch(url)
+                continue
+
+            sha256 = hashlib.sha256(body).hexdigest()
+            content_type = response_headers.get("Content-Type")
+            path = os.path.join(image_dir, sha256[:2], sha256 + _extension(url, content_type))
+            if os.path.exists(path):
+                stats["same_content"] += 1  # Another URL (or an earlier run) already stored these bytes
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + ".part", "wb") as f:
+                    f.write(body)
+                os.replace(path + ".part", path)
+                stats["stored"] += 1
+            stats["bytes"] += len(body)
+            index.put(url, sha256, path, response_headers.get("ETag"), response_headers.get("Last-Modified"),
+                      content_type, len(body))
+        except Exception as e:
+            stats["failed"] += 1
+            error_logger.critical(f"Image {url}: unexpected error: {e}")
+        finally:
+            queue.task_done()
+
+
+async def fetch_images(urls, image_dir=IMAGE_DIR, index_path=IMAGE_INDEX_PATH, concurrency=CONCURRENCY):
+    """
+    Downloads every URL in `urls` with `concurrency` requests in flight into content-addressed
+    files under `image_dir`. URLs fetched before are revalidated with If-None-Match /
+    If-Modified-Since and skipped on 304. Returns the counters.
+    """
+    stats = {"stored": 0, "same_content": 0, "not_modified": 0, "failed": 0, "bytes": 0}
+    index = ImageIndex(index_path)
+    queue = asyncio.Queue()
+    for url in dict.fromkeys(urls):
+        queue.put_nowait(url)
+    try:
+        async with PooledSession(concurrency, timeout_seconds=REQUEST_TIMEOUT_SECONDS) as session:
+            workers = [asyncio.create_task(_image_worker(queue, session, index, image_dir, stats))
+                       for _ in range(concurrency)]
+            await queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    finally:
+        index.close()
+    return stats
+
+
+if __name__ == "__main__":
+    # Setup logging, only when run as a script so importing fetch_images has no side effects
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    error_handler = logging.FileHandler('scraper_errors.log')
+    error_handler.setLevel(logging.ERROR)
+    error_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    error_handler.setFormatter(error_formatter)
+    error_logger.addHandler(error_handler)
+
+    parser = argparse.ArgumentParser(description="Download the catalogue's product images into a local cache.")
+    parser.add_argument("--catalogue", default=CATALOGUE_PATH, help=f"Catalogue file (default: {CATALOGUE_PATH}).")
+    parser.add_argument("--image-dir", default=IMAGE_DIR)
+    parser.add_argument("--width", type=int, default=IMAGE_WIDTH,
+                        help="Width to request from the Shopify CDN (0 for the originals).")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    image_urls = catalogue_image_urls(args.catalogue, args.width)
+    logging.info(f"{len(image_urls)} distinct image URLs in {args.catalogue}.")
+    results = asyncio.run(fetch_images(image_urls, args.image_dir, os.path.join(args.image_dir, "index.sqlite"),
+                                       args.concurrency))
+    logging.info(f"Images: {results['stored']} stored, {results['same_content']} duplicates of stored content, "
+                 f"{results['not_modified']} unchanged (304), {results['failed']} failed; "
+                 f"{results['bytes'] / 1e6:.1f} MB downloaded in {time.perf_counter() - start_time:.1f} seconds.")
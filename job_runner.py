@@ -0,0 +1,113 @@
+import copy
+import json
+import logging
+import os
+
+from crawl_engine import CrawlJob, crawl_arg_parser, run_jobs
+from output_sink import JsonlSink
+from partition import DEFAULT_SPLITS, partition_payload, select_shards
+
+# --- Configuration ---
+JOBS_CONFIG = "jobs.json"  # Crawl jobs to run together; see build_payload() for the per-job keys
+DEFAULT_MAX_CURSOR = 5000  # Upper bound only; the real last cursor is discovered at run time
+DEFAULT_PRODUCTS_PER_FILE = 5000  # Start a new JSONL output file after this many products
+CATALOGUE_FILE = "catalogue.sqlite"  # Indexed product store in each job's output_dir (see catalogue_store.py)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+error_logger = logging.getLogger('scraper_errors')
+error_handler = logging.FileHandler('scraper_errors.log')
+error_handler.setLevel(logging.ERROR)
+error_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+error_handler.setFormatter(error_formatter)
+error_logger.addHandler(error_handler)
+
+
+def load_config(path=JOBS_CONFIG):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_payload(config, job):
+    """
+    Builds the center-stones request payload for one job: the shared "filters" (keyed by
+    stone type) with the job's own "filters" overrides applied to its "stone_type", plus its
+    "sort", "currency" and "currency_rate".
+    """
+    filters_state = copy.deepcopy(config.get("filters", {}))
+    stone_type = job["stone_type"]
+    filters_state.setdefault(stone_type, {}).update(job.get("filters", {}))
+    return {
+        "filtersState": filters_state,
+        "stoneTypeState": stone_type,
+        "sortState": job.get("sort", "price-ascending"),
+        "currencyCode": job.get("currency", "USD"),
+        "currencyRate": job.get("currency_rate", "1.0"),
+    }
+
+
+def build_crawl_job(config, job, resume=False, retry_failed=False, incremental=False, partitioned=False,
+                    shard=None):
+    """Turns one entry of the config's "jobs" list into a CrawlJob writing to <output_dir>/<name>_NNN.jsonl."""
+    name = job["name"]
+    output_dir = job.get("output_dir", "downloads")
+    payload = build_payload(config, job)
+    shards = None
+    if partitioned or job.get("partitioned"):
+        shards = select_shards(partition_payload(payload, job.get("partition_splits", DEFAULT_SPLITS)), shard)
+
+    # Journals are per job so jobs sharing an output directory never contend for the same SQLite file
+    sink = JsonlSink(output_dir, name, compression=job.get("compression"),
+                     records_per_file=job.get("products_per_file", DEFAULT_PRODUCTS_PER_FILE))
+    changes_sink = None
+    if incremental:
+        changes_sink = JsonlSink(os.path.join(output_dir, "changes"), f"{name}_changes",
+                                 compression=job.get("compression"))
+    return CrawlJob(payload, job.get("max_cursor", DEFAULT_MAX_CURSOR), sink,
+                    api_url=job.get("api_url", config["api_url"]),
+                    checkpoint_path=os.path.join(output_dir, f"{name}_checkpoint.sqlite"), job_name=name,
+                    resume=resume, retry_failed=retry_failed,
+                    dedup_path=os.path.join(output_dir, f"{name}_seen_products.sqlite"),
+                    delta_path=os.path.join(output_dir, f"{name}_delta_state.sqlite") if incremental else None,
+                    changes_sink=changes_sink, shards=shards,
+                    # One catalogue per output directory, shared by the jobs writing there
+                    catalogue_path=os.path.join(output_dir, job.get("catalogue", CATALOGUE_FILE)))
+
+
+def run_configured_jobs(config_path=JOBS_CONFIG, only=None, resume=False, retry_failed=False, incremental=False,
+                        partitioned=False, shard=None, record=None, metrics=None,
+                        cache=None, cache_ttl=None, archive=None):
+    """Runs every job in the config (or just the ones named in `only`) concurrently on one pool and rate budget."""
+    config = load_config(config_path)
+    jobs = [build_crawl_job(config, job, resume=resume, retry_failed=retry_failed, incremental=incremental,
+                            partitioned=partitioned, shard=shard)
+            for job in config["jobs"] if not only or job["name"] in only]
+    if not jobs:
+        logging.warning(f"No jobs to run in '{config_path}'.")
+        return {}
+    results = run_jobs(jobs, parallel_requests=config.get("parallel_requests", 10),
+                       max_parallel_requests=config.get("max_parallel_requests", 20),
+                       requests_per_second=config.get("requests_per_second", 5),
+                       max_requests_per_second=config.get("max_requests_per_second", 15),
+                       pool_size=config.get("connection_pool_size"), http2=config.get("http2", False),
+                       cassette_path=record, metrics_dir=metrics, cache_path=cache, cache_ttl=cache_ttl,
+                       archive_dir=archive)
+    for name, products in results.items():
+        logging.info(f"Job '{name}': {products} products.")
+    return results
+
+
+if __name__ == "__main__":
+    # Jobs can also be partitioned in the config, so --shard is checked against the jobs selected
+    parser = crawl_arg_parser("Run the crawl jobs listed in a config file concurrently.", shard_needs_partitioned=False)
+    parser.add_argument("--config", default=JOBS_CONFIG, help=f"Jobs config file (default: {JOBS_CONFIG}).")
+    parser.add_argument("--job", action="append", dest="only", metavar="NAME",
+                        help="Only run this job; may be given more than once.")
+    args = parser.parse_args()
+    selected = [job for job in load_config(args.config)["jobs"] if not args.only or job["name"] in args.only]
+    if args.shard and not args.partitioned and not any(job.get("partitioned") for job in selected):
+        parser.error("--shard only applies with --partitioned or to jobs with \"partitioned\" set in the config")
+    run_configured_jobs(args.config, only=args.only, resume=args.resume, retry_failed=args.retry_failed,
+                        incremental=args.incremental, partitioned=args.partitioned, shard=args.shard,
+                        record=args.record, metrics=args.metrics, cache=args.cache,
+                        cache_ttl=args.cache_ttl, archive=args.archive)
@@ -0,0 +1,226 @@
+import json
+from typing import Any, List, Optional, Union
+
+# Fastest installed backend wins: msgspec for the typed payload decoders, orjson for generic
+# loads/dumps, and the stdlib json module when neither is available.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import ijson  # Optional: streams ring payloads product by product
+except ImportError:
+    ijson = None
+
+# Where product nodes sit in the three ring payload shapes: a bare product list, the
+# {totalCount, nodes, pageInfo} Load More fragment and the full route document
+RING_PRODUCT_PREFIXES = ("item", "nodes.item", "collection.nodes.item")
+
+# Every backend's decode error, so callers can catch one name
+if msgspec is not None:
+    DecodeError = (json.JSONDecodeError, msgspec.DecodeError)
+else:
+    DecodeError = (json.JSONDecodeError,)
+
+
+def loads(data):
+    """Decodes JSON from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_line(obj):
+    """Encodes `obj` as one compact UTF-8 JSON line (bytes, newline included)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+if msgspec is not None:
+    # Typed views of the two payloads. Only the fields we extract are declared; msgspec skips
+    # every other key (enhancedProductMediaList, extras, seo, ...) without building it.
+    # Keep these in step with product_extractor.DIAMOND_FIELD_SPEC and combine_to_csv.py.
+    # Absent keys default to UNSET, which to_builtins leaves out, while an explicit null stays
+    # None: the extractor tells the two apart just as it does on a full decode.
+
+    class _Struct(msgspec.Struct):
+        pass
+
+    # --- center-stones API ---
+    class _DiamondVariant(_Struct):
+        price: Any = msgspec.UNSET
+        weight: Any = msgspec.UNSET
+
+    class _DiamondImage(_Struct):
+        originalSrc: Any = msgspec.UNSET
+
+    class _DiamondMedia(_Struct):
+        alt: Any = msgspec.UNSET
+        image: Optional[_DiamondImage] = msgspec.UNSET
+
+    class _DiamondImageInfo(_Struct):
+        src: Any = msgspec.UNSET
+
+    class _Metafield(_Struct):
+        key: Any = msgspec.UNSET
+        value: Any = msgspec.UNSET
+
+    class _DiamondProduct(_Struct):
+        id: Any = msgspec.UNSET
+        handle: Any = msgspec.UNSET
+        title: Any = msgspec.UNSET
+        price_min: Any = msgspec.UNSET
+        variants: Optional[List[_DiamondVariant]] = msgspec.UNSET
+        media: Optional[List[_DiamondMedia]] = msgspec.UNSET
+        images_info: Optional[List[_DiamondImageInfo]] = msgspec.UNSET
+        metafields: Optional[List[_Metafield]] = msgspec.UNSET
+
+    class _DiamondResponse(_Struct):
+        products: Optional[List[_DiamondProduct]] = msgspec.UNSET
+        # Catalogue size candidates read by crawl_engine.CATALOGUE_TOTAL_KEYS
+        totalCount: Any = msgspec.UNSET
+        total_count: Any = msgspec.UNSET
+        total: Any = msgspec.UNSET
+        productsCount: Any = msgspec.UNSET
+        products_count: Any = msgspec.UNSET
+
+    # --- engagement-ring-settings loader ---
+    class _Url(_Struct):
+        url: Any = msgspec.UNSET
+
+    class _Money(_Struct):
+        amount: Any = msgspec.UNSET
+
+    class _Value(_Struct):
+        value: Any = msgspec.UNSET
+
+    class _SelectedOption(_Struct):
+        name: Any = msgspec.UNSET
+        value: Any = msgspec.UNSET
+
+    class _RingMedia(_Struct):
+        alt: Any = msgspec.UNSET
+        image: Optional[_Url] = msgspec.UNSET
+
+    class _RingMediaNodes(_Struct):
+        nodes: Optional[List[_RingMedia]] = msgspec.UNSET
+
+    class _RingVariant(_Struct):
+        id: Any = msgspec.UNSET
+        sku: Any = msgspec.UNSET
+        title: Any = msgspec.UNSET
+        selectedOptions: Optional[List[_SelectedOption]] = msgspec.UNSET
+        price: Optional[_Money] = msgspec.UNSET
+        compareAtPrice: Optional[_Money] = msgspec.UNSET
+        image: Optional[_Url] = msgspec.UNSET
+
+    class _RingVariantNodes(_Struct):
+        nodes: Optional[List[_RingVariant]] = msgspec.UNSET
+
+    class _RingProduct(_Struct):
+        id: Any = msgspec.UNSET
+        title: Any = msgspec.UNSET
+        vendor: Any = msgspec.UNSET
+        handle: Any = msgspec.UNSET
+        productType: Any = msgspec.UNSET
+        description: Any = msgspec.UNSET
+        media: Optional[_RingMediaNodes] = msgspec.UNSET
+        variants: Optional[_RingVariantNodes] = msgspec.UNSET
+        shankWidth: Optional[_Value] = msgspec.UNSET
+        sideStonesOrigin: Optional[_Value] = msgspec.UNSET
+        sideStonesShape: Optional[_Value] = msgspec.UNSET
+        sideStonesAverageColor: Optional[_Value] = msgspec.UNSET
+        sideStonesAverageClarity: Optional[_Value] = msgspec.UNSET
+        sideStonesAverageCaratWeig: Optional[_Value] = msgspec.UNSET
+        style: Optional[_Value] = msgspec.UNSET
+        styleComment: Optional[_Value] = msgspec.UNSET
+
+    class _PageInfo(_Struct):
+        endCursor: Any = msgspec.UNSET
+        hasNextPage: Any = msgspec.UNSET
+
+    class _RingCollection(_Struct):
+        totalCount: Any = msgspec.UNSET
+        nodes: Optional[List[_RingProduct]] = msgspec.UNSET
+        pageInfo: Optional[_PageInfo] = msgspec.UNSET
+
+    class _RingDocument(_Struct):
+        # Either the {totalCount, nodes, pageInfo} fragment or the full route document
+        totalCount: Any = msgspec.UNSET
+        nodes: Optional[List[_RingProduct]] = msgspec.UNSET
+        pageInfo: Optional[_PageInfo] = msgspec.UNSET
+        collection: Optional[_RingCollection] = msgspec.UNSET
+
+    _diamond_decoder = msgspec.json.Decoder(_DiamondResponse)
+    _ring_decoder = msgspec.json.Decoder(Union[List[_RingProduct], _RingDocument])
+
+
+def decode_diamond_response(body):
+    """
+    Decodes a center-stones API response into plain dicts holding only the fields the
+    extractor reads. Falls back to a full decode when msgspec is not installed, or when a
+    field has a shape the structs don't expect, so one odd product never costs the page.
+    """
+    if msgspec is not None:
+        try:
+            return msgspec.to_builtins(_diamond_decoder.decode(body))
+        except msgspec.ValidationError:
+            pass  # Valid JSON, unexpected shape
+    return loads(body)
+
+
+def decode_ring_payload(body):
+    """
+    Decodes an engagement-ring-settings loader payload (a product list, the nodes fragment or
+    the full route document) into plain dicts, keeping only the fields combine_to_csv reads.
+    Like decode_diamond_response(), falls back to a full decode on an unexpected field shape.
+    """
+    if msgspec is not None:
+        try:
+            return msgspec.to_builtins(_ring_decoder.decode(body))
+        except msgspec.ValidationError:
+            pass
+    return loads(body)
+
+
+def ring_products(data):
+    """Returns the product nodes of an already decoded ring payload, whichever of the three shapes it has."""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        if isinstance(data.get("nodes"), list):
+            return data["nodes"]
+        collection = data.get("collection")
+        if isinstance(collection, dict) and isinstance(collection.get("nodes"), list):
+            return collection["nodes"]
+    return []
+
+
+def iter_ring_products(file_obj):
+    """
+    Yields the product nodes of a ring payload read from binary `file_obj` one at a time.
+    With ijson installed the file is streamed and only the current product is ever built, so
+    multi-megabyte route documents parse in bounded memory; otherwise the whole payload is
+    decoded with decode_ring_payload().
+    """
+    if ijson is None:
+        yield from ring_products(decode_ring_payload(file_obj.read()))
+        return
+    builder, product_prefix = None, None
+    for prefix, event, value in ijson.parse(file_obj, use_float=True):
+        if builder is None:
+            if event == "start_map" and prefix in RING_PRODUCT_PREFIXES:
+                builder, product_prefix = ijson.ObjectBuilder(), prefix
+                builder.event(event, value)
+            continue
+        builder.event(event, value)
+        if event == "end_map" and prefix == product_prefix:
+            yield builder.value
+            builder = None
@@ -1,88 +1,192 @@
-import json
 import csv
+import io
 import os
 import glob
 import logging
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import json_codec
+from dedup_index import DedupIndex, product_key
+from export_parquet import DIAMOND_CATEGORICAL_COLUMNS, DIAMOND_NUMERIC_COLUMNS, export_rows
+from output_sink import iter_jsonl
+from product_extractor import DIAMOND_FIELD_SPEC, DIAMOND_METAFIELDS
 
 # --- Configuration ---
 JSON_BATCHES_DIR = "downloads"  # Directory where JSON batch files are saved
 OUTPUT_CSV_FILE = "jewelry_products.csv"  # Name of the final merged CSV file
+TYPED_EXPORT_FORMAT = "parquet"  # Also write a typed "parquet" or "feather" file next to the CSV; None to skip
+MERGE_WORKERS = os.cpu_count() or 1  # Processes parsing batch files in parallel
+FILES_IN_FLIGHT_PER_WORKER = 2  # Bounds how many parsed files wait in memory to be written
+
+# Columns produced by the center-stones scrapers. Set USE_KNOWN_FIELDNAMES to skip the
+# first pass over every file; any other key is then dropped from the CSV.
+KNOWN_FIELDNAMES = sorted(list(DIAMOND_FIELD_SPEC) + list(DIAMOND_METAFIELDS))
+USE_KNOWN_FIELDNAMES = False
+
+DEDUP_INDEX_PATH = os.path.join(JSON_BATCHES_DIR, "merge_seen.sqlite")  # Keys already merged (rebuilt every run)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
+def iter_products_in_file(file_path):
+    """Yields the products stored in one .json batch file or .jsonl[.gz|.zst] output file."""
+    if ".jsonl" in file_path:
+        yield from iter_jsonl(file_path)
+        return
+    with open(file_path, 'rb') as f:
+        data = json_codec.loads(f.read())
+    if isinstance(data, list):
+        yield from data
+    else:
+        logging.warning(f"File '{os.path.basename(file_path)}' does not contain a list of products. Skipping.")
+
+
+def scan_file_fieldnames(file_path):
+    """First pass: returns (set of keys seen, product count) for one file, or (None, 0) if unreadable."""
+    fieldnames = set()
+    count = 0
+    try:
+        for product in iter_products_in_file(file_path):
+            fieldnames.update(product.keys())
+            count += 1
+    except json_codec.DecodeError as e:
+        print(f"Error decoding JSON from '{os.path.basename(file_path)}': {e}. Skipping this file.")
+        return None, 0
+    except IOError as e:
+        print(f"Error reading file '{os.path.basename(file_path)}': {e}. Skipping this file.")
+        return None, 0
+    return fieldnames, count
+
+
+def render_file_rows(file_path, fieldnames):
+    """
+    Second pass: renders one file's products as (product key, CSV line) pairs so workers do the
+    formatting and the parent only has to drop duplicates and write.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    rows = []
+    try:
+        for product in iter_products_in_file(file_path):
+            writer.writerow(product)
+            rows.append((product_key(product), buffer.getvalue()))
+            buffer.seek(0)
+            buffer.truncate()
+    except json_codec.DecodeError + (IOError,) as e:
+        print(f"Error reading '{os.path.basename(file_path)}': {e}. Skipping this file.")
+        return []
+    return rows
+
+
+def ordered_parallel_map(executor, func, paths, *args):
+    """Like executor.map, but keeps only a bounded number of results waiting so memory stays flat."""
+    max_in_flight = max(1, MERGE_WORKERS * FILES_IN_FLIGHT_PER_WORKER)
+    pending = deque()
+    for path in paths:
+        pending.append((path, executor.submit(func, path, *args)))
+        if len(pending) >= max_in_flight:
+            done_path, future = pending.popleft()
+            yield done_path, future.result()
+    while pending:
+        done_path, future = pending.popleft()
+        yield done_path, future.result()
+
+
 def merge_json_batches_to_csv():
     """
     Merges all JSON files from a specified directory into a single CSV file.
+    Runs in two streaming passes (columns, then rows) with files parsed by a process pool, so
+    memory stays bounded by a few files no matter how large the catalogue is. Rows are written
+    in file order, so the output is the same on every run.
     """
     logging.info(f"Starting merge process for JSON files in '{JSON_BATCHES_DIR}'...")
     start_time = time.perf_counter()
 
-    all_products = []
-    json_files_found = 0
-
-    # Find all JSON files in the specified directory
-    # Using glob for pattern matching (e.g., products_batch_*.json)
-    json_file_paths = sorted(glob.glob(os.path.join(JSON_BATCHES_DIR, "*.json")))
+    # Find all JSON and JSON Lines files in the specified directory
+    # Using glob for pattern matching (e.g., batch_*.json, lab_*.jsonl.gz)
+    json_file_paths = sorted(
+        path for pattern in ("*.json", "*.jsonl", "*.jsonl.gz", "*.jsonl.zst")
+        for path in glob.glob(os.path.join(JSON_BATCHES_DIR, pattern)))
 
     if not json_file_paths:
         logging.warning(f"No JSON files found in '{JSON_BATCHES_DIR}'. Nothing to merge.")
         return
 
-    # 1. Load all data from JSON files
-    for file_path in json_file_paths:
-        json_files_found += 1
+    with ProcessPoolExecutor(max_workers=MERGE_WORKERS) as executor:
+        # 1. Determine all unique fieldnames (CSV headers)
+        if USE_KNOWN_FIELDNAMES:
+            fieldnames = KNOWN_FIELDNAMES
+            readable_paths = json_file_paths
+        else:
+            fieldnames = set()
+            readable_paths = []
+            total_products = 0
+            for file_path, (file_fieldnames, count) in ordered_parallel_map(executor, scan_file_fieldnames,
+                                                                            json_file_paths):
+                if file_fieldnames is None:
+                    continue
+                fieldnames.update(file_fieldnames)
+                readable_paths.append(file_path)
+                total_products += count
+
+            if total_products == 0:
+                logging.warning("No valid product data found across all JSON files. CSV will not be created.")
+                return
+
+            # Sort fieldnames to ensure consistent column order in the CSV
+            fieldnames = sorted(fieldnames)
+            logging.info(f"Scanned {len(readable_paths)} JSON files. Total products to write: {total_products}")
+        logging.info(f"CSV headers identified: {fieldnames}")
+
+        # 2. Stream each file's rows into a single CSV file, keeping the first copy of each product
+        products_written = 0
+        seen = DedupIndex(DEDUP_INDEX_PATH, namespace="csv")
+        seen.reset()
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    all_products.extend(data)
-                    logging.info(f"Loaded {len(data)} products from '{os.path.basename(file_path)}'.")
-                else:
-                    logging.warning(
-                        f"File '{os.path.basename(file_path)}' does not contain a list of products. Skipping.")
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from '{os.path.basename(file_path)}': {e}. Skipping this file.")
+            with open(JSON_BATCHES_DIR + '/' + OUTPUT_CSV_FILE, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer.writeheader()  # Write the header row
+
+                # DictWriter leaves cells blank for missing keys, in the workers as well
+                for file_path, rows in ordered_parallel_map(executor, render_file_rows,
+                                                            readable_paths, fieldnames):
+                    count = 0
+                    for key, row_text in rows:
+                        if seen.add(key):
+                            csvfile.write(row_text)
+                            count += 1
+                    products_written += count
+                    logging.info(f"Wrote {count} products from '{os.path.basename(file_path)}'.")
+
+            logging.info(f"All {products_written} products successfully merged and saved to '{OUTPUT_CSV_FILE}'.")
+            if seen.duplicates_dropped:
+                logging.info(f"Dropped {seen.duplicates_dropped} duplicate products.")
+
         except IOError as e:
-            print(f"Error reading file '{os.path.basename(file_path)}': {e}. Skipping this file.")
+            print(f"Critical error: Could not write to CSV file '{OUTPUT_CSV_FILE}': {e}")
         except Exception as e:
-            print(
-                f"An unexpected error occurred while processing '{os.path.basename(file_path)}': {e}. Skipping this file.")
-
-    if not all_products:
-        logging.warning("No valid product data found across all JSON files. CSV will not be created.")
-        return
-
-    logging.info(
-        f"Successfully loaded data from {json_files_found} JSON files. Total products to write: {len(all_products)}")
-
-    # 2. Determine all unique fieldnames (CSV headers)
-    fieldnames = set()
-    for product in all_products:
-        fieldnames.update(product.keys())
-
-    # Sort fieldnames to ensure consistent column order in the CSV
-    fieldnames = sorted(list(fieldnames))
-    logging.info(f"CSV headers identified: {fieldnames}")
-
-    # 3. Write data to a single CSV file
-    try:
-        with open(JSON_BATCHES_DIR +'/'+ OUTPUT_CSV_FILE, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()  # Write the header row
-
-            # Write each product dictionary as a row
-            # DictWriter automatically handles missing keys by leaving cells blank
-            writer.writerows(all_products)
-
-        logging.info(f"All products successfully merged and saved to '{OUTPUT_CSV_FILE}'.")
-
-    except IOError as e:
-        print(f"Critical error: Could not write to CSV file '{OUTPUT_CSV_FILE}': {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred during CSV writing: {e}")
+            print(f"An unexpected error occurred during CSV writing: {e}")
+        finally:
+            seen.close()
+
+    # 3. Typed columnar export alongside the CSV (numbers as float64, grades dictionary-encoded)
+    if TYPED_EXPORT_FORMAT:
+        typed_path = os.path.join(JSON_BATCHES_DIR,
+                                  os.path.splitext(OUTPUT_CSV_FILE)[0] + "." + TYPED_EXPORT_FORMAT)
+        typed_seen = DedupIndex(DEDUP_INDEX_PATH, namespace="typed")
+        typed_seen.reset()
+        products = (product for file_path in readable_paths for product in iter_products_in_file(file_path)
+                    if typed_seen.add(product_key(product)))
+        try:
+            export_rows(products, typed_path, fieldnames, DIAMOND_NUMERIC_COLUMNS, DIAMOND_CATEGORICAL_COLUMNS,
+                        file_format=TYPED_EXPORT_FORMAT)
+        except Exception as e:
+            print(f"An unexpected error occurred during the {TYPED_EXPORT_FORMAT} export: {e}")
+        finally:
+            typed_seen.close()
 
     end_time = time.perf_counter()
     total_duration = end_time - start_time
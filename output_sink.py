@@ -0,0 +1,226 @@
+import glob
+import gzip
+import io
+import logging
+import os
+import time
+
+import json_codec
+
+try:
+    import zstandard  # Optional: only needed for compression="zstd"
+except ImportError:
+    zstandard = None
+
+# --- Configuration ---
+FLUSH_BYTES = 1024 * 1024  # Write the in-memory buffer out once it holds this many bytes
+FSYNC_INTERVAL_SECONDS = 5  # fsync (and report durable records) at most this often
+PART_SUFFIX = ".part"  # Files are written under this suffix and renamed into place when complete
+
+EXTENSIONS = {None: ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+error_logger = logging.getLogger('scraper_errors')
+
+
+def _open_compressed_writer(raw_file, compression):
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw_file, mode="wb")
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).stream_writer(raw_file, closefd=False)
+    return raw_file
+
+
+def _flush_compressed_writer(writer, compression):
+    """Pushes everything written so far through the compressor so a reader tailing the file can decode it."""
+    if compression == "gzip":
+        writer.flush()  # GzipFile.flush() emits a Z_SYNC_FLUSH block
+    elif compression == "zstd":
+        writer.flush(zstandard.FLUSH_BLOCK)
+
+
+def iter_jsonl(path):
+    """Yields one record per line of a .jsonl, .jsonl.gz or .jsonl.zst file or its .part, skipping a torn last line."""
+    name = path[:-len(PART_SUFFIX)] if path.endswith(PART_SUFFIX) else path
+    if name.endswith(".gz"):
+        stream = gzip.open(path, "rt", encoding="utf-8")
+    elif name.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Reading {path} requires the zstandard package")
+        raw = open(path, "rb")
+        stream = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8")
+    else:
+        stream = open(path, "r", encoding="utf-8")
+
+    with stream:
+        try:
+            for line_number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json_codec.loads(line)
+                except json_codec.DecodeError as e:
+                    error_logger.error(f"{path}:{line_number}: Skipping unreadable line: {e}")
+        except (EOFError, OSError) as e:
+            # A crawl that was killed mid-write leaves a truncated compressed stream
+            error_logger.error(f"{path}: Stopped at truncated data: {e}")
+
+
+class JsonlSink:
+    """
+    Streams products to `<output_dir>/<prefix>_NNN.jsonl[.gz|.zst]` as compact JSON Lines.
+    Lines are buffered in memory up to FLUSH_BYTES and fsynced every FSYNC_INTERVAL_SECONDS;
+    after each fsync `on_durable(tokens, file_number, durable_bytes)` reports which write tokens
+    (cursors) are safely on disk, and how many bytes of that file they end at. Each file is
+    written as `<name>.part` and atomically renamed when it is complete, so anything without the
+    suffix is whole; the .part file can be tailed meanwhile.
+    """
+
+    def __init__(self, output_dir, prefix, compression=None, records_per_file=None, flush_bytes=FLUSH_BYTES,
+                 fsync_interval_seconds=FSYNC_INTERVAL_SECONDS):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown compression {compression!r}; use one of {list(EXTENSIONS)}")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("compression='zstd' requires the zstandard package: pip install zstandard")
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.compression = compression
+        self.records_per_file = records_per_file
+        self.flush_bytes = flush_bytes
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self.on_durable = None
+        self.file_number = None
+        self.records_written = 0
+        self._raw_file = None
+        self._writer = None
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._records_in_file = 0
+        self._pending_tokens = {}
+        self._finished_bytes = None
+        self._last_fsync = time.monotonic()
+
+    def file_path(self, file_number):
+        return os.path.join(self.output_dir, f"{self.prefix}_{file_number:03d}{EXTENSIONS[self.compression]}")
+
+    def _existing_files(self):
+        """(file number, path) of every file already in output_dir for this prefix, finished or .part."""
+        pattern = os.path.join(self.output_dir, f"{glob.escape(self.prefix)}_*{EXTENSIONS[self.compression]}")
+        return [(int(number), path) for path in glob.glob(pattern) + glob.glob(pattern + PART_SUFFIX)
+                for number in [os.path.basename(path)[len(self.prefix) + 1:].split(".")[0]] if number.isdigit()]
+
+    def next_file_number(self):
+        """One past the highest file number already in output_dir for this prefix (finished or .part), or 1."""
+        return max((number for number, _ in self._existing_files()), default=0) + 1
+
+    def _drop_undurable_output(self, file_number, durable_bytes):
+        # Anything past the last durable point a journal recorded belongs to cursors it never marked
+        # done; those are fetched again, so keeping it would write their products twice
+        for number, path in self._existing_files():
+            if number > file_number:
+                os.remove(path)
+                logging.info(f"Removed {path}: none of it was journaled as durable.")
+            elif number == file_number and durable_bytes is not None and os.path.getsize(path) > durable_bytes:
+                with open(path, "r+b") as f:
+                    f.truncate(durable_bytes)
+                logging.info(f"Cut {path} back to the {durable_bytes} bytes journaled as durable.")
+
+    def start(self, first_file_number=1, on_durable=None, durable=None):
+        """
+        Opens the first output file; leftover .part files from a killed run are renamed into place first.
+        A resumed crawl passes `durable`, the (file number, durable_bytes) its journal last recorded, and
+        whatever was written after that point is removed first.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        if durable is not None:
+            self._drop_undurable_output(*durable)
+        for part_path in glob.glob(os.path.join(self.output_dir, f"{glob.escape(self.prefix)}_*{PART_SUFFIX}")):
+            os.replace(part_path, part_path[:-len(PART_SUFFIX)])
+            logging.info(f"Recovered partial output file {part_path[:-len(PART_SUFFIX)]}")
+        self.on_durable = on_durable
+        self.file_number = first_file_number
+        self._open_file()
+        return self
+
+    def _open_file(self):
+        self._raw_file = open(self.file_path(self.file_number) + PART_SUFFIX, "wb")
+        self._writer = _open_compressed_writer(self._raw_file, self.compression)
+        self._records_in_file = 0
+
+    def write(self, records, token=None, token_value=None):
+        """
+        Appends `records`; `token` (e.g. a cursor) is reported through on_durable once they are fsynced.
+        A write is never split across files (a file may run up to one write past records_per_file), so
+        its token is only reported once every one of its records is on disk.
+        """
+        for record in records:
+            line = json_codec.dumps_line(record)
+            self._buffer.append(line)
+            self._buffer_bytes += len(line)
+            self._records_in_file += 1
+            self.records_written += 1
+        if token is not None:
+            self._pending_tokens[token] = token_value if token_value is not None else len(records)
+        if self.records_per_file and self._records_in_file >= self.records_per_file:
+            self._rotate()
+            return
+        if self._buffer_bytes >= self.flush_bytes:
+            self._write_buffer()
+        if time.monotonic() - self._last_fsync >= self.fsync_interval_seconds:
+            self.sync()
+
+    def _write_buffer(self):
+        if self._buffer:
+            self._writer.write(b"".join(self._buffer))
+            self._buffer = []
+            self._buffer_bytes = 0
+
+    def sync(self):
+        """Writes the buffer out, fsyncs the current file and reports the now-durable tokens."""
+        self._write_buffer()
+        _flush_compressed_writer(self._writer, self.compression)
+        self._raw_file.flush()
+        os.fsync(self._raw_file.fileno())
+        self._last_fsync = time.monotonic()
+        if self._pending_tokens and self.on_durable:
+            self.on_durable(self._pending_tokens, self.file_number, self._raw_file.tell())
+        self._pending_tokens = {}
+
+    def _finish_file(self):
+        self._write_buffer()
+        if self._writer is not self._raw_file:
+            self._writer.close()  # Writes the compressed stream trailer
+        self._raw_file.flush()
+        os.fsync(self._raw_file.fileno())
+        self._finished_bytes = self._raw_file.tell()
+        self._raw_file.close()
+        final_path = self.file_path(self.file_number)
+        os.replace(final_path + PART_SUFFIX, final_path)
+        logging.info(f"Finished output file {final_path} ({self._records_in_file} products).")
+
+    def _rotate(self):
+        # Records already buffered belong to the file being finished
+        self._finish_file()
+        if self._pending_tokens and self.on_durable:
+            self.on_durable(self._pending_tokens, self.file_number, self._finished_bytes)
+        self._pending_tokens = {}
+        self.file_number += 1
+        self._open_file()
+
+    def close(self):
+        """Finishes the current file (removing it if nothing was written to it) and reports the last tokens."""
+        if self._raw_file is None:
+            return
+        if self._records_in_file == 0 and not self._buffer:
+            if self._writer is not self._raw_file:
+                self._writer.close()
+            self._raw_file.close()
+            os.remove(self.file_path(self.file_number) + PART_SUFFIX)
+            if self._pending_tokens and self.on_durable:
+                self.on_durable(self._pending_tokens, None, None)
+        else:
+            self._finish_file()
+            if self._pending_tokens and self.on_durable:
+                self.on_durable(self._pending_tokens, self.file_number, self._finished_bytes)
+        self._pending_tokens = {}
+        self._raw_file = None
+        self._writer = None
@@ -0,0 +1,80 @@
+import copy
+import itertools
+import math
+
+# --- Configuration ---
+# How many slices each filter range is cut into; the shards are every combination of slices
+DEFAULT_SPLITS = {"priceRange": 8, "caratRange": 2, "colorRange": 2}
+# Smallest difference between two values of a range: the next slice starts one step after the last one ends
+RANGE_STEPS = {"priceRange": 0.01, "caratRange": 0.01, "colorRange": 1}
+# Ranges spread over orders of magnitude are cut at geometric points so slices hold similar stone counts
+GEOMETRIC_RANGES = frozenset(["priceRange", "caratRange"])
+
+
+def _snap(value, step):
+    if isinstance(step, int):
+        return int(math.floor(value))
+    return round(round(value / step) * step, 2)
+
+
+def split_range(low, high, parts, step=1, geometric=False):
+    """
+    Cuts the inclusive range [low, high] into at most `parts` disjoint inclusive slices that
+    together cover every value on the `step` grid, e.g. split_range(0, 7, 2) -> [[0, 3], [4, 7]].
+    """
+    if parts <= 1 or high - low < step:
+        return [[low, high]]
+    cuts = []
+    for i in range(1, parts):
+        if geometric and low > 0:
+            point = low * (high / low) ** (i / parts)
+        else:
+            point = low + (high - low) * i / parts
+        point = _snap(point, step)
+        if low <= point < high and (not cuts or point > cuts[-1]):
+            cuts.append(point)
+
+    slices = []
+    start = low
+    for cut in cuts:
+        slices.append([start, cut])
+        start = _snap(cut + step, step)
+    slices.append([start, high])
+    return slices
+
+
+def partition_payload(base_json_payload, splits=DEFAULT_SPLITS):
+    """
+    Splits the active stone type's filter ranges (see `splits`) into disjoint shards.
+    Returns a list of (shard name, payload) pairs such as ("price3.carat0.color1", {...});
+    every shard is an ordinary payload whose cursor walk is a fraction of the full one.
+    """
+    stone_type = base_json_payload["stoneTypeState"]
+    filters = base_json_payload["filtersState"][stone_type]
+
+    dimensions = []
+    for range_key, parts in splits.items():
+        if range_key not in filters:
+            continue
+        low, high = filters[range_key]
+        slices = split_range(low, high, parts, RANGE_STEPS.get(range_key, 1), range_key in GEOMETRIC_RANGES)
+        dimensions.append([(range_key, index, value_range) for index, value_range in enumerate(slices)])
+
+    shards = []
+    for combination in itertools.product(*dimensions):
+        payload = copy.deepcopy(base_json_payload)
+        for range_key, index, value_range in combination:
+            payload["filtersState"][stone_type][range_key] = value_range
+        name = ".".join(f"{range_key[:-len('Range')]}{index}" for range_key, index, _ in combination)
+        shards.append((name, payload))
+    return shards
+
+
+def select_shards(shards, spec):
+    """Picks this machine's share of `shards` from an "I/N" spec: every N-th shard starting at I."""
+    if not spec:
+        return shards
+    index, count = (int(part) for part in spec.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"Shard spec {spec!r} must be I/N with 0 <= I < N")
+    return shards[index::count]
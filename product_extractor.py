@@ -0,0 +1,77 @@
+import re
+
+# Field spec for the center-stones products: output column -> path into the raw product.
+# Paths are dotted keys with [n] list indexes; a missing step yields the default ("").
+DIAMOND_FIELD_SPEC = {
+    "id": "id",
+    "handle": "handle",
+    "title": "title",
+    "price_min": "price_min",
+    "price": "variants[0].price",
+    "weight": "variants[0].weight",
+    "originalSrc": "media[0].image.originalSrc",
+    "alt": "media[0].alt",
+    "image": "images_info[0].src",
+}
+
+# Metafields copied as columns when present, keyed by their "key"
+DIAMOND_METAFIELDS = frozenset([
+    "carat", "color", "shape", "clarity", "polish",
+    "lab", "fluorescence", "length", "width",
+    "symmetry", "length_width_ratio"
+])
+
+_PATH_STEP = re.compile(r"([^.\[\]]+)|\[(\d+)\]")
+
+
+def parse_path(path):
+    """Splits 'variants[0].price' into ['variants', 0, 'price']."""
+    steps = []
+    for key, index in _PATH_STEP.findall(path):
+        steps.append(int(index) if index else key)
+    if not steps:
+        raise ValueError(f"Empty field path: {path!r}")
+    return steps
+
+
+def compile_extractor(field_spec, metafields=frozenset(), metafields_key="metafields", default=""):
+    """
+    Compiles `field_spec` (and an optional set of metafield keys) into one Python function that
+    turns a raw product dict into a flat row. The function is generated once as straight-line
+    subscripts, so per product there is no path parsing, no .get() chains and no list scans.
+    """
+    lines = ["def extract(item):", "    row = {}"]
+    for column, path in field_spec.items():
+        access = "item" + "".join(f"[{step!r}]" for step in parse_path(path))
+        lines += [
+            "    try:",
+            f"        row[{column!r}] = {access}",
+            "    except (KeyError, IndexError, TypeError):",
+            f"        row[{column!r}] = default",
+        ]
+    if metafields:
+        lines += [
+            f"    for field in item.get({metafields_key!r}) or ():",
+            "        key = field.get('key')",
+            "        if key in metafields:",
+            "            row[key] = field.get('value', default)",
+        ]
+    lines.append("    return row")
+
+    namespace = {"default": default, "metafields": frozenset(metafields)}
+    exec(compile("\n".join(lines), "<compiled extractor>", "exec"), namespace)
+    return namespace["extract"]
+
+
+def compile_response_parser(field_spec, metafields=frozenset(), products_key="products"):
+    """Returns `parse(res_data)` that applies the compiled extractor to every product in a response."""
+    extract = compile_extractor(field_spec, metafields)
+
+    def parse(res_data):
+        return [extract(item) for item in res_data.get(products_key) or ()]
+
+    return parse
+
+
+# The parser every center-stones scraper uses
+parse_diamond_products = compile_response_parser(DIAMOND_FIELD_SPEC, DIAMOND_METAFIELDS)
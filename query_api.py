@@ -0,0 +1,233 @@
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from flask import Flask, jsonify, request
+
+from catalogue_store import CATALOGUE_PATH, CLARITY_ORDER
+
+# --- Configuration ---
+HOST = "127.0.0.1"
+PORT = 5000
+RELOAD_CHECK_SECONDS = 5  # How often the catalogue file is checked for a newer crawl
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Stone columns held as float64 arrays (missing values are NaN) and the query parameters they take
+NUMERIC_COLUMNS = {"carat": "carat", "price": "price", "ratio": "length_width_ratio"}
+# Stone columns held as integer codes into a per-column vocabulary (-1 is missing)
+CODED_COLUMNS = ["shape", "color", "clarity", "lab", "job"]
+# Columns returned for each stone, besides the numeric and coded ones
+DETAIL_COLUMNS = ["key", "id", "handle", "title", "image"]
+
+
+def _catalogue_version(path):
+    """Changes whenever a crawl commits to the catalogue (WAL writes only touch the -wal file)."""
+    return tuple(os.stat(name).st_mtime_ns if os.path.exists(name) else 0 for name in (path, path + "-wal"))
+
+
+class StoneIndex:
+    """
+    Read-only columnar copy of the catalogue's stones: NumPy arrays for the numeric columns and
+    integer codes for the grades, so every filter is a vectorized mask over the whole catalogue.
+    Jobs crawling the same stone each keep a catalogue row; a mask keeps one row per stone, the
+    most recently seen of those matching. Never mutated after it is built; reloads build a new
+    one and swap it in.
+    """
+
+    def __init__(self, catalogue_path):
+        self.version = _catalogue_version(catalogue_path)
+        conn = sqlite3.connect(f"file:{catalogue_path}?mode=ro", uri=True)
+        try:
+            columns = list(dict.fromkeys(list(NUMERIC_COLUMNS.values()) + CODED_COLUMNS + DETAIL_COLUMNS))
+            names = ", ".join(f'"{column}"' for column in columns)
+            # Newest first, so the first matching row of each key is the one a stone is reported as
+            rows = conn.execute(f"SELECT {names} FROM stones ORDER BY last_seen DESC").fetchall()
+        finally:
+            conn.close()
+        values = dict(zip(columns, zip(*rows))) if rows else {column: () for column in columns}
+        self.size = len(rows)
+        self.loaded_at = time.time()
+
+        self.numeric = {column: np.array([np.nan if value is None else value for value in values[column]],
+                                         dtype=np.float64)
+                        for column in NUMERIC_COLUMNS.values()}
+        self.codes, self.vocabularies = {}, {}
+        for column in CODED_COLUMNS:
+            # Codes are assigned case-insensitively; the first spelling seen is the one reported
+            vocabulary, lookup, codes = [], {}, np.empty(self.size, dtype=np.int32)
+            for position, value in enumerate(values[column]):
+                if value is None:
+                    codes[position] = -1
+                    continue
+                code = lookup.get(value.lower())
+                if code is None:
+                    code = lookup[value.lower()] = len(vocabulary)
+                    vocabulary.append(value)
+                codes[position] = code
+            self.codes[column] = codes
+            self.vocabularies[column] = vocabulary
+        self.details = {column: np.array(values[column], dtype=object) for column in DETAIL_COLUMNS}
+        key_lookup = {}
+        self.key_codes = np.array([key_lookup.setdefault(key, len(key_lookup)) for key in values["key"]],
+                                  dtype=np.int64)
+        self.stones = len(key_lookup)
+
+    def _codes_for(self, column, wanted):
+        lowered = {value.lower() for value in wanted}
+        return [code for code, value in enumerate(self.vocabularies[column]) if value.lower() in lowered]
+
+    def mask(self, args):
+        """Boolean mask of the stones matching the request's filters (see the /stones route)."""
+        mask = np.ones(self.size, dtype=bool)
+        for name, column in NUMERIC_COLUMNS.items():
+            low, high = args.get(f"{name}_min", type=float), args.get(f"{name}_max", type=float)
+            if low is not None:
+                mask &= self.numeric[column] >= low  # NaN compares False, so stones missing it drop out
+            if high is not None:
+                mask &= self.numeric[column] <= high
+        for column in CODED_COLUMNS:
+            wanted = [value for values in args.getlist(column) for value in values.split(",") if value]
+            if wanted:
+                mask &= np.isin(self.codes[column], self._codes_for(column, wanted))
+        min_clarity = args.get("min_clarity", "").upper()
+        if min_clarity in CLARITY_ORDER:
+            grades = CLARITY_ORDER[:CLARITY_ORDER.index(min_clarity) + 1]
+            mask &= np.isin(self.codes["clarity"], self._codes_for("clarity", grades))
+        return self._one_per_key(mask)
+
+    def _one_per_key(self, mask):
+        if self.stones == self.size:
+            return mask  # No stone is in the catalogue under more than one job
+        selected = np.flatnonzero(mask)
+        _, first = np.unique(self.key_codes[selected], return_index=True)
+        one_per_key = np.zeros(self.size, dtype=bool)
+        one_per_key[selected[first]] = True
+        return one_per_key
+
+    def page(self, mask, sort="price", descending=False, page=1, page_size=DEFAULT_PAGE_SIZE):
+        """The requested page of matching stones, sorted by a numeric column (missing values last)."""
+        selected = np.flatnonzero(mask)
+        keys = self.numeric[NUMERIC_COLUMNS.get(sort, "price")][selected]
+        if descending:
+            keys = -keys
+        # NaN sorts last either way; a stable sort keeps catalogue order among equal keys
+        order = selected[np.argsort(keys, kind="stable")]
+        chosen = order[(page - 1) * page_size:page * page_size]
+        return [self.row(position) for position in chosen]
+
+    def row(self, position):
+        row = {column: self.details[column][position] for column in DETAIL_COLUMNS}
+        for name, column in NUMERIC_COLUMNS.items():
+            value = self.numeric[column][position]
+            row[name] = None if np.isnan(value) else float(value)
+        for column in CODED_COLUMNS:
+            code = self.codes[column][position]
+            row[column] = None if code < 0 else self.vocabularies[column][code]
+        return row
+
+    def facets(self, mask):
+        """Matching stones per grade value, and the numeric ranges still available."""
+        facets = {}
+        for column in CODED_COLUMNS:
+            # Shift by one so the missing code (-1) lands in bin 0 and can be dropped
+            counts = np.bincount(self.codes[column][mask] + 1, minlength=len(self.vocabularies[column]) + 1)
+            facets[column] = {value: int(count) for value, count in zip(self.vocabularies[column], counts[1:])
+                              if count}
+        for name, column in NUMERIC_COLUMNS.items():
+            values = self.numeric[column][mask]
+            values = values[~np.isnan(values)]
+            facets[name] = {"min": float(values.min()), "max": float(values.max())} if values.size else None
+        return facets
+
+
+class IndexHolder:
+    """
+    Holds the current StoneIndex. A background thread rebuilds it when the catalogue changes and
+    swaps the reference in one assignment, so readers never wait and always see a whole index.
+    """
+
+    def __init__(self, catalogue_path, check_seconds=RELOAD_CHECK_SECONDS):
+        self.catalogue_path = catalogue_path
+        self.check_seconds = check_seconds
+        self.index = StoneIndex(catalogue_path)
+        logging.info(f"Loaded {self.index.stones} stones from {catalogue_path}.")
+
+    def reload_if_changed(self):
+        if _catalogue_version(self.catalogue_path) == self.index.version:
+            return False
+        start_time = time.perf_counter()
+        index = StoneIndex(self.catalogue_path)
+        self.index = index
+        logging.info(f"Reloaded {index.stones} stones in {time.perf_counter() - start_time:.2f} seconds.")
+        return True
+
+    def watch(self):
+        def loop():
+            while True:
+                time.sleep(self.check_seconds)
+                try:
+                    self.reload_if_changed()
+                except sqlite3.Error as e:
+                    # Mid-write or locked; the current index keeps serving and we try again next time
+                    logging.warning(f"Could not reload {self.catalogue_path}: {e}")
+
+        threading.Thread(target=loop, name="catalogue-reload", daemon=True).start()
+
+
+def create_app(catalogue_path=CATALOGUE_PATH, watch=True):
+    holder = IndexHolder(catalogue_path)
+    if watch:
+        holder.watch()
+    app = Flask(__name__)
+
+    @app.get("/stones")
+    def stones():
+        """
+        Filters: carat_min/max, price_min/max, ratio_min/max; shape, color, clarity, lab, job
+        (comma-separated or repeated); min_clarity (e.g. VS1 = VS1 or better).
+        Paging: sort (carat, price, ratio), order (asc/desc), page, page_size.
+        Add facets=1 for facet counts of the whole match.
+        """
+        index = holder.index  # One index for the whole request, even if a reload lands meanwhile
+        mask = index.mask(request.args)
+        page = max(1, request.args.get("page", 1, type=int))
+        page_size = min(MAX_PAGE_SIZE, max(1, request.args.get("page_size", DEFAULT_PAGE_SIZE, type=int)))
+        body = {
+            "total": int(mask.sum()),
+            "page": page,
+            "page_size": page_size,
+            "results": index.page(mask, request.args.get("sort", "price"), request.args.get("order") == "desc",
+                                  page, page_size),
+        }
+        if request.args.get("facets"):
+            body["facets"] = index.facets(mask)
+        return jsonify(body)
+
+    @app.get("/facets")
+    def facets():
+        index = holder.index
+        mask = index.mask(request.args)
+        return jsonify({"total": int(mask.sum()), "facets": index.facets(mask)})
+
+    @app.get("/health")
+    def health():
+        index = holder.index
+        return jsonify({"stones": index.stones, "loaded_at": index.loaded_at, "catalogue": catalogue_path})
+
+    return app
+
+
+if __name__ == "__main__":
+    # Only when run as a script, so a WSGI server importing create_app keeps its own logging setup
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Read-only query API over the catalogue's stones.")
+    parser.add_argument("--catalogue", default=CATALOGUE_PATH, help=f"Catalogue file (default: {CATALOGUE_PATH}).")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    create_app(args.catalogue).run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,132 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+# --- Configuration ---
+LATENCY_TARGET_SECONDS = 2.0  # Responses slower than this stop the controller from ramping up
+DECREASE_FACTOR = 0.5  # Multiplicative decrease applied on 429/5xx/transport errors
+DECREASE_COOLDOWN_SECONDS = 1.0  # A burst of failures from one congestion event only backs off once
+RATE_INCREASE_STEP = 0.5  # Requests/second added after each healthy window
+MIN_REQUESTS_PER_SECOND = 0.2
+
+RETRY_BASE_DELAY_SECONDS = 2  # First retry waits up to this long, doubling each attempt
+RETRY_MAX_DELAY_SECONDS = 60  # Upper bound for a single retry wait
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY_SECONDS, cap=RETRY_MAX_DELAY_SECONDS):
+    """Full-jitter exponential backoff: a random wait in [0, min(cap, base * 2**(attempt-1))]."""
+    return random.uniform(0, min(cap, base * 2 ** max(attempt - 1, 0)))
+
+
+def parse_retry_after(value):
+    """Returns the Retry-After header as seconds to wait, or None if it is missing or malformed."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Caps the request start rate; `rate` can be changed on the fly by the controller."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveRateController:
+    """
+    AIMD controller for both concurrency and request rate.
+    Every healthy window (one success per allowed slot, under the latency target) adds one slot
+    and RATE_INCREASE_STEP req/s; a 429, 5xx or transport error halves both, and a Retry-After
+    header pauses every new request until it has elapsed.
+    """
+
+    def __init__(self, initial_concurrency, max_concurrency, initial_rate, max_rate, min_concurrency=1,
+                 latency_target=LATENCY_TARGET_SECONDS):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(max_concurrency, initial_concurrency)
+        self.limit = float(initial_concurrency)
+        self.max_rate = max(max_rate, initial_rate)
+        self.latency_target = latency_target
+        self.bucket = TokenBucket(initial_rate, burst=max(1, initial_concurrency))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._healthy_in_window = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    async def acquire(self):
+        """
+        Waits for a free concurrency slot, any Retry-After pause, and a rate token. The slot is
+        taken first so waiters are admitted one per slot; it is handed back if the wait is cancelled.
+        """
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.bucket.acquire()
+        except BaseException:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+            raise
+
+    async def release(self, status=None, latency=None, retry_after=None):
+        """Feeds one request outcome back; `status` is None when no response was received."""
+        async with self._condition:
+            self.in_flight -= 1
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            if status is None or status == 429 or status >= 500:
+                self._decrease()
+            elif status < 400 and latency is not None and latency <= self.latency_target:
+                self._healthy_in_window += 1
+                if self._healthy_in_window >= int(self.limit):
+                    self._increase()
+            self._condition.notify_all()
+
+    def _increase(self):
+        self._healthy_in_window = 0
+        self.limit = min(self.max_concurrency, self.limit + 1)
+        self.bucket.rate = min(self.max_rate, self.bucket.rate + RATE_INCREASE_STEP)
+        self.bucket.burst = max(1, int(self.limit))
+
+    def _decrease(self):
+        now = time.monotonic()
+        self._healthy_in_window = 0
+        if now - self._last_decrease < DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * DECREASE_FACTOR)
+        self.bucket.rate = max(MIN_REQUESTS_PER_SECOND, self.bucket.rate * DECREASE_FACTOR)
+        self.bucket.burst = max(1, int(self.limit))
@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import os
+import random
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from cassette import Cassette, request_key
+
+# --- Configuration ---
+HOST = "127.0.0.1"
+PORT = 8800
+LATENCY_MS = 0  # Added to every response
+JITTER_MS = 0  # Plus a uniform random 0..JITTER_MS on top
+ERROR_RATE = 0.0  # Fraction of requests answered with 503
+THROTTLE_RATE = 0.0  # Fraction of requests answered with 429 and Retry-After
+RETRY_AFTER_SECONDS = 1
+MISS_STATUS = 404  # Status for requests the cassette has no answer for
+
+CENTER_STONES_PATH = "/collections/center-stones?_data=routes/($locale).collections.center-stones"
+RING_LOADER_PATH = ("/collections/engagement-ring-settings"
+                    "?_data=routes%2F%28%24locale%29.collections.engagement-ring-settings")
+
+STATS = web.AppKey("stats", dict)  # build_app()'s served/errors/throttled/misses counters
+
+
+def build_app(entries, latency_ms=LATENCY_MS, jitter_ms=JITTER_MS, error_rate=ERROR_RATE,
+              throttle_rate=THROTTLE_RATE, seed=None):
+    """
+    aiohttp app answering every request from `entries` (Cassette.load()), matched on method,
+    path, query and form content. Latency, jitter, 503s and 429s are injected as configured;
+    app[STATS] counts what was served.
+    """
+    rng = random.Random(seed)
+    stats = {"served": 0, "errors": 0, "throttled": 0, "misses": 0}
+
+    async def replay(request):
+        form_data = dict(await request.post()) if request.method == "POST" else None
+        delay_ms = latency_ms + (rng.uniform(0, jitter_ms) if jitter_ms else 0)
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+
+        roll = rng.random()
+        if roll < error_rate:
+            stats["errors"] += 1
+            return web.Response(status=503, text="Injected error")
+        if roll < error_rate + throttle_rate:
+            stats["throttled"] += 1
+            return web.Response(status=429, text="Injected throttle",
+                                headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+        entry = entries.get(request_key(request.method, str(request.rel_url), form_data))
+        if entry is None:
+            stats["misses"] += 1
+            return web.Response(status=MISS_STATUS, text="Not in cassette")
+        stats["served"] += 1
+        return web.Response(status=entry["status"], body=entry["body"].encode("utf-8"),
+                            headers=entry.get("headers") or {"Content-Type": "application/json"})
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", replay)
+    app[STATS] = stats
+    return app
+
+
+def _record_json(cassette, method, url, form_data, document):
+    body = json.dumps(document, separators=(",", ":")).encode("utf-8")
+    cassette.record(method, url, form_data, 200, {"Content-Type": "application/json"}, body)
+
+
+def _cursor_offset(cursor):
+    try:
+        return json.loads(base64.b64decode(cursor + "=" * (-len(cursor) % 4))).get("offset", 0)
+    except ValueError:
+        return 0
+
+
+def cassette_from_ring_responses(response_dir, cassette_path, cursor_field="cursor"):
+    """
+    Builds a ring-loader cassette from payloads saved by url.py / ring_client.py: the route
+    document answers the GET, and each Load More fragment answers a POST of the endCursor
+    before it (fragments are chained in offset order). Returns the number of exchanges.
+    """
+    document, fragments, seen_starts = None, [], set()
+    for path in sorted(glob.glob(os.path.join(response_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and "collection" in data:
+            document = document or data
+        elif isinstance(data, dict) and "pageInfo" in data:
+            start = data["pageInfo"].get("startCursor")
+            if start not in seen_starts:
+                seen_starts.add(start)
+                fragments.append(data)
+    if document is None:
+        raise ValueError(f"No route document (a payload with 'collection') in {response_dir}")
+    # Only fragments after the document's first page continue it (other saved first pages are skipped)
+    first_page_end = _cursor_offset(document["collection"]["pageInfo"].get("endCursor") or "")
+    fragments = [fragment for fragment in fragments
+                 if _cursor_offset(fragment["pageInfo"].get("startCursor") or "") > first_page_end]
+    fragments.sort(key=lambda fragment: _cursor_offset(fragment["pageInfo"].get("startCursor") or ""))
+
+    url = "https://keyzarjewelry.com" + RING_LOADER_PATH
+    if os.path.exists(cassette_path):
+        os.remove(cassette_path)
+    cassette = Cassette(cassette_path)
+    _record_json(cassette, "GET", url, None, document)
+    previous = document["collection"]
+    for fragment in fragments:
+        _record_json(cassette, "POST", url, {cursor_field: previous["pageInfo"]["endCursor"]}, fragment)
+        previous = fragment
+    cassette.close()
+    return cassette.recorded
+
+
+def synthetic_center_stones_cassette(cassette_path, base_json_payload, total_products, page_size=14):
+    """
+    Builds a center-stones cassette of `total_products` made-up stones for `base_json_payload`,
+    with empty pages past the end so end-of-catalogue discovery finds the boundary offline.
+    """
+    url = "https://keyzarjewelry.com" + CENTER_STONES_PATH
+    last_cursor = -(-total_products // page_size)
+    if os.path.exists(cassette_path):
+        os.remove(cassette_path)
+    os.makedirs(os.path.dirname(cassette_path) or ".", exist_ok=True)
+    cassette = Cassette(cassette_path)
+    for cursor_value in range(1, 2 * last_cursor + 2):
+        start = (cursor_value - 1) * page_size
+        products = [{
+            "id": 7000000000000 + i, "handle": f"lab-diamond-{i}", "title": f"{1 + i % 300 / 100:.2f} Carat Oval",
+            "price_min": 230 + i * 7, "variants": [{"price": str(230 + i * 7), "weight": 1 + i % 300 / 100}],
+            "media": [{"alt": "diamond", "image": {"originalSrc": f"https://cdn.shopify.com/s/files/{i}.jpg"}}],
+            "images_info": [{"src": f"https://cdn.shopify.com/s/files/{i}.jpg"}],
+            "metafields": [{"key": "carat", "value": f"{1 + i % 300 / 100:.2f}"}, {"key": "color", "value": "F"},
+                           {"key": "shape", "value": "Oval"}, {"key": "clarity", "value": "VS1"},
+                           {"key": "lab", "value": "IGI"}, {"key": "certificate_url", "value": "-"}],
+        } for i in range(start, min(start + page_size, total_products))]
+        payload = dict(base_json_payload, cursor=cursor_value)
+        _record_json(cassette, "POST", url, {"body": json.dumps(payload)}, {"products": products})
+    cassette.close()
+    return cassette.recorded
+
+
+def replay_url(url, host=HOST, port=PORT):
+    """The address of `url` (a keyzarjewelry.com URL) on the replay server."""
+    parts = urlsplit(url)
+    return f"http://{host}:{port}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+
+def run_replay_server(cassette_path, host=HOST, port=PORT, latency_ms=LATENCY_MS, jitter_ms=JITTER_MS,
+                      error_rate=ERROR_RATE, throttle_rate=THROTTLE_RATE, seed=None):
+    entries = Cassette(cassette_path).load()
+    print(f"[*] Replaying {len(entries)} exchanges from {cassette_path} on http://{host}:{port}")
+    web.run_app(build_app(entries, latency_ms, jitter_ms, error_rate, throttle_rate, seed),
+                host=host, port=port, print=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded center-stones / ring-loader responses locally.")
+    parser.add_argument("cassette", help="Cassette (.jsonl.gz) recorded with --record or built below.")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE)
+    parser.add_argument("--throttle-rate", type=float, default=THROTTLE_RATE)
+    parser.add_argument("--seed", type=int, default=None, help="Makes injected jitter and errors repeatable.")
+    parser.add_argument("--from-ring-responses", metavar="DIR",
+                        help="First build the cassette from ring payloads saved in DIR (e.g. response).")
+    args = parser.parse_args()
+
+    if args.from_ring_responses:
+        print(f"[✓] Built {cassette_from_ring_responses(args.from_ring_responses, args.cassette)} exchanges.")
+    run_replay_server(args.cassette, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                      error_rate=args.error_rate, throttle_rate=args.throttle_rate, seed=args.seed)
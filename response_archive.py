@@ -0,0 +1,240 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+
+try:
+    import zstandard  # Optional: trained dictionaries compress these repetitive pages far better than zlib
+except ImportError:
+    zstandard = None
+
+# --- Configuration ---
+ARCHIVE_DIR = os.path.join("downloads", "archive")
+DATA_FILE = "responses.bin"  # Compressed bodies, appended back to back
+INDEX_FILE = "responses.sqlite"  # (walk, cursor) -> offset and length in DATA_FILE, plus the dictionaries
+TRAINING_SAMPLES = 50  # Responses stored plain before a dictionary is trained from them
+DICTIONARY_SIZE = 112640  # zstd dictionary size in bytes (zstd's own default)
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 9
+ZLIB_WINDOW = 32768  # zlib only looks back 32 KB, so a longer preset dictionary is wasted
+COMMIT_EVERY = 100  # Responses indexed per transaction
+
+
+def _train(samples):
+    """A (codec, dictionary bytes) trained on `samples`, or None if they are too few or too alike."""
+    if zstandard is not None:
+        try:
+            return "zstd", zstandard.train_dictionary(DICTIONARY_SIZE, samples).as_bytes()
+        except zstandard.ZstdError:
+            return None
+    # zlib has no trainer; the start of each sample (keys, URL prefixes) is what later responses repeat
+    share = max(1, ZLIB_WINDOW // len(samples))
+    return "zlib", b"".join(sample[:share] for sample in samples)[-ZLIB_WINDOW:]
+
+
+def _compressor(codec, dictionary):
+    if codec == "zstd":
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data)
+        return compressor.compress
+
+    def compress(body):
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(ZLIB_LEVEL)
+        return compressor.compress(body) + compressor.flush()
+    return compress
+
+
+def _decompress(codec, dictionary, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This response is zstd-compressed; install zstandard to read it")
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+class ResponseArchive:
+    """
+    Append-only archive of raw response bodies. Bodies are compressed one by one into a single
+    data file and indexed in SQLite by walk ("job" or "job:shard") and cursor (a cursor number
+    or a ring endCursor), so any page can be read back on its own.
+    The first TRAINING_SAMPLES responses train a zstd dictionary (a zlib preset dictionary
+    without zstandard), which every later response, in this run and the next, is compressed with.
+    A response identical to the last one archived for its cursor is not stored again.
+    """
+
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        os.makedirs(archive_dir, exist_ok=True)
+        self.data_path = os.path.join(archive_dir, DATA_FILE)
+        self.conn = sqlite3.connect(os.path.join(archive_dir, INDEX_FILE))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS dictionaries (
+                id INTEGER PRIMARY KEY,
+                codec TEXT NOT NULL,
+                data BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY,
+                walk TEXT NOT NULL,
+                cursor TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                raw_bytes INTEGER NOT NULL,
+                sha256 BLOB NOT NULL,
+                codec TEXT NOT NULL,
+                dictionary INTEGER REFERENCES dictionaries (id),
+                stored_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_walk_cursor ON responses (walk, cursor)")
+        self.conn.commit()
+
+        # Bytes past the last indexed response come from a run that died before committing; drop them
+        end = self.conn.execute("SELECT COALESCE(MAX(offset + length), 0) FROM responses").fetchone()[0]
+        self._file = open(self.data_path, "ab")
+        if self._file.tell() > end:
+            self._file.truncate(end)
+        self._file.seek(0, os.SEEK_END)
+        self._reader = None
+        self._dictionaries = {}
+        self._pending = 0
+        self._samples = []
+        self.archived = 0
+        self.unchanged = 0
+
+        row = self.conn.execute("SELECT id, codec, data FROM dictionaries ORDER BY id DESC LIMIT 1").fetchone()
+        if row is not None and (row[1] == "zlib" or zstandard is not None):
+            self._use_dictionary(*row)
+        else:
+            self._use_dictionary(None, "zstd" if zstandard is not None else "zlib", None)
+
+    def _use_dictionary(self, dictionary_id, codec, dictionary):
+        self._dictionary_id, self._codec = dictionary_id, codec
+        self._compress = _compressor(codec, dictionary)
+
+    def _dictionary(self, dictionary_id):
+        if dictionary_id not in self._dictionaries:
+            self._dictionaries[dictionary_id] = self.conn.execute(
+                "SELECT data FROM dictionaries WHERE id = ?", (dictionary_id,)).fetchone()[0]
+        return self._dictionaries[dictionary_id]
+
+    def add(self, walk, cursor, body):
+        """Archives one response body; returns False if it is unchanged since the last one for this cursor."""
+        cursor = "" if cursor is None else str(cursor)  # The first ring page has no cursor
+        sha256 = hashlib.sha256(body).digest()
+        last = self.conn.execute("SELECT sha256 FROM responses WHERE walk = ? AND cursor = ? ORDER BY id DESC LIMIT 1",
+                                 (walk, cursor)).fetchone()
+        if last is not None and last[0] == sha256:
+            self.unchanged += 1
+            return False
+
+        data = self._compress(body)
+        offset = self._file.tell()
+        self._file.write(data)
+        self.conn.execute("INSERT INTO responses (walk, cursor, offset, length, raw_bytes, sha256, codec, dictionary, "
+                          "stored_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          (walk, cursor, offset, len(data), len(body), sha256, self._codec, self._dictionary_id,
+                           time.time()))
+        self.archived += 1
+        self._pending += 1
+        if self._dictionary_id is None:
+            self._samples.append(body)
+            if len(self._samples) >= TRAINING_SAMPLES:
+                self.train()
+        if self._pending >= COMMIT_EVERY:
+            self.flush()
+        return True
+
+    def train(self):
+        """Trains a dictionary on the responses seen so far and compresses everything after it with that."""
+        trained = _train(self._samples)
+        self._samples = []
+        if trained is None:
+            return
+        codec, dictionary = trained
+        dictionary_id = self.conn.execute("INSERT INTO dictionaries (codec, data, created_at) VALUES (?, ?, ?)",
+                                          (codec, dictionary, time.time())).lastrowid
+        self._use_dictionary(dictionary_id, codec, dictionary)
+
+    def get(self, walk, cursor):
+        """The most recently archived body for a cursor, or None."""
+        row = self.conn.execute("SELECT offset, length, codec, dictionary FROM responses WHERE walk = ? AND cursor = ? "
+                                "ORDER BY id DESC LIMIT 1", (walk, "" if cursor is None else str(cursor))).fetchone()
+        return None if row is None else self._read(*row)
+
+    def iter_responses(self, walk=None):
+        """Yields (walk, cursor, body) for the latest response of every cursor, in archive order."""
+        query = ("SELECT walk, cursor, offset, length, codec, dictionary FROM responses WHERE id IN "
+                 "(SELECT MAX(id) FROM responses GROUP BY walk, cursor)")
+        params = ()
+        if walk is not None:
+            query += " AND walk = ?"
+            params = (walk,)
+        for row_walk, cursor, offset, length, codec, dictionary_id in self.conn.execute(query + " ORDER BY id",
+                                                                                          params).fetchall():
+            yield row_walk, cursor, self._read(offset, length, codec, dictionary_id)
+
+    def _read(self, offset, length, codec, dictionary_id):
+        self._file.flush()
+        if self._reader is None:
+            self._reader = open(self.data_path, "rb")
+        self._reader.seek(offset)
+        dictionary = self._dictionary(dictionary_id) if dictionary_id is not None else None
+        return _decompress(codec, dictionary, self._reader.read(length))
+
+    def summary(self):
+        count, raw_bytes, stored_bytes = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(length), 0) FROM responses").fetchone()
+        return {"responses": count, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
+
+    def flush(self):
+        """Makes the appended bodies durable, then the index rows pointing at them."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        if self._reader is not None:
+            self._reader.close()
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or extract responses from the raw response archive.")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help=f"Archive directory (default: {ARCHIVE_DIR}).")
+    parser.add_argument("--walk", help="Only this walk (job or job:shard).")
+    parser.add_argument("--cursor", help="With --walk, write this cursor's response to stdout.")
+    parser.add_argument("--extract", metavar="DIR", help="Write the latest response of every cursor to DIR.")
+    args = parser.parse_args()
+
+    archive = ResponseArchive(args.archive)
+    if args.cursor is not None:
+        body = archive.get(args.walk, args.cursor)
+        if body is None:
+            raise SystemExit(f"[!] No response archived for {args.walk} cursor {args.cursor}.")
+        os.write(1, body)
+    elif args.extract:
+        os.makedirs(args.extract, exist_ok=True)
+        written = 0
+        for walk, cursor, body in archive.iter_responses(args.walk):
+            name = f"{walk}_{cursor or 'first'}".replace(":", "_").replace("/", "_")
+            with open(os.path.join(args.extract, f"{name[:200]}.json"), "wb") as f:
+                f.write(body)
+            written += 1
+        print(f"[✓] Extracted {written} responses to {args.extract}.")
+    else:
+        summary = archive.summary()
+        ratio = summary["raw_bytes"] / summary["stored_bytes"] if summary["stored_bytes"] else 0
+        print(f"[*] {summary['responses']} responses, {summary['raw_bytes'] / 1e6:.1f} MB stored in "
+              f"{summary['stored_bytes'] / 1e6:.1f} MB ({ratio:.1f}x).")
+    archive.close()
@@ -0,0 +1,154 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from urllib.parse import urlencode
+
+from cassette import request_key
+
+try:
+    import zstandard  # Optional: smaller and faster than zlib for the stored bodies
+except ImportError:
+    zstandard = None
+
+# --- Configuration ---
+CACHE_PATH = os.path.join("downloads", "http_cache.sqlite")
+VALIDATOR_HEADERS = ("ETag", "Last-Modified")  # Kept to make conditional requests next time
+KEPT_HEADERS = VALIDATOR_HEADERS + ("Content-Type",)
+COMMIT_EVERY = 100  # Stored responses per transaction
+
+
+def cache_key(method, url, form_data=None, params=None):
+    """
+    SHA-256 of the canonical request (see cassette.request_key): the same URL and payload hash
+    the same way whatever the host, URL-encoding or JSON key order.
+    """
+    if params:
+        url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+    return hashlib.sha256(request_key(method, url, form_data).encode("utf-8")).digest()
+
+
+def _compress(body):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(body)
+    return "zlib", zlib.compress(body, 6)
+
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This cache entry is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class ResponseCache:
+    """
+    Successful responses stored in SQLite by cache_key(), bodies compressed, with their ETag and
+    Last-Modified. PooledSession consults it on every request: an entry younger than
+    `ttl_seconds` is served without touching the network; an older one is revalidated with
+    If-None-Match / If-Modified-Since and served again on 304. `ttl_seconds=None` always
+    revalidates (or re-fetches, when the server sends no validators).
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=None):
+        self.ttl_seconds = ttl_seconds
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key BLOB PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                codec TEXT NOT NULL,
+                body BLOB NOT NULL,
+                body_bytes INTEGER NOT NULL,
+                stored_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+        self._pending = 0
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0}
+
+    def lookup(self, key):
+        """Returns the cached entry for `key` as a dict, or None."""
+        row = self.conn.execute("SELECT status, headers, codec, body, stored_at FROM responses WHERE key = ?",
+                                (key,)).fetchone()
+        if row is None:
+            return None
+        status, headers, codec, body, stored_at = row
+        return {"status": status, "headers": json.loads(headers), "codec": codec, "body": body,
+                "stored_at": stored_at}
+
+    def is_fresh(self, entry):
+        return self.ttl_seconds is not None and time.time() - entry["stored_at"] < self.ttl_seconds
+
+    def serve(self, entry):
+        """(status, headers, body bytes) of a cached entry, as PooledSession returns them."""
+        return entry["status"], entry["headers"], _decompress(entry["codec"], entry["body"])
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def store(self, key, url, status, headers, body):
+        codec, data = _compress(body)
+        kept = {name: headers[name] for name in KEPT_HEADERS if name in headers}
+        self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                          (key, url, status, json.dumps(kept), codec, data, len(body), time.time()))
+        self.stats["stored"] += 1
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def touch(self, key):
+        """Restarts an entry's TTL after the server confirmed it unchanged (304)."""
+        self.conn.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+
+    def invalidate(self, key):
+        """Forgets one entry, e.g. a body that turned out not to decode, so the next request fetches it afresh."""
+        self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def prune(self, older_than_seconds):
+        cursor = self.conn.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - older_than_seconds,))
+        self.conn.commit()
+        return cursor.rowcount
+
+    def summary(self):
+        count, body_bytes, stored_bytes = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(body_bytes), 0), COALESCE(SUM(LENGTH(body)), 0) FROM responses").fetchone()
+        return {"responses": count, "body_bytes": body_bytes, "stored_bytes": stored_bytes}
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or prune the HTTP response cache.")
+    parser.add_argument("--cache", default=CACHE_PATH, help=f"Cache file (default: {CACHE_PATH}).")
+    parser.add_argument("--prune-days", type=float, help="Delete responses stored more than this many days ago.")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.cache)
+    if args.prune_days is not None:
+        print(f"[✓] Pruned {cache.prune(args.prune_days * 86400)} responses.")
+    summary = cache.summary()
+    print(f"[*] {summary['responses']} responses, {summary['body_bytes'] / 1e6:.1f} MB of bodies stored in "
+          f"{summary['stored_bytes'] / 1e6:.1f} MB.")
+    cache.close()
@@ -1,9 +1,16 @@
 import os
-import json
+import sys
 import csv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared modules live in the repo root
+from dedup_index import DedupIndex, product_key
+from export_parquet import RING_CATEGORICAL_COLUMNS, RING_NUMERIC_COLUMNS, export_rows
+from json_codec import iter_ring_products
+
 DOWNLOADS_DIR = 'response'
 OUTPUT_CSV = 'combined_products.csv'
+OUTPUT_TYPED = 'combined_products.parquet'  # Typed copy of the CSV (.parquet or .feather); None to skip
+DEDUP_INDEX_PATH = 'combined_seen.sqlite'  # Product keys already written this run (rebuilt every run)
 
 # Fields to extract
 CSV_FIELDS = [
@@ -72,27 +79,29 @@ def extract_product_fields(product):
 
 def main():
     all_rows = []
+    seen = DedupIndex(DEDUP_INDEX_PATH, namespace='combine_to_csv')
+    seen.reset()
     for filename in sorted(os.listdir(DOWNLOADS_DIR)):
         if filename.endswith('.json'):
             filepath = os.path.join(DOWNLOADS_DIR, filename)
-            with open(filepath, 'r', encoding='utf-8') as f:
+            added = 0
+            with open(filepath, 'rb') as f:
                 try:
-                    data = json.load(f)
+                    # Streamed product by product; finds the nodes in lists, fragments and full route documents
+                    for product in iter_ring_products(f):
+                        if not isinstance(product, dict):
+                            continue
+                        # The same product shows up in repeated responses; keep its first copy
+                        if not seen.add(product_key(product)):
+                            continue
+                        row = extract_product_fields(product)
+                        all_rows.append(row)
+                        added += 1
                 except Exception as e:
-                    print(f"Error reading {filename}: {e}")
-                    continue
-                # Support both list of products and dict with 'nodes'
-                if isinstance(data, list):
-                    products = data
-                elif isinstance(data, dict) and 'nodes' in data:
-                    products = data['nodes']
-                else:
-                    products = data
-                for product in products:
-                    if not isinstance(product, dict):
-                        continue
-                    row = extract_product_fields(product)
-                    all_rows.append(row)
+                    print(f"Error reading {filename} after {added} new products: {e}")
+    seen.close()
+    if seen.duplicates_dropped:
+        print(f"Dropped {seen.duplicates_dropped} duplicate products.")
     # Write to CSV
     with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDS)
@@ -100,6 +109,10 @@ def main():
         for row in all_rows:
             writer.writerow(row)
     print(f"Combined CSV written to {OUTPUT_CSV} with {len(all_rows)} products.")
+    if OUTPUT_TYPED:
+        file_format = 'feather' if OUTPUT_TYPED.endswith('.feather') else 'parquet'
+        export_rows(all_rows, OUTPUT_TYPED, CSV_FIELDS, RING_NUMERIC_COLUMNS, RING_CATEGORICAL_COLUMNS,
+                    file_format=file_format)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
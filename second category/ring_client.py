@@ -0,0 +1,164 @@
+import asyncio
+import base64
+import binascii
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared modules live in the repo root
+from cassette import Cassette
+from catalogue_store import CatalogueStore
+from http_session import HttpStatusError, HttpTransportError, PooledSession
+from json_codec import DecodeError, decode_ring_payload
+from rate_control import backoff_delay, parse_retry_after
+from response_archive import ResponseArchive
+
+# --- Configuration ---
+COLLECTION_URL = "https://keyzarjewelry.com/collections/engagement-ring-settings"
+LOADER_URL = COLLECTION_URL + "?_data=routes%2F%28%24locale%29.collections.engagement-ring-settings"
+OUTPUT_DIR = "response"  # Same directory url.py saves to, so combine_to_csv.py picks the pages up
+CURSOR_FIELD = "cursor"  # Form field the "Load More" action posts pageInfo.endCursor in
+MAX_PAGES = 100  # Safety stop in case the API never reports hasNextPage = false
+MAX_RETRIES = 3  # Retries per page on 429/5xx and connection errors
+REQUEST_TIMEOUT_SECONDS = 20
+COOKIE_FILE = "cookies.json"  # Cookies saved by bootstrap_cookies(), sent with every request if present
+BOOTSTRAP_WITH_BROWSER = False  # Open the page once in headless Chromium to collect cookies (needs playwright)
+RECORD_CASSETTE = None  # e.g. "ring_settings.jsonl.gz" to save every exchange for replay_server.py
+CATALOGUE_PATH = os.path.join("downloads", "catalogue.sqlite")  # Ring products are upserted here too; None to skip
+ARCHIVE_DIR = None  # e.g. os.path.join("downloads", "archive") to keep every page compressed, indexed by cursor
+ARCHIVE_WALK = "rings"  # Name the pages are archived under
+
+
+def decode_cursor(cursor):
+    """Decodes a pageInfo cursor (base64 JSON like {"page": 3, "last_id": ..., "offset": 43}); {} if opaque."""
+    try:
+        return json.loads(base64.b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        return {}
+
+
+def bootstrap_cookies(cookie_file=COOKIE_FILE):
+    """Loads the collection page once in headless Chromium and saves its cookies; only needed if plain HTTP is refused."""
+    from playwright.sync_api import sync_playwright  # Optional dependency, imported only when bootstrapping
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = browser.new_context()
+        page = context.new_page()
+        page.goto(COLLECTION_URL, wait_until="domcontentloaded", timeout=60000)
+        cookies = context.cookies()
+        browser.close()
+    with open(cookie_file, "w", encoding="utf-8") as f:
+        json.dump(cookies, f)
+    print(f"[✓] Saved {len(cookies)} cookies to {cookie_file}")
+    return cookies
+
+
+def load_cookie_header(cookie_file=COOKIE_FILE):
+    """Builds a Cookie header from a cookie file saved by bootstrap_cookies(), or returns None."""
+    if not os.path.exists(cookie_file):
+        return None
+    with open(cookie_file, "r", encoding="utf-8") as f:
+        cookies = json.load(f)
+    return "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies) or None
+
+
+async def fetch_page(session, cursor=None, headers=None, loader_url=LOADER_URL):
+    """
+    Fetches one page of the loader: the route document (GET) for the first page, the
+    Load More fragment (POST with the previous endCursor) after that. Retries 429/5xx
+    and transport errors with backoff; returns the raw body bytes.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            if cursor is None:
+                _, _, body = await session.get(loader_url, headers=headers)
+            else:
+                _, _, body = await session.post_form(loader_url, {CURSOR_FIELD: cursor}, headers=headers)
+            return body
+        except HttpStatusError as e:
+            if attempt == MAX_RETRIES or (e.status != 429 and e.status < 500):
+                raise
+            delay = parse_retry_after(e.headers.get("Retry-After")) or backoff_delay(attempt)
+        except HttpTransportError:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+        print(f"[!] Page request failed, retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES})")
+        await asyncio.sleep(delay)
+
+
+async def crawl_ring_settings(output_dir=OUTPUT_DIR, cookie_file=COOKIE_FILE, cassette_path=RECORD_CASSETTE,
+                              loader_url=LOADER_URL, catalogue_path=CATALOGUE_PATH, archive_dir=ARCHIVE_DIR):
+    """
+    Follows pageInfo.endCursor while hasNextPage is true and saves every page body as
+    `<output_dir>/pageNNN.json`, exactly as served. With `cassette_path`, the exchanges are
+    also recorded; with `catalogue_path`, each page's products are upserted into the catalogue;
+    with `archive_dir`, each body is archived under the cursor it was requested with.
+    Returns the number of products fetched.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cookie_header = load_cookie_header(cookie_file)
+    headers = {"Cookie": cookie_header} if cookie_header else None
+
+    products_fetched = 0
+    seen_cursors = set()
+    cursor = None
+    recorder = Cassette(cassette_path) if cassette_path else None
+    catalogue = CatalogueStore(catalogue_path) if catalogue_path else None
+    archive = ResponseArchive(archive_dir) if archive_dir else None
+    async with PooledSession(pool_size=1, timeout_seconds=REQUEST_TIMEOUT_SECONDS, recorder=recorder) as session:
+        for page_number in range(1, MAX_PAGES + 1):
+            body = await fetch_page(session, cursor, headers, loader_url)
+            try:
+                data = decode_ring_payload(body)
+            except DecodeError as e:
+                print(f"[!] Page {page_number} is not JSON ({e}); stopping.")
+                break
+            # The first page is the full route document; Load More pages are the collection fragment
+            collection = (data.get("collection") or data) if isinstance(data, dict) else {"nodes": data}
+            nodes = collection.get("nodes") or []
+            page_info = collection.get("pageInfo") or {}
+
+            file_path = os.path.join(output_dir, f"page{page_number:03d}.json")
+            with open(file_path, "wb") as f:
+                f.write(body)
+            if archive:
+                archive.add(ARCHIVE_WALK, cursor, body)
+            if catalogue:
+                catalogue.add_ring_products(nodes)
+                catalogue.flush()
+            products_fetched += len(nodes)
+            position = decode_cursor(page_info.get("endCursor") or "")
+            print(f"[✓] Page {page_number}: {len(nodes)} products (offset {position.get('offset', '?')}, "
+                  f"{products_fetched}/{collection.get('totalCount', '?')}) saved to {file_path}")
+
+            cursor = page_info.get("endCursor")
+            if not page_info.get("hasNextPage") or not cursor:
+                break
+            if cursor in seen_cursors:
+                print(f"[!] Cursor repeated at page {page_number}; stopping.")
+                break
+            seen_cursors.add(cursor)
+        else:
+            print(f"[!] Stopped after MAX_PAGES={MAX_PAGES} pages.")
+    if recorder:
+        recorder.close()
+    if archive:
+        archive.close()
+        print(f"[✓] Archived {archive.archived} pages to {archive_dir} ({archive.unchanged} unchanged)")
+    if catalogue:
+        catalogue.close()
+        print(f"[✓] Upserted {catalogue.rows_written} products into {catalogue_path}")
+    return products_fetched
+
+
+def run():
+    if BOOTSTRAP_WITH_BROWSER and not os.path.exists(COOKIE_FILE):
+        bootstrap_cookies()
+    products_fetched = asyncio.run(crawl_ring_settings())
+    print(f"[✓] Fetched {products_fetched} products.")
+
+
+if __name__ == "__main__":
+    run()
@@ -1,29 +1,62 @@
+import hashlib
 import json
 import os
-from playwright.sync_api import sync_playwright
+from concurrent.futures import ThreadPoolExecutor
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError, sync_playwright
+
+# --- Configuration ---
+HEADLESS = True  # Set to False to watch the browser
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}  # Never downloaded; only the loader JSON matters
+RESPONSE_TIMEOUT_MS = 30000  # How long to wait for the loader to answer a Load More click
+BUTTON_TIMEOUT_MS = 5000  # How long to wait for the Load More button to show up; after that we are done
+LOAD_MORE_SELECTOR = "button.tangiblee-load-more"
+
+
+def save_payload(body, file_path, method):
+    """Writes one loader payload as indented JSON; runs on the writer thread."""
+    json_data = json.loads(body)
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(json_data, f, indent=2)
+    print(f"[✓] Saved {method} response to {file_path}")
+
+
+def report_save_error(future):
+    if future.exception() is not None:
+        print(f"[!] Failed to save response: {future.exception()}")
+
 
 def run():
     os.makedirs("response", exist_ok=True)
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+    with sync_playwright() as p, ThreadPoolExecutor(max_workers=1) as writer:
+        browser = p.chromium.launch(headless=HEADLESS)
         context = browser.new_context()
+        context.route("**/*", lambda route: route.abort()
+                      if route.request.resource_type in BLOCKED_RESOURCE_TYPES else route.continue_())
         page = context.new_page()
 
         base_url_part = "_data=routes%2F%28%24locale%29.collections.engagement-ring-settings"
         file_count = 1
-        collected_responses = []
+        seen_bodies = set()  # Content hashes of saved responses; repeated GET/POST pairs are skipped
+
+        def is_loader_response(response):
+            return base_url_part in response.url and response.request.method == "POST"
 
         def handle_response(response):
             nonlocal file_count
             if base_url_part in response.url:
                 if response.status == 200 and response.request.method in ["GET", "POST"]:
                     try:
-                        json_data = response.json()
+                        body = response.body()
+                        body_hash = hashlib.sha1(body).hexdigest()
+                        if body_hash in seen_bodies:
+                            print(f"[=] Skipped duplicate {response.request.method} response")
+                            return
+                        seen_bodies.add(body_hash)
+                        # Decoding and writing happen on the writer thread so the listener returns at once
                         file_path = f"response/file{file_count}.json"
-                        with open(file_path, "w", encoding="utf-8") as f:
-                            json.dump(json_data, f, indent=2)
-                        print(f"[✓] Saved {response.request.method} response to {file_path}")
+                        writer.submit(save_payload, body, file_path,
+                                      response.request.method).add_done_callback(report_save_error)
                         file_count += 1
                     except Exception as e:
                         print(f"[!] Failed to save response: {e}")
@@ -32,20 +65,30 @@ def run():
         page.on("response", handle_response)
 
         print("[*] Navigating to page")
-        page.goto("https://keyzarjewelry.com/collections/engagement-ring-settings", timeout=60000)
-        page.wait_for_timeout(5000)
+        page.goto("https://keyzarjewelry.com/collections/engagement-ring-settings",
+                  wait_until="domcontentloaded", timeout=60000)
 
+        # Each click returns as soon as the loader answers; its pageInfo says whether to go on
+        load_more = page.locator(LOAD_MORE_SELECTOR)
         while True:
             try:
-                load_more_btn = page.locator("button.tangiblee-load-more")
-                if not load_more_btn.is_visible():
-                    print("[✓] No more 'Load More' button found. Exiting loop.")
-                    break
-
+                load_more.wait_for(state="visible", timeout=BUTTON_TIMEOUT_MS)
+            except PlaywrightTimeoutError:
+                print("[✓] No more 'Load More' button found. Exiting loop.")
+                break
+            try:
                 print("[*] Clicking 'Load More'")
-                load_more_btn.click()
-                page.wait_for_timeout(5000)
+                with page.expect_response(is_loader_response, timeout=RESPONSE_TIMEOUT_MS) as response_info:
+                    load_more.click(timeout=BUTTON_TIMEOUT_MS)
+                data = response_info.value.json()
+                page_info = (data.get("collection") or data).get("pageInfo") or {}
+                if not page_info.get("hasNextPage"):
+                    print("[✓] Loader reports no next page. Exiting loop.")
+                    break
 
+            except PlaywrightTimeoutError:
+                print(f"[!] The loader did not answer within {RESPONSE_TIMEOUT_MS / 1000:.0f}s. Exiting loop.")
+                break
             except Exception as e:
                 print(f"[!] Error during Load More: {e}")
                 break
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+
+import pytest
+from aiohttp import web
+
+import crawl_harness
+from cassette import Cassette
+from crawl_engine import API_URL
+from replay_server import build_app, replay_url, synthetic_center_stones_cassette
+
+
+class ReplayServer:
+    """
+    replay_server.build_app() on a free local port, served from a background thread so crawls can
+    run in a child process that is killed part way. load() swaps the catalogue it answers with;
+    `requested` lists the cursor of every POST answered. `app_options` go to build_app() (e.g. error_rate).
+    """
+
+    def __init__(self, cassette_dir, **app_options):
+        self.cassette_dir = cassette_dir
+        self.entries = {}
+        self.app = build_app(self.entries, **app_options)
+        self.requested = []
+        self.app.on_response_prepare.append(self._record_cursor)
+        self.loop = asyncio.new_event_loop()
+        self.runner = web.AppRunner(self.app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.api_url = replay_url(API_URL, port=self.runner.addresses[0][1])
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    async def _record_cursor(self, request, response):
+        if request.method == "POST":
+            self.requested.append(json.loads((await request.post())["body"])["cursor"])
+
+    def load(self, total_products=crawl_harness.TOTAL_PRODUCTS, edit=None):
+        """
+        Serves a synthetic catalogue of `total_products` stones. Each is passed through `edit(product)`
+        if given, which returns the product to serve or None to leave it out.
+        """
+        cassette_path = str(self.cassette_dir / f"catalogue_{total_products}.jsonl.gz")
+        synthetic_center_stones_cassette(cassette_path, crawl_harness.PAYLOAD, total_products)
+        entries = Cassette(cassette_path).load()
+        if edit:
+            for entry in entries.values():
+                document = json.loads(entry["body"])
+                products = (edit(product) for product in document["products"])
+                document["products"] = [product for product in products if product is not None]
+                entry["body"] = json.dumps(document)
+        self.entries.clear()
+        self.entries.update(entries)
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@pytest.fixture
+def replay(tmp_path):
+    server = ReplayServer(tmp_path)
+    server.load()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def crawl(tmp_path, replay):
+    """Runs crawl_harness.py against the replay server into tmp_path/out; returns the exit code."""
+    output_dir = tmp_path / "out"
+
+    def run(resume=False, incremental=False, kill_after=None, kill_after_writes=None):
+        command = [sys.executable, crawl_harness.__file__, str(output_dir), replay.api_url]
+        if resume:
+            command.append("--resume")
+        if incremental:
+            command.append("--incremental")
+        if kill_after:
+            command += ["--kill-after", str(kill_after)]
+        if kill_after_writes:
+            command += ["--kill-after-writes", str(kill_after_writes)]
+        # Run from tmp_path so scraper_errors.log never lands in the repository
+        result = subprocess.run(command, cwd=tmp_path, capture_output=True, text=True, timeout=120)
+        assert result.returncode in (0, crawl_harness.KILLED_EXIT_CODE), result.stderr
+        return result.returncode
+
+    run.output_dir = str(output_dir)
+    return run
@@ -0,0 +1,133 @@
+"""
+Runs one crawl of the synthetic test catalogue into a directory with every journal the scrapers
+keep (checkpoint, dedup index, catalogue and, with --incremental, delta state and change log),
+and reads the results back for the tests. With --kill-after N the crawl dies without any cleanup
+(os._exit) right after its Nth checkpoint write, like a crawl killed mid-run; with
+--kill-after-writes N it dies with its Nth output write on disk but never fsynced or journaled.
+"""
+import argparse
+import glob
+import logging
+import os
+import sqlite3
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import crawl_checkpoint  # noqa: E402
+import output_sink  # noqa: E402
+from crawl_engine import run_crawl  # noqa: E402
+from output_sink import JsonlSink, iter_jsonl  # noqa: E402
+
+# --- Configuration ---
+JOB_NAME = "lab"
+TOTAL_PRODUCTS = 700
+FIRST_ID = 7000000000000  # replay_server.synthetic_center_stones_cassette() numbers stones from here
+LAST_CURSOR = 50  # 14 products per page; crawled without end discovery, so resumed requests can be counted
+PRODUCTS_PER_FILE = 50  # Not a multiple of the 14-product page, so files rotate mid-page
+KILLED_EXIT_CODE = 9
+
+PAYLOAD = {
+    "filtersState": {"labDiamond": {"type": "lab_LooseDiamond", "caratRange": [2, 11], "labList": ["IGI", "GIA"]}},
+    "stoneTypeState": "labDiamond",
+    "sortState": "price-ascending",
+    "currencyCode": "USD",
+    "currencyRate": "1.0",
+}
+
+
+def output_ids(output_dir):
+    """Product ids in every JSONL output file, in file order (duplicates kept)."""
+    return [record["id"] for path in sorted(glob.glob(os.path.join(output_dir, f"{JOB_NAME}_*.jsonl")))
+            for record in iter_jsonl(path)]
+
+
+def done_cursors(output_dir):
+    conn = sqlite3.connect(os.path.join(output_dir, "checkpoint.sqlite"))
+    try:
+        return {row[0] for row in conn.execute("SELECT cursor FROM cursors WHERE job = ? AND status = 'done'",
+                                               (JOB_NAME,))}
+    finally:
+        conn.close()
+
+
+def catalogue_ids(output_dir):
+    """Product ids of the catalogue's stone rows (one row per product)."""
+    conn = sqlite3.connect(os.path.join(output_dir, "catalogue.sqlite"))
+    try:
+        return [int(row[0]) for row in conn.execute("SELECT id FROM stones")]
+    finally:
+        conn.close()
+
+
+def change_records(output_dir, run_number):
+    """Every record of one incremental run's change log, across its files."""
+    pattern = os.path.join(output_dir, "changes", f"{JOB_NAME}_changes_run{run_number:04d}_*.jsonl")
+    return [record for path in sorted(glob.glob(pattern)) for record in iter_jsonl(path)]
+
+
+def crawl(output_dir, api_url, resume=False, incremental=False, **options):
+    """Crawls the test catalogue into output_dir; `options` go to run_crawl (e.g. cache_path)."""
+    sink = JsonlSink(output_dir, JOB_NAME, records_per_file=PRODUCTS_PER_FILE)
+    changes_sink = JsonlSink(os.path.join(output_dir, "changes"), f"{JOB_NAME}_changes") if incremental else None
+    return run_crawl(PAYLOAD, LAST_CURSOR, sink, api_url=api_url, parallel_requests=4, max_parallel_requests=8,
+                     requests_per_second=500, max_requests_per_second=1000,
+                     checkpoint_path=os.path.join(output_dir, "checkpoint.sqlite"), job_name=JOB_NAME,
+                     resume=resume, discover_end=False,
+                     dedup_path=os.path.join(output_dir, f"{JOB_NAME}_seen_products.sqlite"),
+                     delta_path=os.path.join(output_dir, f"{JOB_NAME}_delta_state.sqlite") if incremental else None,
+                     changes_sink=changes_sink, catalogue_path=os.path.join(output_dir, "catalogue.sqlite"),
+                     **options)
+
+
+def die_after_checkpoint_writes(count):
+    mark_done = crawl_checkpoint.CrawlCheckpoint.mark_done
+    calls = []
+
+    def mark_done_then_die(self, cursor_products, file_number=None, durable_bytes=None):
+        mark_done(self, cursor_products, file_number, durable_bytes)
+        calls.append(file_number)
+        if len(calls) == count:
+            os._exit(KILLED_EXIT_CODE)
+
+    crawl_checkpoint.CrawlCheckpoint.mark_done = mark_done_then_die
+
+
+def die_after_sink_writes(count):
+    write = output_sink.JsonlSink.write
+    calls = []
+
+    def write_then_die(self, records, token=None, token_value=None):
+        write(self, records, token, token_value)
+        if self.prefix != JOB_NAME:
+            return
+        calls.append(token)
+        if len(calls) == count - 1:
+            self.sync()  # The fsync timer fires, journaling the file part way through
+        elif len(calls) == count:
+            # A size-triggered flush puts this write in the file, but it is never fsynced or journaled
+            self._write_buffer()
+            self._raw_file.flush()
+            os._exit(KILLED_EXIT_CODE)
+
+    output_sink.JsonlSink.write = write_then_die
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl the test catalogue, optionally dying part way through.")
+    parser.add_argument("output_dir")
+    parser.add_argument("api_url")
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--kill-after", type=int, metavar="N", help="Die right after the Nth checkpoint write.")
+    parser.add_argument("--kill-after-writes", type=int, metavar="N",
+                        help="Die with the Nth output write flushed to the file but not fsynced.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.kill_after:
+        die_after_checkpoint_writes(args.kill_after)
+    if args.kill_after_writes:
+        die_after_sink_writes(args.kill_after_writes)
+    crawl(args.output_dir, args.api_url, resume=args.resume, incremental=args.incremental)
@@ -0,0 +1,36 @@
+from crawl_harness import FIRST_ID, KILLED_EXIT_CODE, TOTAL_PRODUCTS, catalogue_ids, output_ids
+
+
+def test_the_catalogue_holds_every_product_after_an_interrupted_run(crawl):
+    assert crawl(kill_after=3) == KILLED_EXIT_CODE
+    assert crawl(resume=True) == 0
+    rows = catalogue_ids(crawl.output_dir)
+    assert len(rows) == TOTAL_PRODUCTS
+    assert set(rows) == set(output_ids(crawl.output_dir)) == set(range(FIRST_ID, FIRST_ID + TOTAL_PRODUCTS))
+
+
+def test_every_journaled_cursor_has_its_catalogue_rows_when_the_crawl_dies(crawl):
+    assert crawl(kill_after=3) == KILLED_EXIT_CODE
+    assert set(output_ids(crawl.output_dir)) <= set(catalogue_ids(crawl.output_dir))
+
+
+LISTED_AFTER_DROP = [stone_id for stone_id in range(FIRST_ID, FIRST_ID + TOTAL_PRODUCTS) if stone_id % 3]
+
+
+def _without_every_third_stone(product):
+    return None if product["id"] % 3 == 0 else product
+
+
+def test_stones_dropped_from_the_listing_leave_the_catalogue_after_a_complete_crawl(crawl, replay):
+    assert crawl() == 0
+    replay.load(edit=_without_every_third_stone)
+    assert crawl() == 0
+    assert sorted(catalogue_ids(crawl.output_dir)) == LISTED_AFTER_DROP
+
+
+def test_a_resumed_crawl_keeps_the_stones_its_interrupted_run_saw(crawl, replay):
+    assert crawl() == 0
+    replay.load(edit=_without_every_third_stone)
+    assert crawl(kill_after=3) == KILLED_EXIT_CODE
+    assert crawl(resume=True) == 0
+    assert sorted(catalogue_ids(crawl.output_dir)) == LISTED_AFTER_DROP
@@ -0,0 +1,16 @@
+import pytest
+
+from crawl_engine import crawl_arg_parser
+
+
+def test_shard_is_rejected_without_partitioned(capsys):
+    parser = crawl_arg_parser("Scrape.")
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--shard", "0/4"])
+    assert "--shard only applies with --partitioned" in capsys.readouterr().err
+    assert parser.parse_args(["--partitioned", "--shard", "0/4"]).shard == "0/4"
+    assert parser.parse_args(["--resume"]).shard is None
+
+
+def test_a_caller_can_check_shard_itself():
+    assert crawl_arg_parser("Scrape.", shard_needs_partitioned=False).parse_args(["--shard", "0/4"]).shard == "0/4"
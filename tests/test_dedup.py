@@ -0,0 +1,21 @@
+from crawl_harness import FIRST_ID, KILLED_EXIT_CODE, TOTAL_PRODUCTS, output_ids
+
+
+def _listed_three_times(product):
+    # Every stone shows up under three consecutive positions, often on two pages (14 is not a multiple of 3)
+    return dict(product, id=FIRST_ID + (product["id"] - FIRST_ID) // 3)
+
+
+def test_a_product_listed_on_several_pages_is_written_once_across_a_resume(crawl, replay):
+    replay.load(edit=_listed_three_times)
+    assert crawl(kill_after=3) == KILLED_EXIT_CODE
+    assert crawl(resume=True) == 0
+    ids = output_ids(crawl.output_dir)
+    assert len(ids) == len(set(ids)) == -(-TOTAL_PRODUCTS // 3)
+
+
+def test_a_fresh_crawl_forgets_the_products_seen_by_the_last_one(crawl):
+    assert crawl() == 0
+    assert crawl() == 0
+    ids = output_ids(crawl.output_dir)
+    assert len(ids) == len(set(ids)) == TOTAL_PRODUCTS
@@ -0,0 +1,38 @@
+from collections import Counter
+
+from crawl_harness import FIRST_ID, KILLED_EXIT_CODE, TOTAL_PRODUCTS, change_records
+
+
+def _next_week(product):
+    """The catalogue a week later: some stones repriced, some sold, some relisted under a new id."""
+    position = product["id"] - FIRST_ID
+    if position % 70 == 1:
+        return None  # Sold: 10 stones
+    if position % 100 == 2:
+        return dict(product, id=product["id"] + 10 ** 6)  # Relisted: 7 removed, 7 added
+    if position % 50 == 0:
+        variant = dict(product["variants"][0], price=str(int(product["variants"][0]["price"]) + 1))
+        return dict(product, price_min=product["price_min"] + 1, variants=[variant])  # Repriced: 14
+    return product
+
+
+def test_an_interrupted_incremental_run_reports_every_change_exactly_once(crawl, replay):
+    assert crawl(incremental=True) == 0
+    assert Counter(record["op"] for record in change_records(crawl.output_dir, 1)) == {"added": TOTAL_PRODUCTS}
+
+    replay.load(edit=_next_week)
+    assert crawl(incremental=True, kill_after=3) == KILLED_EXIT_CODE
+    assert crawl(incremental=True, resume=True) == 0
+
+    records = change_records(crawl.output_dir, 2)
+    assert Counter(record["op"] for record in records) == {"added": 7, "changed": 14, "removed": 17}
+    assert len({record["key"] for record in records}) == len(records)
+    for record in records:
+        if record["op"] == "changed":
+            assert set(record["changes"]) == {"price", "price_min"}
+
+
+def test_resuming_a_finished_incremental_run_starts_a_new_one_instead_of_reporting_removals(crawl):
+    assert crawl(incremental=True) == 0
+    assert crawl(incremental=True, resume=True) == 0
+    assert change_records(crawl.output_dir, 2) == []
@@ -0,0 +1,51 @@
+import glob
+import json
+
+from crawl_harness import PAYLOAD, TOTAL_PRODUCTS
+from output_sink import iter_jsonl
+
+
+def _repriced(product):
+    variant = dict(product["variants"][0], price=str(int(product["variants"][0]["price"]) + 1))
+    return dict(product, variants=[variant])
+
+
+def _write_config(tmp_path, api_url):
+    config = {
+        "api_url": api_url,
+        "parallel_requests": 4, "max_parallel_requests": 8,
+        "requests_per_second": 500, "max_requests_per_second": 1000,
+        "filters": PAYLOAD["filtersState"],
+        "jobs": [{"name": "lab", "stone_type": "labDiamond", "output_dir": str(tmp_path / "out"), "max_cursor": 500}],
+    }
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def _merged_prices(tmp_path):
+    records = [record for path in sorted(glob.glob(str(tmp_path / "out" / "lab_*.jsonl")))
+               for record in iter_jsonl(path)]
+    prices = {record["id"]: record["price"] for record in records}
+    assert len(prices) == len(records)
+    return prices
+
+
+def test_merge_reads_only_the_worker_files_of_the_last_plan(tmp_path, monkeypatch, replay):
+    monkeypatch.chdir(tmp_path)  # distributed_crawl opens scraper_errors.log in the working directory
+    import distributed_crawl
+
+    config_path = _write_config(tmp_path, replay.api_url)
+    queue_path = str(tmp_path / "queue.sqlite")
+    distributed_crawl.plan(config_path, queue_path)
+    distributed_crawl.work(config_path, queue_path, worker_id="host-a")
+    distributed_crawl.merge(config_path)
+    first_prices = _merged_prices(tmp_path)
+    assert len(first_prices) == TOTAL_PRODUCTS
+
+    # A week later, another host does the crawl; the first host's worker files must not leak in
+    replay.load(edit=_repriced)
+    distributed_crawl.plan(config_path, queue_path)
+    distributed_crawl.work(config_path, queue_path, worker_id="host-b")
+    distributed_crawl.merge(config_path)
+    assert _merged_prices(tmp_path) == {stone_id: str(int(price) + 1) for stone_id, price in first_prices.items()}
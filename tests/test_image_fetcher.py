@@ -0,0 +1,30 @@
+import asyncio
+import sqlite3
+
+from cassette import request_key
+from image_fetcher import ImageIndex, fetch_images
+
+
+def _image_url(replay):
+    return replay.api_url.split("/collections/")[0] + "/files/stone.png"
+
+
+def test_a_failed_refetch_keeps_the_stored_file(tmp_path, replay):
+    url = _image_url(replay)
+    index_path = str(tmp_path / "images" / "index.sqlite")
+    replay.entries[request_key("GET", url)] = {"status": 200, "body": "png bytes",
+                                               "headers": {"Content-Type": "image/png", "ETag": '"v1"'}}
+    assert asyncio.run(fetch_images([url], str(tmp_path / "images"), index_path, concurrency=1))["stored"] == 1
+    index = ImageIndex(index_path)
+    stored = index.path_for(url)
+    index.close()
+    assert stored
+
+    replay.entries.clear()  # The CDN now answers 404
+    assert asyncio.run(fetch_images([url], str(tmp_path / "images"), index_path, concurrency=1))["failed"] == 1
+    index = ImageIndex(index_path)
+    assert index.path_for(url) == stored
+    index.close()
+    conn = sqlite3.connect(index_path)
+    assert conn.execute("SELECT status, etag, error IS NOT NULL FROM images").fetchall() == [(404, '"v1"', 1)]
+    conn.close()
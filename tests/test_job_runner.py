@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_ARGUMENTS = ["job_name", "checkpoint_path", "dedup_path", "delta_path", "catalogue_path"]
+
+
+def _capture(calls):
+    def record(payload, max_cursor, sink, **kwargs):
+        calls.append(dict(kwargs, payload=payload, output_dir=sink.output_dir, prefix=sink.prefix))
+    return record
+
+
+def test_the_configured_lab_job_and_the_lab_scraper_keep_the_same_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Both modules open scraper_errors.log in the working directory
+    import job_runner
+    import lab_natural_products
+
+    calls = []
+    monkeypatch.setattr(job_runner, "CrawlJob", _capture(calls))
+    monkeypatch.setattr(lab_natural_products, "run_crawl", _capture(calls))
+    config = job_runner.load_config(os.path.join(REPO_DIR, "jobs.json"))
+    lab_job = next(job for job in config["jobs"] if job["name"] == lab_natural_products.JOB_NAME)
+    job_runner.build_crawl_job(config, lab_job, incremental=True)
+    lab_natural_products.scrape_keyzar_api_parallel(incremental=True)
+
+    configured, scraper = calls
+    for key in STATE_ARGUMENTS + ["payload", "output_dir", "prefix"]:
+        assert configured[key] == scraper[key], key
+
+
+def test_shard_is_rejected_when_no_selected_job_is_partitioned(tmp_path):
+    config = tmp_path / "jobs.json"
+    jobs = [{"name": "lab", "stone_type": "labDiamond"},
+            {"name": "natural", "stone_type": "diamond", "partitioned": True}]
+    config.write_text(json.dumps({"api_url": "http://127.0.0.1:9/", "jobs": jobs}))
+    command = [sys.executable, os.path.join(REPO_DIR, "job_runner.py"), "--config", str(config), "--shard", "0/2"]
+    result = subprocess.run(command + ["--job", "lab"], cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "--shard only applies" in result.stderr
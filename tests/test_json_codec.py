@@ -0,0 +1,70 @@
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+import json_codec
+from product_extractor import parse_diamond_products
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "second category"))
+
+from combine_to_csv import extract_product_fields  # noqa: E402
+
+PRODUCT = {
+    "id": 7000000000001, "handle": "oval-1", "title": "Oval 2.1ct", "price_min": "1000",
+    "variants": [{"price": "1000", "weight": 0.4, "sku": "not read"}],
+    "media": [{"alt": "Oval", "image": {"originalSrc": "//cdn.shopify.com/oval.png"}}],
+    "images_info": [{"src": "//cdn.shopify.com/oval-small.png"}],
+    "metafields": [{"key": "carat", "value": "2.1"}, {"key": "shape", "value": "Oval"}, {"key": "seo", "value": "x"}],
+    "enhancedProductMediaList": [{"url": "not read"}],
+}
+
+RESPONSES = {
+    "complete": {"products": [PRODUCT], "totalCount": 1},
+    "explicit nulls": {"products": [dict(PRODUCT, title=None, variants=[{"price": None, "weight": None}],
+                                         media=[{"alt": None, "image": None}],
+                                         metafields=[{"key": "carat", "value": None}, {"key": "color"}])]},
+    "missing keys": {"products": [{"id": 1, "variants": [], "media": [{}], "metafields": None}]},
+    "unexpected shapes": {"products": [dict(PRODUCT, variants={"price": "1000"}, images_info="none")]},
+    "no products": {"products": None},
+}
+
+
+@pytest.mark.parametrize("name", RESPONSES)
+def test_the_fast_decode_extracts_what_a_full_decode_does(name):
+    body = json.dumps(RESPONSES[name]).encode("utf-8")
+    assert parse_diamond_products(json_codec.decode_diamond_response(body)) == parse_diamond_products(json.loads(body))
+
+
+def test_an_explicit_null_stays_none_and_a_missing_field_is_empty():
+    body = json.dumps(RESPONSES["explicit nulls"]).encode("utf-8")
+    row = parse_diamond_products(json_codec.decode_diamond_response(body))[0]
+    assert (row["title"], row["price"], row["carat"], row["color"], row["handle"]) == (None, None, None, "", "oval-1")
+
+
+def _project(full, slim):
+    """`full` cut down to the keys `slim` kept, at every level."""
+    if isinstance(slim, dict):
+        return {key: _project(full[key], value) for key, value in slim.items()}
+    if isinstance(slim, list):
+        return [_project(full_item, slim_item) for full_item, slim_item in zip(full, slim)]
+    return full
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(REPO_DIR, "response", "*.json"))),
+                         ids=os.path.basename)
+def test_ring_payloads_decode_to_a_faithful_subset_of_the_full_document(path):
+    with open(path, "rb") as f:
+        body = f.read()
+    decoded, full = json_codec.decode_ring_payload(body), json.loads(body)
+    assert _project(full, decoded) == decoded
+    assert ([extract_product_fields(product) for product in json_codec.ring_products(decoded)] ==
+            [extract_product_fields(product) for product in json_codec.ring_products(full)])
+
+
+def test_a_truncated_body_raises_decode_error():
+    with pytest.raises(json_codec.DecodeError):
+        json_codec.decode_diamond_response(b'{"products": [{"id": 70')
@@ -0,0 +1,86 @@
+import os
+
+from crawl_harness import KILLED_EXIT_CODE, TOTAL_PRODUCTS, output_ids
+from output_sink import PART_SUFFIX, JsonlSink, iter_jsonl
+
+
+def _records(start, count):
+    return [{"id": i} for i in range(start, start + count)]
+
+
+def test_a_write_is_never_split_across_files_and_its_token_waits_for_the_whole_file(tmp_path):
+    sink = JsonlSink(str(tmp_path), "lab", records_per_file=5)
+    reported = []
+
+    def on_durable(tokens, file_number, durable_bytes):
+        # Everything a reported token wrote must already be in a finished file, which ends at durable_bytes
+        assert os.path.getsize(sink.file_path(file_number)) == durable_bytes
+        finished = [record["id"] for record in iter_jsonl(sink.file_path(file_number))]
+        reported.append((dict(tokens), file_number, finished))
+
+    sink.start(on_durable=on_durable)
+    sink.write(_records(0, 3), token=1)
+    sink.write(_records(3, 3), token=2)  # Takes file 1 past records_per_file; rotates after the write
+    sink.write(_records(6, 3), token=3)
+    sink.close()
+
+    assert reported == [({1: 3, 2: 3}, 1, list(range(6))), ({3: 3}, 2, list(range(6, 9)))]
+    assert not list(tmp_path.glob(f"*{PART_SUFFIX}"))
+
+
+def test_a_killed_run_leaves_a_readable_part_file_that_the_next_run_recovers(tmp_path):
+    killed = JsonlSink(str(tmp_path), "lab", compression="gzip", records_per_file=100)
+    killed.start()
+    killed.write(_records(0, 4), token=1)
+    killed.sync()  # Then the process dies without closing the file
+
+    part_path = killed.file_path(1) + PART_SUFFIX
+    assert [record["id"] for record in iter_jsonl(part_path)] == list(range(4))
+
+    resumed = JsonlSink(str(tmp_path), "lab", compression="gzip", records_per_file=100)
+    assert resumed.next_file_number() == 2
+    resumed.start(resumed.next_file_number())
+    resumed.write(_records(4, 2), token=2)
+    resumed.close()
+
+    assert not os.path.exists(part_path)
+    assert [record["id"] for number in (1, 2) for record in iter_jsonl(resumed.file_path(number))] == list(range(6))
+
+
+def test_iter_jsonl_skips_a_torn_last_line(tmp_path):
+    path = tmp_path / "lab_001.jsonl"
+    path.write_bytes(b'{"id":1}\n{"id":2}\n{"id":')
+    assert [record["id"] for record in iter_jsonl(str(path))] == [1, 2]
+
+
+def test_an_empty_last_file_is_removed_on_close(tmp_path):
+    sink = JsonlSink(str(tmp_path), "lab", records_per_file=2)
+    sink.start()
+    sink.write(_records(0, 2), token=1)
+    sink.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["lab_001.jsonl"]
+
+
+def test_a_resumed_sink_drops_what_was_written_after_the_last_durable_point(tmp_path):
+    killed = JsonlSink(str(tmp_path), "lab", records_per_file=4)
+    durable = []
+    killed.start(on_durable=lambda tokens, file_number, durable_bytes: durable.append((file_number, durable_bytes)))
+    killed.write(_records(0, 4), token=1)  # File 1, finished
+    killed.write(_records(4, 2), token=2)
+    killed.sync()  # File 2 is durable up to here
+    killed.write(_records(6, 1), token=3)
+    killed._write_buffer()
+    killed._raw_file.flush()  # On disk, but never fsynced: the process dies here
+
+    resumed = JsonlSink(str(tmp_path), "lab", records_per_file=4)
+    resumed.start(durable[-1][0] + 1, durable=durable[-1])
+    resumed.close()
+    assert [record["id"] for number in (1, 2) for record in iter_jsonl(resumed.file_path(number))] == list(range(6))
+
+
+def test_resume_after_dying_between_a_buffer_write_and_its_fsync_writes_no_product_twice(crawl):
+    # Write 4 rotates to file 2, write 5 is fsynced there, write 6 reaches the file unsynced
+    assert crawl(kill_after_writes=6) == KILLED_EXIT_CODE
+    assert crawl(resume=True) == 0
+    ids = output_ids(crawl.output_dir)
+    assert len(ids) == len(set(ids)) == TOTAL_PRODUCTS
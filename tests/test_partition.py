@@ -0,0 +1,88 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+import crawl_harness
+from cassette import request_key
+from crawl_harness import JOB_NAME, LAST_CURSOR, PAYLOAD, TOTAL_PRODUCTS, output_ids
+from partition import partition_payload, select_shards, split_range
+
+PAGE_SIZE = 14
+# The synthetic stones cost 230..5123 and weigh 1.00..3.99 carats
+PARTITIONED_PAYLOAD = json.loads(json.dumps(PAYLOAD))
+PARTITIONED_PAYLOAD["filtersState"]["labDiamond"].update(priceRange=[200, 6000], caratRange=[1, 4])
+SPLITS = {"priceRange": 3, "caratRange": 2, "colorRange": 2}  # The lab filters have no colorRange
+
+
+def _grid(low, high, step):
+    return [round(low + i * step, 2) for i in range(int(round((high - low) / step)) + 1)]
+
+
+@pytest.mark.parametrize("low, high, parts, step, geometric", [
+    (0, 7, 2, 1, False), (1, 8, 4, 1, False), (200, 6000, 8, 0.01, True), (1, 4, 3, 0.01, True), (3, 4, 8, 1, False),
+])
+def test_slices_cover_every_value_of_the_range_exactly_once(low, high, parts, step, geometric):
+    slices = split_range(low, high, parts, step, geometric)
+    assert len(slices) <= parts
+    for value in _grid(low, high, step):
+        assert sum(start <= value <= end for start, end in slices) == 1, value
+
+
+def test_a_geometric_split_cuts_wide_ranges_at_proportional_points():
+    assert split_range(0, 7, 2) == [[0, 3], [4, 7]]
+    assert split_range(1, 4, 2, 0.01, geometric=True) == [[1, 2.0], [2.01, 4]]
+    assert split_range(5, 5, 4) == [[5, 5]]
+
+
+def test_partition_payload_makes_one_shard_per_combination_of_slices():
+    shards = partition_payload(PARTITIONED_PAYLOAD, SPLITS)
+    names = [name for name, _ in shards]
+    assert names == [f"price{price}.carat{carat}" for price in range(3) for carat in range(2)]
+
+    filters = [payload["filtersState"]["labDiamond"] for _, payload in shards]
+    assert {tuple(f["caratRange"]) for f in filters} == {(1, 2.0), (2.01, 4)}
+    assert all(f["labList"] == ["IGI", "GIA"] for f in filters)
+    assert PARTITIONED_PAYLOAD["filtersState"]["labDiamond"]["priceRange"] == [200, 6000]  # Left untouched
+
+
+def test_select_shards_deals_every_shard_to_exactly_one_machine():
+    shards = partition_payload(PARTITIONED_PAYLOAD, SPLITS)
+    assert select_shards(shards, None) == shards
+    dealt = [name for index in range(4) for name, _ in select_shards(shards, f"{index}/4")]
+    assert sorted(dealt) == sorted(name for name, _ in shards)
+    assert select_shards(shards, "1/4") == shards[1::4]
+    for spec in ("4/4", "-1/4"):
+        with pytest.raises(ValueError):
+            select_shards(shards, spec)
+
+
+def _serve_filtered(replay, shards):
+    """Answers each shard's cursor walk with the catalogue's stones inside its price and carat ranges."""
+    catalogue = [product for entry in list(replay.entries.values())
+                 for product in json.loads(entry["body"])["products"]]
+    for _, payload in shards:
+        filters = payload["filtersState"]["labDiamond"]
+        low_price, high_price = filters["priceRange"]
+        low_carat, high_carat = filters["caratRange"]
+        products = [product for product in catalogue if low_price <= product["price_min"] <= high_price
+                    and low_carat <= product["variants"][0]["weight"] <= high_carat]
+        for cursor in range(1, LAST_CURSOR + 1):
+            body = json.dumps({"products": products[(cursor - 1) * PAGE_SIZE:cursor * PAGE_SIZE]})
+            key = request_key("POST", replay.api_url, {"body": json.dumps(dict(payload, cursor=cursor))})
+            replay.entries[key] = {"status": 200, "body": body, "headers": None}
+
+
+def test_a_partitioned_crawl_collects_every_stone_exactly_once(tmp_path, replay):
+    shards = partition_payload(PARTITIONED_PAYLOAD, SPLITS)
+    _serve_filtered(replay, shards)
+    output_dir = str(tmp_path / "out")
+    crawl_harness.crawl(output_dir, replay.api_url, shards=shards)
+
+    ids = output_ids(output_dir)
+    assert len(ids) == len(set(ids)) == TOTAL_PRODUCTS
+    conn = sqlite3.connect(os.path.join(output_dir, "checkpoint.sqlite"))
+    journaled = {row[0] for row in conn.execute("SELECT DISTINCT job FROM cursors WHERE status = 'done'")}
+    conn.close()
+    assert journaled == {f"{JOB_NAME}:{name}" for name, _ in shards}  # Each shard resumes on its own
@@ -0,0 +1,50 @@
+import pytest
+
+from product_extractor import compile_extractor, compile_response_parser, parse_diamond_products, parse_path
+
+
+def test_parse_path_splits_keys_and_indexes():
+    assert parse_path("variants[0].price") == ["variants", 0, "price"]
+    assert parse_path("media[0].image.originalSrc") == ["media", 0, "image", "originalSrc"]
+    with pytest.raises(ValueError):
+        parse_path("")
+
+
+@pytest.mark.parametrize("item, expected", [
+    ({"top": 1, "x": {"y": [{"z": "a"}, {"z": "b"}]}}, {"top": 1, "deep": "b"}),
+    ({"x": {"y": [{"z": "a"}]}}, {"top": "-", "deep": "-"}),  # Missing key, list too short
+    ({"top": None, "x": {"y": None}}, {"top": None, "deep": "-"}),  # A null is kept; a null mid-path is missing
+    ({"x": "not a dict"}, {"top": "-", "deep": "-"}),
+])
+def test_each_column_follows_its_path_and_a_missing_step_gives_the_default(item, expected):
+    extract = compile_extractor({"top": "top", "deep": "x.y[1].z"}, default="-")
+    assert extract(item) == expected
+
+
+def test_only_the_listed_metafields_are_copied():
+    extract = compile_extractor({}, metafields={"carat", "color"})
+    assert extract({"metafields": [{"key": "carat", "value": "2.1"}, {"key": "seo", "value": "x"},
+                                   {"key": "color"}]}) == {"carat": "2.1", "color": ""}
+    assert extract({"metafields": None}) == {}
+    assert extract({}) == {}
+
+
+def test_a_response_parser_extracts_every_product_and_tolerates_none():
+    parse = compile_response_parser({"id": "id"})
+    assert parse({"products": [{"id": 1}, {"id": 2}]}) == [{"id": 1}, {"id": 2}]
+    assert parse({"products": None}) == parse({}) == []
+
+
+def test_a_center_stone_comes_out_as_its_flat_row():
+    product = {
+        "id": 7000000000001, "handle": "oval-1", "title": "Oval 2.1ct", "price_min": "1000",
+        "variants": [{"price": "1000", "weight": 0.4}],
+        "media": [{"alt": "Oval", "image": {"originalSrc": "//cdn.shopify.com/oval.png"}}],
+        "images_info": [{"src": "//cdn.shopify.com/oval-small.png"}],
+        "metafields": [{"key": "carat", "value": "2.1"}, {"key": "shape", "value": "Oval"}],
+    }
+    assert parse_diamond_products({"products": [product]}) == [{
+        "id": 7000000000001, "handle": "oval-1", "title": "Oval 2.1ct", "price_min": "1000", "price": "1000",
+        "weight": 0.4, "originalSrc": "//cdn.shopify.com/oval.png", "alt": "Oval",
+        "image": "//cdn.shopify.com/oval-small.png", "carat": "2.1", "shape": "Oval",
+    }]
@@ -0,0 +1,60 @@
+import pytest
+
+from catalogue_store import CatalogueStore
+from query_api import create_app
+
+STONES = [
+    {"id": "1", "handle": "oval-1", "price": "1000", "carat": "2.1", "shape": "Oval", "color": "E", "clarity": "VS1",
+     "lab": "IGI"},
+    {"id": "2", "handle": "oval-2", "price": "3000", "carat": "3.0", "shape": "Oval", "color": "G", "clarity": "SI1",
+     "lab": "GIA"},
+    {"id": "3", "handle": "round-3", "price": "2000", "carat": "2.5", "shape": "Round", "color": "D",
+     "clarity": "VVS2", "lab": "IGI"},
+    {"id": "4", "handle": "pear-4", "price": "500", "carat": None, "shape": "Pear", "color": "F", "clarity": "VS2",
+     "lab": "GIA"},
+]
+
+
+@pytest.fixture
+def client(tmp_path):
+    """The API over a catalogue where "api" crawled every stone and, a minute later, "lab" crawled two again."""
+    path = str(tmp_path / "catalogue.sqlite")
+    store = CatalogueStore(path)
+    store.add_stones(STONES, job="api")
+    store.flush()
+    store.conn.execute("UPDATE stones SET last_seen = last_seen - 60")
+    store.add_stones([dict(stone, price=str(int(stone["price"]) + 10)) for stone in STONES[:2]], job="lab")
+    store.close()
+    return create_app(path, watch=False).test_client()
+
+
+def _ids(body):
+    return [stone["id"] for stone in body["results"]]
+
+
+def test_a_stone_crawled_by_two_jobs_is_counted_once(client):
+    body = client.get("/stones?facets=1").get_json()
+    assert body["total"] == 4
+    assert sorted(_ids(body)) == ["1", "2", "3", "4"]
+    assert body["facets"]["shape"] == {"Oval": 2, "Round": 1, "Pear": 1}
+    assert client.get("/facets?shape=oval").get_json()["facets"]["lab"] == {"IGI": 1, "GIA": 1}
+    assert client.get("/health").get_json()["stones"] == 4
+
+
+def test_a_stone_is_reported_as_its_latest_crawl_unless_a_job_is_asked_for(client):
+    latest = {stone["id"]: (stone["job"], stone["price"]) for stone in client.get("/stones").get_json()["results"]}
+    assert latest["1"] == ("lab", 1010.0)
+    assert latest["3"] == ("api", 2000.0)
+    api = client.get("/stones?job=api").get_json()
+    assert api["total"] == 4
+    assert {stone["price"] for stone in api["results"] if stone["id"] == "1"} == {1000.0}
+    assert client.get("/stones?job=api,lab").get_json()["total"] == 4
+
+
+def test_filters_combine_and_pages_sort_by_the_chosen_column(client):
+    assert _ids(client.get("/stones?carat_min=2.2").get_json()) == ["3", "2"]  # Stone 4 has no carat
+    assert _ids(client.get("/stones?shape=oval,round&min_clarity=vs1").get_json()) == ["1", "3"]
+    assert _ids(client.get("/stones?color=E&color=F").get_json()) == ["4", "1"]
+    first = client.get("/stones?sort=carat&order=desc&page_size=2").get_json()
+    second = client.get("/stones?sort=carat&order=desc&page_size=2&page=2").get_json()
+    assert _ids(first) + _ids(second) == ["2", "3", "1", "4"]  # Missing carat last
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import pytest
+
+import crawl_engine
+import crawl_harness
+import rate_control
+from conftest import ReplayServer
+from crawl_harness import LAST_CURSOR, output_ids
+from rate_control import (DECREASE_COOLDOWN_SECONDS, MIN_REQUESTS_PER_SECOND, AdaptiveRateController, backoff_delay,
+                          parse_retry_after)
+from replay_server import STATS
+
+
+def test_backoff_waits_up_to_a_doubling_capped_bound(monkeypatch):
+    monkeypatch.setattr(rate_control.random, "uniform", lambda low, high: (low, high))
+    assert [backoff_delay(attempt) for attempt in (1, 2, 3)] == [(0, 2), (0, 4), (0, 8)]
+    assert backoff_delay(10) == (0, 60)
+    assert backoff_delay(0) == (0, 2)
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-5") == 0.0
+    assert 25 < parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0.0
+    for value in (None, "", "soon"):
+        assert parse_retry_after(value) is None
+
+
+def test_failures_halve_concurrency_and_rate_once_per_congestion_event():
+    async def run():
+        controller = AdaptiveRateController(8, 16, initial_rate=10, max_rate=20)
+        for _ in range(8):
+            await controller.acquire()
+        await controller.release(503)
+        await controller.release(None)  # Same congestion event: no second decrease
+        assert (controller.limit, controller.rate) == (4, 5)
+
+        controller._last_decrease -= DECREASE_COOLDOWN_SECONDS
+        await controller.release(429)
+        assert (controller.limit, controller.rate) == (2, 2.5)
+
+        for _ in range(5):
+            controller._last_decrease -= DECREASE_COOLDOWN_SECONDS
+            await controller.release(500)
+        assert (controller.limit, controller.rate) == (1, MIN_REQUESTS_PER_SECOND)
+        assert controller.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_only_fast_successes_ramp_up_one_slot_per_healthy_window():
+    async def run():
+        controller = AdaptiveRateController(2, 3, initial_rate=100, max_rate=100.5, latency_target=1.0)
+        outcomes = [(200, 0.1), (200, 5.0), (404, 0.1)]  # Slow and 4xx responses neither count nor back off
+        for status, latency in outcomes:
+            await controller.acquire()
+            await controller.release(status, latency)
+        assert (controller.limit, controller.rate) == (2, 100)
+
+        await controller.acquire()
+        await controller.release(200, 0.1)
+        assert (controller.limit, controller.rate) == (3, 100.5)
+
+        for _ in range(6):
+            await controller.acquire()
+            await controller.release(200, 0.1)
+        assert (controller.limit, controller.rate) == (3, 100.5)  # Capped at the maximums
+
+    asyncio.run(run())
+
+
+def test_retry_after_pauses_every_new_request():
+    async def run():
+        controller = AdaptiveRateController(4, 4, initial_rate=100, max_rate=100)
+        await controller.acquire()
+        await controller.release(429, retry_after=0.3)
+        start = time.monotonic()
+        await asyncio.gather(controller.acquire(), controller.acquire())
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.25
+
+
+def test_a_cancelled_wait_hands_its_slot_back():
+    async def run():
+        controller = AdaptiveRateController(1, 1, initial_rate=100, max_rate=100)
+        controller.paused_until = time.monotonic() + 60
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0.05)
+        assert controller.in_flight == 1  # The slot is taken before the pause
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.in_flight == 0
+        controller.paused_until = 0.0
+        await asyncio.wait_for(controller.acquire(), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_a_crawl_retries_through_injected_errors_and_throttling(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawl_engine, "backoff_delay", lambda attempt: 0.01)
+    monkeypatch.setattr(crawl_engine, "MAX_RETRIES", 10)  # No cursor may run out of retries by chance
+    server = ReplayServer(tmp_path, error_rate=0.15, throttle_rate=0.05, seed=3)
+    try:
+        server.load()
+        crawl_harness.crawl(str(tmp_path / "out"), server.api_url)
+        stats = server.app[STATS]
+    finally:
+        server.close()
+
+    assert stats["errors"] and stats["throttled"]
+    assert stats["served"] == LAST_CURSOR
+    assert len(set(output_ids(str(tmp_path / "out")))) == 14 * LAST_CURSOR
@@ -0,0 +1,50 @@
+import json
+import os
+
+from crawl_harness import JOB_NAME, LAST_CURSOR, TOTAL_PRODUCTS, crawl
+from response_archive import ResponseArchive
+
+
+def _repriced(product):
+    variant = dict(product["variants"][0], price=str(int(product["variants"][0]["price"]) + 1))
+    return dict(product, variants=[variant])
+
+
+def _archived_prices(archive):
+    return {product["id"]: product["variants"][0]["price"] for _, _, body in archive.iter_responses(JOB_NAME)
+            for product in json.loads(body)["products"]}
+
+
+def test_every_page_reads_back_and_only_changed_pages_are_stored_again(tmp_path, replay):
+    archive_dir = str(tmp_path / "archive")
+    crawl(str(tmp_path / "first"), replay.api_url, archive_dir=archive_dir)
+    crawl(str(tmp_path / "second"), replay.api_url, archive_dir=archive_dir)  # Same pages: nothing new
+    archive = ResponseArchive(archive_dir)
+    first_prices = _archived_prices(archive)
+    assert len(first_prices) == TOTAL_PRODUCTS
+    assert archive.summary()["responses"] == LAST_CURSOR
+    archive.close()
+
+    # The repriced pages are compressed with the dictionary trained on the first ones
+    replay.load(edit=_repriced)
+    crawl(str(tmp_path / "third"), replay.api_url, archive_dir=archive_dir)
+    archive = ResponseArchive(archive_dir)
+    assert archive.summary()["responses"] == 2 * LAST_CURSOR
+    assert _archived_prices(archive) == {stone_id: str(int(price) + 1) for stone_id, price in first_prices.items()}
+    first_product = json.loads(archive.get(JOB_NAME, 1))["products"][0]
+    assert first_product["variants"][0]["price"] == str(int(first_prices[first_product["id"]]) + 1)
+    archive.close()
+
+
+def test_bytes_a_killed_run_appended_past_the_index_are_dropped(tmp_path):
+    archive = ResponseArchive(str(tmp_path))
+    archive.add("lab", 1, b'{"products": []}')
+    archive.close()
+    with open(archive.data_path, "ab") as f:
+        f.write(b"never indexed")
+
+    archive = ResponseArchive(str(tmp_path))
+    archive.add("lab", 2, b'{"products": [1]}')
+    assert [body for _, _, body in archive.iter_responses()] == [b'{"products": []}', b'{"products": [1]}']
+    assert os.path.getsize(archive.data_path) == archive.summary()["stored_bytes"]
+    archive.close()
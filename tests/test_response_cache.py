@@ -0,0 +1,29 @@
+import json
+
+from crawl_harness import FIRST_ID, PAYLOAD, TOTAL_PRODUCTS, crawl, output_ids
+from response_cache import ResponseCache, cache_key
+
+
+def test_a_fresh_cache_entry_that_does_not_decode_is_fetched_again(tmp_path, replay):
+    cache_path = str(tmp_path / "cache.sqlite")
+    crawl(str(tmp_path / "first"), replay.api_url, cache_path=cache_path, cache_ttl=3600)
+
+    cache = ResponseCache(cache_path)
+    key = cache_key("POST", replay.api_url, {"body": json.dumps(dict(PAYLOAD, cursor=3))})
+    assert cache.lookup(key) is not None
+    cache.store(key, replay.api_url, 200, {}, b'{"products": [{"id": 70')  # Cut short, and still within the TTL
+    cache.close()
+
+    replay.requested.clear()
+    crawl(str(tmp_path / "second"), replay.api_url, cache_path=cache_path, cache_ttl=3600)
+    assert replay.requested == [3]
+    assert sorted(output_ids(str(tmp_path / "second"))) == list(range(FIRST_ID, FIRST_ID + TOTAL_PRODUCTS))
+
+
+def test_within_the_ttl_a_crawl_makes_no_requests(tmp_path, replay):
+    cache_path = str(tmp_path / "cache.sqlite")
+    crawl(str(tmp_path / "first"), replay.api_url, cache_path=cache_path, cache_ttl=3600)
+    replay.requested.clear()
+    crawl(str(tmp_path / "second"), replay.api_url, cache_path=cache_path, cache_ttl=3600)
+    assert replay.requested == []
+    assert sorted(output_ids(str(tmp_path / "second"))) == sorted(output_ids(str(tmp_path / "first")))
@@ -0,0 +1,24 @@
+from crawl_harness import KILLED_EXIT_CODE, LAST_CURSOR, done_cursors, output_ids
+
+ALL_CURSORS = set(range(1, LAST_CURSOR + 1))
+
+
+def test_resume_fetches_only_the_cursors_left_and_completes_the_output(crawl, replay):
+    assert crawl(kill_after=3) == KILLED_EXIT_CODE
+    journaled = done_cursors(crawl.output_dir)
+    assert 0 < len(journaled) < LAST_CURSOR
+
+    requests_before = len(replay.requested)
+    assert crawl(resume=True) == 0
+    assert sorted(replay.requested[requests_before:]) == sorted(ALL_CURSORS - journaled)
+    assert done_cursors(crawl.output_dir) == ALL_CURSORS
+    assert len(set(output_ids(crawl.output_dir))) == 14 * LAST_CURSOR
+
+
+def test_resume_after_a_finished_crawl_fetches_nothing(crawl, replay):
+    assert crawl() == 0
+    requests_before = len(replay.requested)
+    assert crawl(resume=True) == 0
+    assert replay.requested[requests_before:] == []
+    assert done_cursors(crawl.output_dir) == ALL_CURSORS
+
@@ -0,0 +1,77 @@
+import pytest
+
+import work_queue
+from work_queue import STATUS_DONE, STATUS_FAILED, STATUS_LEASED
+
+TASKS = [("a", {"cursors": [1, 50]}), ("b", {"cursors": [51, 100]})]
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_queue(request, tmp_path, monkeypatch):
+    """Builds an empty queue of either kind; Redis runs on fakeredis (with lupa for the Lua scripts)."""
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeServer()
+        monkeypatch.setattr(work_queue.redis.Redis, "from_url",
+                            classmethod(lambda cls, url: fakeredis.FakeRedis(server=server)))
+    queues = []
+
+    def make(lease_seconds=300, max_attempts=5, tasks=TASKS):
+        location = "redis://localhost/0" if request.param == "redis" else str(tmp_path / "queue.sqlite")
+        queue = work_queue.open_work_queue(location, "test", lease_seconds, max_attempts)
+        queue.reset()
+        queue.put_many(tasks)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def _counts(queue):
+    return {status: count for status, count in queue.counts().items() if count}
+
+
+def test_each_task_is_leased_to_one_worker_in_order(make_queue):
+    queue = make_queue()
+    assert queue.lease("w1") == ("a", {"cursors": [1, 50]})
+    assert queue.lease("w2") == ("b", {"cursors": [51, 100]})
+    assert queue.lease("w3") is None
+    queue.complete("a", "w1")
+    assert _counts(queue) == {STATUS_DONE: 1, STATUS_LEASED: 1}
+
+
+def test_an_expired_lease_moves_to_the_next_worker_and_the_old_owner_loses_it(make_queue):
+    queue = make_queue(lease_seconds=0, tasks=TASKS[:1])
+    assert queue.lease("w1")[0] == "a"
+    assert queue.lease("w2")[0] == "a"  # w1's lease ran out
+    assert not queue.renew("a", "w1")
+    queue.complete("a", "w1")
+    queue.fail("a", "w1", "late")
+    assert queue.renew("a", "w2")
+
+
+def test_a_failing_task_is_retried_until_max_attempts_then_parked(make_queue):
+    queue = make_queue(max_attempts=2)
+    leased = []
+    while True:
+        task = queue.lease("w1")
+        if task is None:
+            break
+        leased.append(task[0])
+        if task[0] == "a":
+            queue.fail("a", "w1", "3 cursors failed")
+        else:
+            queue.complete(task[0], "w1")
+    assert sorted(leased) == ["a", "a", "b"]
+    assert _counts(queue) == {STATUS_DONE: 1, STATUS_FAILED: 1}
+
+
+def test_a_task_whose_workers_keep_dying_is_parked_after_max_attempts(make_queue):
+    queue = make_queue(lease_seconds=0, max_attempts=2)
+    leased = [queue.lease(f"w{attempt}")[0] for attempt in range(4)]  # Every lease runs out at once
+    assert sorted(leased) == ["a", "a", "b", "b"]
+    assert queue.lease("w4") is None
+    assert _counts(queue) == {STATUS_FAILED: 2}
@@ -1,33 +1,42 @@
 import json
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError, sync_playwright
+
+# --- Configuration ---
+HEADLESS = True  # Set to False to watch the browser
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}  # Never downloaded; only the loader JSON matters
+RESPONSE_TIMEOUT_MS = 30000  # How long to wait for the loader to answer the Load More click
+BUTTON_TIMEOUT_MS = 5000  # How long to wait for the Load More button to show up before giving up
 
 def run():
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)  # Set headless=True if you don't want to see the browser
+        browser = p.chromium.launch(headless=HEADLESS)
         context = browser.new_context()
+        context.route("**/*", lambda route: route.abort()
+                      if route.request.resource_type in BLOCKED_RESOURCE_TYPES else route.continue_())
         page = context.new_page()
 
-        matched_response = None
-
-        def handle_response(response):
-            nonlocal matched_response
-            if (
+        def is_target_response(response):
+            return (
                 response.request.method == "POST"
                 and "_data=routes%2F%28%24locale%29.collections.engagement-ring-settings" in response.url
-            ):
-                print("[✓] Found target POST response")
-                matched_response = response
-
-        # Listen to responses
-        page.on("response", handle_response)
+            )
 
         print("[*] Navigating to page")
-        page.goto("https://keyzarjewelry.com/collections/engagement-ring-settings", timeout=60000)
-        page.wait_for_timeout(5000)
+        page.goto("https://keyzarjewelry.com/collections/engagement-ring-settings",
+                  wait_until="domcontentloaded", timeout=60000)
 
+        # A missing button is known within BUTTON_TIMEOUT_MS; only the loader gets the long timeout
         print("[*] Clicking Load More")
-        page.click("button.tangiblee-load-more")
-        page.wait_for_timeout(5000)
+        matched_response = None
+        load_more = page.locator("button.tangiblee-load-more")
+        try:
+            load_more.wait_for(state="visible", timeout=BUTTON_TIMEOUT_MS)
+            with page.expect_response(is_target_response, timeout=RESPONSE_TIMEOUT_MS) as response_info:
+                load_more.click(timeout=BUTTON_TIMEOUT_MS)
+            matched_response = response_info.value
+            print("[✓] Found target POST response")
+        except PlaywrightTimeoutError:
+            pass
 
         # If found, save the response
         if matched_response:
@@ -0,0 +1,269 @@
+import json
+import os
+import sqlite3
+import time
+
+try:
+    import redis  # Optional: only needed for redis:// queue URLs
+except ImportError:
+    redis = None
+
+# --- Configuration ---
+LEASE_SECONDS = 300  # A leased task goes back on the queue if its worker has not finished or renewed it by then
+MAX_ATTEMPTS = 5  # A task that failed this many times is parked as failed instead of re-queued
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class SqliteWorkQueue:
+    """
+    Work queue in a local SQLite file, shared by every worker process on the host (or on a
+    shared disk). Tasks are leased for `lease_seconds`; a lease that runs out because its
+    worker died is handed to the next worker that asks, so a crash only loses that task's time.
+    A task is leased at most `max_attempts` times, so a range that keeps killing workers is parked.
+    """
+
+    def __init__(self, path, queue_name="default", lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.queue_name = queue_name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Autocommit mode: every lease is its own BEGIN IMMEDIATE transaction below
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                queue TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                PRIMARY KEY (queue, task_id)
+            )
+        """)
+
+    def reset(self):
+        """Removes every task of this queue; used before planning a new crawl."""
+        self.conn.execute("DELETE FROM tasks WHERE queue = ?", (self.queue_name,))
+
+    def put_many(self, tasks):
+        """Adds (task_id, payload dict) pairs as pending; ids already queued are left alone."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tasks (queue, task_id, payload, status) VALUES (?, ?, ?, ?)",
+                [(self.queue_name, task_id, json.dumps(payload), STATUS_PENDING) for task_id, payload in tasks])
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def lease(self, worker_id):
+        """Leases the next pending (or expired) task to `worker_id`; returns (task_id, payload) or None."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A task whose worker died on every one of its max_attempts leases is parked, not leased again
+            self.conn.execute(
+                "UPDATE tasks SET status = ?, lease_expires = NULL, error = ? "
+                "WHERE queue = ? AND status = ? AND lease_expires < ? AND attempts >= ?",
+                (STATUS_FAILED, "Lease expired", self.queue_name, STATUS_LEASED, now, self.max_attempts))
+            row = self.conn.execute(
+                "SELECT task_id, payload FROM tasks WHERE queue = ? AND (status = ? OR (status = ? AND lease_expires < ?)) "
+                "ORDER BY rowid LIMIT 1",
+                (self.queue_name, STATUS_PENDING, STATUS_LEASED, now)).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    "UPDATE tasks SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                    "WHERE queue = ? AND task_id = ?",
+                    (STATUS_LEASED, worker_id, now + self.lease_seconds, self.queue_name, row[0]))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return (row[0], json.loads(row[1])) if row else None
+
+    def renew(self, task_id, worker_id):
+        """Extends a lease still held by `worker_id`; returns False if it was lost to another worker."""
+        cursor = self.conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE queue = ? AND task_id = ? AND status = ? AND lease_owner = ?",
+            (time.time() + self.lease_seconds, self.queue_name, task_id, STATUS_LEASED, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, worker_id):
+        self.conn.execute(
+            "UPDATE tasks SET status = ?, lease_expires = NULL, error = NULL "
+            "WHERE queue = ? AND task_id = ? AND lease_owner = ?",
+            (STATUS_DONE, self.queue_name, task_id, worker_id))
+
+    def fail(self, task_id, worker_id, error):
+        """Puts a task back on the queue, or parks it as failed after `max_attempts` leases."""
+        self.conn.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, lease_expires = NULL, error = ? "
+            "WHERE queue = ? AND task_id = ? AND lease_owner = ?",
+            (self.max_attempts, STATUS_FAILED, STATUS_PENDING, error, self.queue_name, task_id, worker_id))
+
+    def counts(self):
+        """{status: number of tasks}; expired leases count as pending, or failed once they used up max_attempts."""
+        counts = {STATUS_PENDING: 0, STATUS_LEASED: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        rows = self.conn.execute(
+            "SELECT CASE WHEN status = ? AND lease_expires < ? THEN (CASE WHEN attempts >= ? THEN ? ELSE ? END) "
+            "ELSE status END, COUNT(*) FROM tasks WHERE queue = ? GROUP BY 1",
+            (STATUS_LEASED, time.time(), self.max_attempts, STATUS_FAILED, STATUS_PENDING, self.queue_name))
+        counts.update(dict(rows))
+        return counts
+
+    def close(self):
+        self.conn.close()
+
+
+# The Redis queue's read-then-write steps run as Lua scripts, so each is atomic: no lease can
+# expire and be handed out again between a script's check and its write.
+# KEYS (every script): pending, leases, owners, status, attempts, payloads
+# ARGV (every script): now, max attempts, then the script's own arguments
+
+# Expired leases go back on the pending list, or are parked as failed once they used up max attempts
+REQUEUE_EXPIRED_SCRIPT = """
+for _, task_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], 0, tonumber(ARGV[1]))) do
+    redis.call('ZREM', KEYS[2], task_id)
+    if tonumber(redis.call('HGET', KEYS[5], task_id) or 0) >= tonumber(ARGV[2]) then
+        redis.call('HSET', KEYS[4], task_id, '%(failed)s')
+    else
+        redis.call('RPUSH', KEYS[1], task_id)
+        redis.call('HSET', KEYS[4], task_id, '%(pending)s')
+    end
+end
+"""
+
+# ...then pops the next pending task and records its lease. ARGV: lease seconds, worker id
+LEASE_SCRIPT = REQUEUE_EXPIRED_SCRIPT + """
+local task_id = redis.call('LPOP', KEYS[1])
+if not task_id then
+    return nil
+end
+redis.call('ZADD', KEYS[2], tonumber(ARGV[1]) + tonumber(ARGV[3]), task_id)
+redis.call('HSET', KEYS[3], task_id, ARGV[4])
+redis.call('HSET', KEYS[4], task_id, '%(leased)s')
+redis.call('HINCRBY', KEYS[5], task_id, 1)
+return {task_id, redis.call('HGET', KEYS[6], task_id)}
+"""
+
+# The lease on task ARGV[3] is still out (not re-queued) and held by worker ARGV[4]
+_OWNS = """
+local task_id = ARGV[3]
+if redis.call('HGET', KEYS[3], task_id) ~= ARGV[4] or not redis.call('ZSCORE', KEYS[2], task_id) then
+    return 0
+end
+"""
+
+# ARGV: task id, worker id, new expiry
+RENEW_SCRIPT = _OWNS + """
+redis.call('ZADD', KEYS[2], tonumber(ARGV[5]), task_id)
+return 1
+"""
+
+# ARGV: task id, worker id
+COMPLETE_SCRIPT = _OWNS + """
+redis.call('ZREM', KEYS[2], task_id)
+redis.call('HSET', KEYS[4], task_id, '%(done)s')
+return 1
+"""
+
+# ARGV: task id, worker id
+FAIL_SCRIPT = _OWNS + """
+redis.call('ZREM', KEYS[2], task_id)
+if tonumber(redis.call('HGET', KEYS[5], task_id) or 0) >= tonumber(ARGV[2]) then
+    redis.call('HSET', KEYS[4], task_id, '%(failed)s')
+else
+    redis.call('RPUSH', KEYS[1], task_id)
+    redis.call('HSET', KEYS[4], task_id, '%(pending)s')
+end
+return 1
+"""
+
+_SCRIPT_STATUSES = {"pending": STATUS_PENDING, "leased": STATUS_LEASED, "done": STATUS_DONE, "failed": STATUS_FAILED}
+
+
+class RedisWorkQueue:
+    """
+    The same queue in Redis, for workers spread over several hosts. Pending task ids live in a
+    list, leases in a sorted set scored by expiry time and payloads/attempts in hashes. Every
+    step that checks a lease before changing it is one Lua script, so it is atomic.
+    """
+
+    def __init__(self, url, queue_name="default", lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        if redis is None:
+            raise RuntimeError("redis:// work queues require the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        prefix = f"keyzar:queue:{queue_name}"
+        self.pending_key = f"{prefix}:pending"
+        self.leases_key = f"{prefix}:leases"
+        self.owners_key = f"{prefix}:owners"
+        self.payloads_key = f"{prefix}:payloads"
+        self.attempts_key = f"{prefix}:attempts"
+        self.status_key = f"{prefix}:status"
+        self._scripts = {name: self.client.register_script(script % _SCRIPT_STATUSES) for name, script in (
+            ("requeue", REQUEUE_EXPIRED_SCRIPT), ("lease", LEASE_SCRIPT), ("renew", RENEW_SCRIPT),
+            ("complete", COMPLETE_SCRIPT), ("fail", FAIL_SCRIPT))}
+
+    def _run(self, name, *args):
+        keys = [self.pending_key, self.leases_key, self.owners_key, self.status_key, self.attempts_key,
+                self.payloads_key]
+        return self._scripts[name](keys=keys, args=[time.time(), self.max_attempts, *args])
+
+    def reset(self):
+        self.client.delete(self.pending_key, self.leases_key, self.owners_key, self.payloads_key,
+                           self.attempts_key, self.status_key)
+
+    def put_many(self, tasks):
+        pipe = self.client.pipeline()
+        for task_id, payload in tasks:
+            pipe.hsetnx(self.payloads_key, task_id, json.dumps(payload))
+        added = pipe.execute()
+        pipe = self.client.pipeline()
+        for (task_id, _), is_new in zip(tasks, added):
+            if is_new:
+                pipe.rpush(self.pending_key, task_id)
+                pipe.hset(self.status_key, task_id, STATUS_PENDING)
+        pipe.execute()
+
+    def lease(self, worker_id):
+        result = self._run("lease", self.lease_seconds, worker_id)
+        if result is None:
+            return None
+        task_id, payload = result
+        return task_id.decode(), json.loads(payload)
+
+    def renew(self, task_id, worker_id):
+        return self._run("renew", task_id, worker_id, time.time() + self.lease_seconds) == 1
+
+    def complete(self, task_id, worker_id):
+        self._run("complete", task_id, worker_id)
+
+    def fail(self, task_id, worker_id, error):
+        self._run("fail", task_id, worker_id)
+
+    def counts(self):
+        self._run("requeue")
+        counts = {STATUS_PENDING: 0, STATUS_LEASED: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        for status in self.client.hvals(self.status_key):
+            counts[status.decode()] = counts.get(status.decode(), 0) + 1
+        return counts
+
+    def close(self):
+        self.client.close()
+
+
+def open_work_queue(location, queue_name="default", lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """Opens a RedisWorkQueue for redis:// (or rediss://) URLs, otherwise a SqliteWorkQueue at that path."""
+    if location.startswith(("redis://", "rediss://", "unix://")):
+        return RedisWorkQueue(location, queue_name, lease_seconds, max_attempts)
+    return SqliteWorkQueue(location, queue_name, lease_seconds, max_attempts)